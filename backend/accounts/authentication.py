@@ -0,0 +1,163 @@
+"""JWT authentication from token claims (settings.JWT_CLAIMS_AUTH).
+
+simplejwt's JWTAuthentication loads the user row on every request. Tokens
+issued through ClaimsRefreshToken also carry what views mostly read off
+request.user (email, role, company name and id), so ClaimsJWTAuthentication
+builds the user from those and loads the rest of the row only when a view
+touches another field.
+
+Claims are only trusted while they match the user's snapshot: the claimed
+fields and is_active as last read from the database, kept in the shared
+cache for JWT_USER_CACHE_SECONDS. Every user save drops it (see
+accounts.signals), and a missing snapshot, dropped or evicted, is read
+again from the database, so a role change or deactivation applies to the
+next request. Full rows are kept in a short-lived in-process cache, and
+only trusted when loaded after the snapshot. Refreshing a token re-reads
+its claims.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken, TokenError
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import ClaimsUser, User
+from .revocation import revocations
+
+# User fields carried as claims, besides the user id
+CLAIMED_FIELDS = ('email', 'role', 'company_name')
+
+# user id -> (time loaded, row)
+_rows = {}
+
+
+def _snapshot_key(user_id):
+    return f'auth:user-snapshot:{user_id}'
+
+
+def forget_user(user_id):
+    """Drop the user's snapshot and cached row, so both are read again"""
+    _rows.pop(user_id, None)
+    cache.delete(_snapshot_key(user_id))
+
+
+def _load_row(user_id):
+    fields = [field.attname for field in User._meta.concrete_fields]
+    row = User.objects.filter(pk=user_id).values(*fields).first()
+    now = time.time()
+    if row is None:
+        _rows.pop(user_id, None)
+    else:
+        _rows[user_id] = (now, row)
+    return now, row
+
+
+def get_user_row(user_id, since=None):
+    """The user's row as {attname: value}, from the in-process cache when
+    it was loaded recently and not before since; None if there is no such user
+    """
+    entry = _rows.get(user_id)
+    if entry is not None:
+        loaded_at, row = entry
+        if time.time() - loaded_at < settings.JWT_USER_CACHE_SECONDS and (since is None or loaded_at >= since):
+            return row
+    return _load_row(user_id)[1]
+
+
+def user_snapshot(user_id):
+    """{claimed fields, is_active, loaded_at} of the user, from the shared
+    cache or the database; None if there is no such user
+    """
+    key = _snapshot_key(user_id)
+    snapshot = cache.get(key)
+    if snapshot is None:
+        loaded_at, row = _load_row(user_id)
+        if row is None:
+            return None
+        snapshot = {name: row[name] for name in (*CLAIMED_FIELDS, 'is_active')}
+        snapshot['loaded_at'] = loaded_at
+        cache.set(key, snapshot, settings.JWT_USER_CACHE_SECONDS)
+    return snapshot
+
+
+def user_claims(user):
+    from api.models import Company
+
+    claims = {name: getattr(user, name) for name in CLAIMED_FIELDS}
+    if user.company_name:
+        claims['company_id'] = Company.objects.filter(name=user.company_name).values_list('pk', flat=True).first()
+    return claims
+
+
+class RevocableRefreshToken(RefreshToken):
+    """A refresh token checked against the in-memory revocation set"""
+
+    def check_blacklist(self):
+        if not settings.TOKEN_REVOCATION_FILTER:
+            return super().check_blacklist()
+        if revocations.is_revoked(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError('Token is blacklisted')
+
+
+class ClaimsRefreshToken(RevocableRefreshToken):
+    """A refresh token carrying the user's claims, which its access tokens copy.
+
+    Decoding one (to refresh it) reads the claims from the database again,
+    so refreshed tokens never carry outdated ones.
+    """
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token.payload.update(user_claims(user))
+        return token
+
+    def __init__(self, token=None, verify=True):
+        super().__init__(token, verify)
+        if token is not None:
+            user = User.objects.filter(pk=self.payload.get(api_settings.USER_ID_CLAIM)).first()
+            if user is not None:
+                self.payload.update(user_claims(user))
+
+
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = ClaimsRefreshToken
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication that trusts the token's user claims while they match the user's snapshot"""
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken('Token contained no recognizable user identification')
+        # Tokens carry the id as a string; the caches are keyed on the pk
+        user_id = User._meta.pk.to_python(user_id)
+
+        snapshot = user_snapshot(user_id)
+        if snapshot is None:
+            raise AuthenticationFailed('User not found', code='user_not_found')
+        if not snapshot['is_active']:
+            raise AuthenticationFailed('User is inactive', code='user_inactive')
+
+        if all(name in validated_token and validated_token[name] == snapshot[name] for name in CLAIMED_FIELDS):
+            values = {'id': user_id, 'is_active': snapshot['is_active'], **{name: snapshot[name] for name in CLAIMED_FIELDS}}
+            # from_db takes the values in field order
+            fields = [field.attname for field in User._meta.concrete_fields if field.attname in values]
+            user = ClaimsUser.from_db(None, fields, [values[name] for name in fields])
+            user.claimed_company_id = validated_token.get('company_id')
+            user.claims_checked_against = snapshot['loaded_at']
+            return user
+
+        row = get_user_row(user_id, snapshot['loaded_at'])
+        if row is None:
+            raise AuthenticationFailed('User not found', code='user_not_found')
+        user = User.from_db(None, list(row), list(row.values()))
+        if not user.is_active:
+            raise AuthenticationFailed('User is inactive', code='user_inactive')
+        return user
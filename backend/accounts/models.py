@@ -22,6 +22,34 @@ class User(AbstractUser):
     def __str__(self):
         return f"{self.email} ({self.get_role_display()})"
 
+
+class ClaimsUser(User):
+    """A user built from JWT claims (see accounts.authentication).
+
+    Only the claimed fields are set. The first access to any other field
+    loads all the missing ones together, from the in-process user cache
+    when it has the row, instead of one query per field.
+    """
+    # The company id claimed by the token, if any (see api.views.get_user_company)
+    claimed_company_id = None
+    # When the user's snapshot the claims were checked against was loaded
+    claims_checked_against = None
+
+    class Meta:
+        proxy = True
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        deferred = self.get_deferred_fields()
+        if fields is None or not deferred or not set(fields) <= deferred:
+            return super().refresh_from_db(using, fields, from_queryset)
+
+        from .authentication import get_user_row
+        row = get_user_row(self.pk, self.claims_checked_against)
+        if row is None:
+            raise User.DoesNotExist('User no longer exists')
+        for attname in deferred:
+            setattr(self, attname, row[attname])
+
 # Optional: Company model for better organization
 class Company(models.Model):
     name = models.CharField(max_length=100)
@@ -0,0 +1,105 @@
+"""Refresh token revocation: bounding the blacklist and checking it in memory.
+
+With ROTATE_REFRESH_TOKENS and BLACKLIST_AFTER_ROTATION every refresh and
+logout adds rows to simplejwt's OutstandingToken and BlacklistedToken
+tables. purge_expired_tokens() deletes the rows of expired tokens, which
+no check needs any more, in batches; the accounts.purge_tokens job runs
+it every TOKEN_PURGE_INTERVAL (manage.py purge_expired_tokens --schedule).
+
+Refreshing and logging out check the blacklist first. The revocation set
+keeps the jtis of unexpired blacklisted tokens in memory, loaded on first
+use, so a check reads the database only when another process has
+blacklisted a token since this one last looked. A counter in the shared
+cache, bumped after each blacklist commits, tells whether that happened.
+Every worker has to see the same counter and increments must not be lost,
+so TOKEN_REVOCATION_FILTER is on only with the redis cache; otherwise
+refresh tokens are checked against the blacklist table.
+"""
+import random
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+COUNTER_KEY = 'auth:blacklist-counter'
+# Blacklist rows are written in short transactions; rows inserted this long
+# before a load started are reread by the next one in case they committed late
+_SETTLE = timedelta(seconds=60)
+
+
+class RevocationSet:
+    def __init__(self):
+        self.lock = threading.Lock()
+        # jti -> expiry of the blacklisted token
+        self.expires = {}
+        # Counter value and start time of the last load
+        self.synced = None
+        self.synced_at = None
+
+    def _counter(self):
+        value = cache.get(COUNTER_KEY)
+        if value is None:
+            # A random start, so a counter lost from the cache does not
+            # come back at a value some process has already synced to
+            cache.add(COUNTER_KEY, random.getrandbits(62), None)
+            value = cache.get(COUNTER_KEY)
+        return value
+
+    def _load(self, counter):
+        started = timezone.now()
+        rows = BlacklistedToken.objects.filter(token__expires_at__gt=started)
+        if self.synced_at is not None:
+            rows = rows.filter(blacklisted_at__gte=self.synced_at - _SETTLE)
+        self.expires = {jti: expires_at for jti, expires_at in self.expires.items() if expires_at > started}
+        self.expires.update(rows.values_list('token__jti', 'token__expires_at'))
+        self.synced, self.synced_at = counter, started
+
+    def is_revoked(self, jti):
+        with self.lock:
+            if jti in self.expires:
+                return True
+            # Read before loading: every blacklist it counts has committed
+            counter = self._counter()
+            if counter != self.synced:
+                self._load(counter)
+            return jti in self.expires
+
+    def add(self, jti, expires_at):
+        """Record a blacklist this process has committed"""
+        with self.lock:
+            self.expires[jti] = expires_at
+            self._counter()
+            try:
+                counter = cache.incr(COUNTER_KEY)
+            except ValueError:
+                # Evicted just now; the next check reloads
+                return
+            if self.synced is not None and counter == self.synced + 1:
+                # No other process blacklisted anything since the last load
+                self.synced = counter
+
+    def clear(self):
+        with self.lock:
+            self.expires, self.synced, self.synced_at = {}, None, None
+
+
+revocations = RevocationSet()
+
+
+def purge_expired_tokens(batch_size=None):
+    """Delete expired outstanding tokens and their blacklist rows; returns how many"""
+    batch_size = batch_size or settings.TOKEN_PURGE_BATCH_SIZE
+    now = timezone.now()
+    total = 0
+    while True:
+        ids = list(OutstandingToken.objects.filter(expires_at__lte=now).order_by().values_list(
+            'pk', flat=True
+        )[:batch_size])
+        if not ids:
+            return total
+        BlacklistedToken.objects.filter(token_id__in=ids).delete()
+        OutstandingToken.objects.filter(pk__in=ids).delete()
+        total += len(ids)
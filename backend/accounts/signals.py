@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+from .authentication import forget_user
+from .models import ClaimsUser, User
+from .revocation import revocations
+
+
+@receiver([post_save, post_delete], sender=User)
+@receiver([post_save, post_delete], sender=ClaimsUser)
+def user_changed(sender, instance, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    forget_user(instance.pk)
+    # Again once committed, in case a request cached the old row meanwhile
+    transaction.on_commit(lambda: forget_user(instance.pk))
+
+
+@receiver(post_save, sender=BlacklistedToken)
+def token_blacklisted(sender, instance, created, **kwargs):
+    if created and settings.TOKEN_REVOCATION_FILTER:
+        token = instance.token
+        transaction.on_commit(lambda: revocations.add(token.jti, token.expires_at))
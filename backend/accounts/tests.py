@@ -1,3 +1,108 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+
+from . import authentication
+from .authentication import ClaimsJWTAuthentication, ClaimsRefreshToken
+from .models import ClaimsUser, User
+from .revocation import RevocationSet, revocations
+
+
+class ClaimsAuthenticationTests(TestCase):
+    """Claims are trusted only while they match the user's row"""
+
+    def setUp(self):
+        cache.clear()
+        authentication._rows.clear()
+        self.user = User.objects.create_user(
+            email='employee@example.com', username='employee', password='secret',
+            role='employee', company_name='Acme',
+        )
+        self.token = ClaimsRefreshToken.for_user(self.user).access_token
+        self.auth = ClaimsJWTAuthentication()
+
+    def authenticate(self):
+        return self.auth.get_user(self.auth.get_validated_token(str(self.token)))
+
+    def other_worker(self):
+        """Forget this process's rows and the shared snapshots, as a fresh
+        worker or an evicted cache would"""
+        authentication._rows.clear()
+        cache.clear()
+
+    def test_matching_claims_need_no_query(self):
+        self.authenticate()
+        with self.assertNumQueries(0):
+            user = self.authenticate()
+        self.assertIsInstance(user, ClaimsUser)
+        self.assertEqual((user.pk, user.role, user.is_active), (self.user.pk, 'employee', True))
+
+    def test_deactivated_user_is_rejected(self):
+        self.authenticate()
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_deactivation_without_signal_is_rejected_once_snapshot_is_gone(self):
+        self.authenticate()
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.other_worker()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_changed_role_overrides_claims(self):
+        self.authenticate()
+        User.objects.filter(pk=self.user.pk).update(role='manager')
+        self.other_worker()
+        user = self.authenticate()
+        self.assertNotIsInstance(user, ClaimsUser)
+        self.assertEqual(user.role, 'manager')
+
+    def test_deleted_user_is_rejected(self):
+        self.authenticate()
+        self.user.delete()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+
+class RevocationTests(TestCase):
+    """A logout in one worker revokes the refresh token in every other"""
+
+    def setUp(self):
+        cache.clear()
+        revocations.clear()
+        user = User.objects.create_user(
+            email='employee@example.com', username='employee', password='secret',
+            role='employee', company_name='Acme',
+        )
+        self.refresh = ClaimsRefreshToken.for_user(user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.refresh.access_token}')
+
+    def logout(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/v1/auth/logout/', {'refresh': str(self.refresh)}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def refresh_status(self):
+        return self.client.post('/api/v1/auth/refresh/', {'refresh': str(self.refresh)}, format='json').status_code
+
+    @override_settings(TOKEN_REVOCATION_FILTER=True)
+    def test_logout_reaches_other_process(self):
+        # Another worker's set, already loaded before the logout; both share the cache
+        other = RevocationSet()
+        self.assertFalse(other.is_revoked(self.refresh['jti']))
+        self.logout()
+        with mock.patch('accounts.authentication.revocations', other):
+            self.assertEqual(self.refresh_status(), 401)
+
+    @override_settings(TOKEN_REVOCATION_FILTER=False)
+    def test_without_filter_blacklist_table_is_checked(self):
+        self.logout()
+        with mock.patch.object(RevocationSet, 'is_revoked') as is_revoked:
+            self.assertEqual(self.refresh_status(), 401)
+        is_revoked.assert_not_called()
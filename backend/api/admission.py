@@ -0,0 +1,231 @@
+"""Admission control: rate limits and a concurrency cap for costly endpoints.
+
+Two layers, configured by the ADMISSION_* settings:
+
+- Rates (CostThrottle, a DRF throttle on every view). Each user, or client
+  address when anonymous, has a budget of cost units that refills over
+  time (ADMISSION_USER_BUDGET); a request spends the cost of its endpoint
+  (ADMISSION_COSTS, by URL name, for reads; writes cost 1). Endpoints in
+  ADMISSION_ENDPOINT_RATES also get a bucket of their own per user. The
+  buckets live in the cache, shared by all workers. An empty bucket means
+  429 with Retry-After.
+- Concurrency (@limit_concurrency on the costly views). Their requests
+  share a per-process pool of ADMISSION_MAX_INFLIGHT cost units. One that
+  cannot get its units within ADMISSION_QUEUE_TIMEOUT gets 503 with
+  Retry-After rather than queueing, so a burst of heavy reads cannot tie
+  up every worker and cheap requests keep their usual latency.
+
+Logging in runs PBKDF2 on every attempt, so login_user and register_user
+have LoginThrottle instead: buckets per client address and per email.
+"""
+import functools
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
+from rest_framework.throttling import BaseThrottle
+
+PERIODS = {'s': 1, 'sec': 1, 'm': 60, 'min': 60, 'h': 3600, 'hour': 3600, 'd': 86400, 'day': 86400}
+
+
+def parse_rate(rate):
+    """(capacity, refill per second) of a DRF style rate such as '60/min'"""
+    count, period = rate.split('/')
+    return int(count), int(count) / PERIODS[period]
+
+
+def url_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.url_name if match else None
+
+
+def request_cost(request):
+    if request.method not in SAFE_METHODS:
+        return 1
+    return settings.ADMISSION_COSTS.get(url_name(request), 1)
+
+
+class TokenBucket:
+    """A token bucket stored in the cache as (tokens, last update)"""
+
+    def __init__(self, key, rate):
+        self.key = key
+        self.capacity, self.refill = parse_rate(rate)
+
+    def tokens(self, state, now):
+        if state is None:
+            return self.capacity
+        tokens, updated = state
+        return min(self.capacity, tokens + (now - updated) * self.refill)
+
+    def wait(self, tokens, cost):
+        """Seconds until the bucket holds cost tokens (0 if it does now)"""
+        cost = min(cost, self.capacity)
+        return 0 if tokens >= cost else (cost - tokens) / self.refill
+
+    def state_after(self, tokens, cost, now):
+        return (tokens - min(cost, self.capacity), now)
+
+    @property
+    def timeout(self):
+        # Long enough to refill from empty; after that a missing key means full
+        return math.ceil(self.capacity / self.refill) + 1
+
+
+def take(buckets, now=None):
+    """Spend from every (bucket, cost) pair, or from none of them.
+
+    Returns 0 when the request is admitted, otherwise the seconds until it
+    would be. Reads and writes are not atomic, like DRF's own throttles:
+    racing requests may each spend the same tokens, which at worst admits
+    a few extra requests.
+    """
+    now = now or time.time()
+    states = cache.get_many([bucket.key for bucket, _ in buckets])
+    levels = [(bucket, cost, bucket.tokens(states.get(bucket.key), now)) for bucket, cost in buckets]
+    wait = max(bucket.wait(tokens, cost) for bucket, cost, tokens in levels)
+    if wait:
+        return wait
+    for bucket, cost, tokens in levels:
+        cache.set(bucket.key, bucket.state_after(tokens, cost, now), bucket.timeout)
+    return 0
+
+
+class CostThrottle(BaseThrottle):
+    """Per-user cost budget plus per-user, per-endpoint rates"""
+
+    def allow_request(self, request, view):
+        self.wait_seconds = 0
+        if not settings.ADMISSION_CONTROL:
+            return True
+
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            ident = f'user:{user.pk}'
+        else:
+            ident = f'address:{self.get_ident(request)}'
+
+        name = url_name(request)
+        buckets = [(TokenBucket(f'admission:{ident}', settings.ADMISSION_USER_BUDGET), request_cost(request))]
+        if name in settings.ADMISSION_ENDPOINT_RATES:
+            buckets.append((TokenBucket(f'admission:{ident}:{name}', settings.ADMISSION_ENDPOINT_RATES[name]), 1))
+
+        self.wait_seconds = take(buckets)
+        return not self.wait_seconds
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class LoginThrottle(BaseThrottle):
+    """Login attempts per client address and per email (ADMISSION_LOGIN_RATES)"""
+
+    def allow_request(self, request, view):
+        self.wait_seconds = 0
+        if not settings.ADMISSION_CONTROL:
+            return True
+
+        rates = settings.ADMISSION_LOGIN_RATES
+        buckets = [(TokenBucket(f'admission:login:address:{self.get_ident(request)}', rates['address']), 1)]
+        email = request.data.get('email') if hasattr(request.data, 'get') else None
+        if isinstance(email, str) and email:
+            buckets.append((TokenBucket(f'admission:login:email:{email.strip().lower()}', rates['email']), 1))
+
+        self.wait_seconds = take(buckets)
+        return not self.wait_seconds
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class CostPool:
+    """Cost units held by the costly requests running in this process"""
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.in_flight = 0
+
+    def acquire(self, cost, capacity, timeout):
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            while self.in_flight + cost > capacity:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self.condition.wait(remaining)
+            self.in_flight += cost
+            return True
+
+    def release(self, cost):
+        with self.condition:
+            self.in_flight -= cost
+            self.condition.notify_all()
+
+
+pool = CostPool()
+
+
+def limit_concurrency(view):
+    """Run the view only while the process has room for its cost (see module docs).
+
+    Goes inside @api_view, so it runs after authentication and throttles.
+    Requests costing 1 are never held back.
+    """
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        cost = request_cost(request)
+        if not settings.ADMISSION_CONTROL or cost <= 1:
+            return view(request, *args, **kwargs)
+
+        capacity = settings.ADMISSION_MAX_INFLIGHT
+        cost = min(cost, capacity)
+        if not pool.acquire(cost, capacity, settings.ADMISSION_QUEUE_TIMEOUT):
+            return Response({
+                'success': False,
+                'error': 'The server is busy; try again shortly'
+            }, status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={
+                'Retry-After': str(settings.ADMISSION_RETRY_AFTER)
+            })
+        try:
+            response = view(request, *args, **kwargs)
+        except BaseException:
+            pool.release(cost)
+            raise
+        if not response.streaming:
+            pool.release(cost)
+        else:
+            # The work happens while the body streams; hold the units until
+            # it ends. Django closes the content when the response is closed
+            response.streaming_content = _ReleaseAfter(response.streaming_content, cost)
+        return response
+
+    return wrapper
+
+
+class _ReleaseAfter:
+    """Iterates content, releasing cost units from the pool once it is done or closed"""
+
+    def __init__(self, content, cost):
+        self.content = iter(content)
+        self.cost = cost
+        self.released = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self.content)
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self):
+        if not self.released:
+            self.released = True
+            pool.release(self.cost)
@@ -1,6 +1,22 @@
 from django.apps import AppConfig
+from django.db import connections
+from django.db.models.signals import post_migrate
+
+
+def ensure_search_index(sender, using, **kwargs):
+    # Migrations that rebuild the expense table on SQLite drop the search
+    # triggers with it; put them back and reindex
+    from .search import install_search_index
+    connection = connections[using]
+    if 'api_expense' in connection.introspection.table_names():
+        install_search_index(connection)
 
 
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+    
+    def ready(self):
+        # Register the background job handlers and cache invalidation
+        from . import signals, tasks  # noqa: F401
+        post_migrate.connect(ensure_search_index, sender=self)
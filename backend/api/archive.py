@@ -0,0 +1,89 @@
+from contextvars import ContextVar
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .db import select_for_update_skip_locked
+from .models import ArchivedExpense, ArchivedExpenseApproval, Expense, ExpenseApproval
+
+SETTLED_STATUSES = ('approved', 'rejected', 'paid')
+
+# Set while archive_batch deletes the hot rows it has copied; the rollups
+# count archived expenses too, so those deletions leave them alone
+moving_to_archive = ContextVar('moving_to_archive', default=False)
+
+
+def _copy_fields(obj, model):
+    return {f.attname: getattr(obj, f.attname) for f in model._meta.concrete_fields}
+
+
+def archive_batch(cutoff, batch_size):
+    """Move one batch of expenses settled before cutoff into the archive tables.
+
+    Returns the number of expenses moved; the copy and the delete commit
+    together, so a batch is never half archived.
+    """
+    with transaction.atomic():
+        settled = Expense.objects.filter(
+            status__in=SETTLED_STATUSES,
+            updated_at__lt=cutoff
+        ).order_by('updated_at')
+        expenses = list(select_for_update_skip_locked(settled)[:batch_size])
+        if not expenses:
+            return 0
+
+        expense_ids = [e.id for e in expenses]
+        approvals = ExpenseApproval.objects.filter(expense_id__in=expense_ids)
+
+        ArchivedExpense.objects.bulk_create([
+            ArchivedExpense(**_copy_fields(e, Expense)) for e in expenses
+        ])
+        ArchivedExpenseApproval.objects.bulk_create([
+            ArchivedExpenseApproval(**_copy_fields(a, ExpenseApproval)) for a in approvals
+        ])
+
+        approvals.delete()
+        token = moving_to_archive.set(True)
+        try:
+            Expense.objects.filter(id__in=expense_ids).delete()
+        finally:
+            moving_to_archive.reset(token)
+
+    return len(expenses)
+
+
+def archive_settled_expenses(older_than_days, batch_size=500):
+    """Archive every expense settled more than older_than_days ago"""
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+    total = 0
+    while True:
+        moved = archive_batch(cutoff, batch_size)
+        if not moved:
+            return total
+        total += moved
+
+
+def with_archive(queryset_for):
+    """Run queryset_for against the hot and archived expense models.
+
+    queryset_for receives the model class and returns a queryset; the two
+    results are combined with UNION ALL so callers read both tables as one.
+    """
+    return queryset_for(Expense).union(queryset_for(ArchivedExpense), all=True)
+
+
+def status_totals(queryset_for):
+    """Count and amount per status across hot and archived expenses"""
+    totals = {}
+    for model in (Expense, ArchivedExpense):
+        rows = queryset_for(model).order_by().values('status').annotate(
+            count=Count('id'),
+            amount=Sum(Coalesce('converted_amount', 'amount'))
+        )
+        for row in rows:
+            count, amount = totals.get(row['status'], (0, 0))
+            totals[row['status']] = (count + row['count'], amount + (row['amount'] or 0))
+    return totals
@@ -0,0 +1,21 @@
+"""Async entry point for the expense listing and submission endpoint.
+
+Under an ASGI server (for example ``uvicorn expense.asgi:application``)
+Django runs sync views in a thread of their own per request anyway; this
+view gives the route a coroutine, and hands the request to
+views.expense_list_create so both routes share one implementation:
+authentication, rate limits, admission control, replica routing,
+filters, pagination, conditional GETs, fast rendering and Idempotency-Key
+replays. Nothing slow is left on the submission path to await: currency
+conversion and the approval workflow run as background jobs (api.jobs).
+"""
+from asgiref.sync import sync_to_async
+from django.views.decorators.csrf import csrf_exempt
+
+from . import views
+
+
+@csrf_exempt
+async def expense_list_create_async(request):
+    # thread_sensitive keeps the ORM on the request's thread, as Django does for sync views
+    return await sync_to_async(views.expense_list_create, thread_sensitive=True)(request)
@@ -0,0 +1,132 @@
+"""Several API requests in one (POST /api/v1/batch/).
+
+Admin screens that act on many users or expenses would otherwise send a
+burst of small requests. A batch runs them in-process instead: each
+sub-request is resolved against the URL conf and handed straight to its
+view as the already authenticated user, so HTTP, JWT decoding and the
+middleware stack are paid once per batch. Sub-requests reach only DRF
+views, whose own permission checks apply as usual.
+"""
+import io
+import json
+import logging
+from urllib.parse import urljoin, urlsplit
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import transaction
+from django.urls import Resolver404, resolve
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.views import APIView
+
+from .db_router import pin_to_primary, replica_configured
+
+logger = logging.getLogger(__name__)
+
+METHODS = ('GET', 'POST', 'PUT', 'PATCH', 'DELETE')
+
+# Headers of the batch request that describe the batch itself, not its parts
+_BATCH_ONLY_META = (
+    'CONTENT_TYPE', 'CONTENT_LENGTH', 'HTTP_IDEMPOTENCY_KEY',
+    'HTTP_IF_MATCH', 'HTTP_IF_NONE_MATCH', 'HTTP_IF_MODIFIED_SINCE', 'HTTP_IF_UNMODIFIED_SINCE',
+)
+
+
+def parse_subrequests(items):
+    """[(method, path, body)] from the request list of a batch.
+
+    Raises ValueError with a message for the client.
+    """
+    if not isinstance(items, list) or not items:
+        raise ValueError('requests must be a non-empty list')
+    if len(items) > settings.BATCH_MAX_REQUESTS:
+        raise ValueError(f'A batch takes at most {settings.BATCH_MAX_REQUESTS} requests')
+
+    subrequests = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            raise ValueError(f'requests[{index}] must be an object')
+        method = str(item.get('method', 'GET')).upper()
+        if method not in METHODS:
+            raise ValueError(f'requests[{index}].method must be one of {", ".join(METHODS)}')
+        path = item.get('path')
+        if not isinstance(path, str) or not path:
+            raise ValueError(f'requests[{index}].path is required')
+        subrequests.append((method, path, item.get('body')))
+    return subrequests
+
+
+def _error(status_code, message):
+    return {'status': status_code, 'body': {'success': False, 'error': message}}
+
+
+def run_subrequest(request, method, path, body):
+    """{'status', 'body'} of one sub-request run as request.user.
+
+    path is absolute (/api/v1/admin/users/3/) or relative to the batch
+    endpoint's prefix (admin/users/3/), with an optional query string.
+    """
+    url = urlsplit(urljoin(request.path_info.rstrip('/'), path))
+    try:
+        match = resolve(url.path)
+    except Resolver404:
+        return _error(404, f'No endpoint at {url.path}')
+
+    view_class = getattr(match.func, 'cls', None)
+    if view_class is None or not issubclass(view_class, APIView) or match.url_name == 'batch':
+        return _error(400, f'{url.path} cannot be called in a batch')
+
+    content = json.dumps(body).encode() if body is not None else b''
+    environ = {key: value for key, value in request.META.items() if key not in _BATCH_ONLY_META}
+    environ.update({
+        'REQUEST_METHOD': method,
+        'PATH_INFO': url.path,
+        'QUERY_STRING': url.query,
+        'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(content)),
+        'wsgi.input': io.BytesIO(content),
+        'wsgi.url_scheme': request.scheme,
+    })
+    subrequest = WSGIRequest(environ)
+    # Read by the admission controls, which charge each sub-request
+    subrequest.resolver_match = match
+    # DRF authenticates forced users without looking at the Authorization header
+    subrequest._force_auth_user = request.user
+    subrequest._force_auth_token = request.auth
+
+    try:
+        response = match.func(subrequest, *match.args, **match.kwargs)
+    except Exception:
+        logger.exception('Error in batched request', extra={'method': method, 'path': url.path})
+        return _error(500, 'Request failed')
+
+    if response.streaming or not hasattr(response, 'data'):
+        # e.g. the CSV export, which has no JSON body to embed
+        response.close()
+        return _error(400, f'{url.path} does not return JSON and cannot be called in a batch')
+    return {'status': response.status_code, 'body': response.data}
+
+
+def run_batch(request, subrequests, atomic=False):
+    """(responses, index of the failed sub-request or None).
+
+    Sub-requests run in order. With atomic=True they share one
+    transaction, and the first one answering with an error status stops
+    the batch and rolls back the changes of all before it.
+    """
+    if replica_configured() and any(method not in SAFE_METHODS for method, _, _ in subrequests):
+        # Later reads in the batch must see its writes
+        pin_to_primary(request.user)
+
+    if not atomic:
+        return [run_subrequest(request, *subrequest) for subrequest in subrequests], None
+
+    responses = []
+    with transaction.atomic():
+        for index, subrequest in enumerate(subrequests):
+            response = run_subrequest(request, *subrequest)
+            responses.append(response)
+            if response['status'] >= 400:
+                transaction.set_rollback(True)
+                return responses, index
+    return responses, None
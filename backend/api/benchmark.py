@@ -0,0 +1,225 @@
+"""Endpoint benchmark runner used by ``manage.py benchmark_api``.
+
+Every route in api/urls.py has a scenario describing who calls it and with
+what payload. Each call runs inside a transaction that is rolled back, so
+writes do not change the data set between iterations or runs.
+"""
+import contextlib
+import time
+import tracemalloc
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from accounts.models import User
+from .models import Expense, ExpenseApproval, ExpenseCategory, ExpenseChange
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(pct / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+class Fixtures:
+    """Users and objects the scenarios act on, picked from the seeded data"""
+
+    def __init__(self, password):
+        self.password = password
+        self.admin = User.objects.filter(role='admin', is_active=True).order_by('id').first()
+        if self.admin is None:
+            raise ValueError('No active admin found; run manage.py seed_data first')
+        company_users = User.objects.filter(company_name=self.admin.company_name, is_active=True)
+        self.manager = company_users.filter(role='manager').order_by('id').first()
+        self.employee = company_users.filter(
+            role='employee', manager_relationships__manager=self.manager
+        ).order_by('id').first()
+        self.category = ExpenseCategory.objects.filter(
+            company__name=self.admin.company_name, is_active=True
+        ).first()
+        self.pending_approval = ExpenseApproval.objects.filter(
+            approver=self.manager,
+            status='pending',
+            expense__status='pending_approval',
+            expense__current_approver=self.manager,
+        ).first()
+        self.currency = self.admin.currency
+        # An hour back in the change log, so the delta has something to send
+        self.change_token = ExpenseChange.objects.filter(
+            created_at__lt=timezone.now() - timedelta(hours=1)
+        ).order_by('-id').values_list('id', flat=True).first() or 0
+
+    def expense_payload(self, number=0):
+        return {
+            'amount': f'{10 + number}.50',
+            'currency': self.currency,
+            'category': self.category.id if self.category else None,
+            'description': f'Benchmark expense {number}',
+            'expense_date': '2026-01-15',
+        }
+
+
+def _registration_payload(fx):
+    email = f'bench-{uuid.uuid4().hex[:12]}@example.com'
+    return {
+        'email': email, 'username': email,
+        'password': 'Bench-pass-123', 'password_confirm': 'Bench-pass-123',
+        'first_name': 'Bench', 'last_name': 'User', 'role': 'employee',
+        'company_name': fx.admin.company_name, 'currency': fx.currency,
+    }
+
+
+def build_scenarios(fx):
+    """url_name -> (user, method, path builder, payload builder)
+
+    expense-create is extra: it is the POST side of expense-list-create.
+    """
+    pending_id = fx.pending_approval.expense_id if fx.pending_approval else uuid.uuid4()
+
+    return {
+        'register': (None, 'post', lambda: '/api/v1/auth/register/', lambda: _registration_payload(fx)),
+        'login': (None, 'post', lambda: '/api/v1/auth/login/', lambda: {
+            'email': fx.employee.email, 'password': fx.password, 'role': 'employee',
+        }),
+        'logout': (fx.employee, 'post', lambda: '/api/v1/auth/logout/', lambda: {
+            'refresh': str(RefreshToken.for_user(fx.employee)),
+        }),
+        'token_refresh': (None, 'post', lambda: '/api/v1/auth/refresh/', lambda: {
+            'refresh': str(RefreshToken.for_user(fx.employee)),
+        }),
+        'profile': (fx.employee, 'get', lambda: '/api/v1/auth/profile/', None),
+        'bootstrap': (fx.manager, 'get', lambda: '/api/v1/bootstrap/', None),
+        'batch': (fx.admin, 'post', lambda: '/api/v1/batch/', lambda: {'requests': [
+            {'method': 'PATCH', 'path': f'admin/users/{fx.employee.id}/', 'body': {'first_name': 'Renamed'}},
+            {'method': 'POST', 'path': 'assign-manager/', 'body': {
+                'manager_id': fx.manager.id, 'employee_id': fx.employee.id,
+            }},
+            {'method': 'GET', 'path': 'admin/stats/'},
+        ]}),
+        'expense-list-create': (fx.manager, 'get', lambda: '/api/v1/expenses/', None),
+        'expense-list-create-async': (fx.manager, 'get', lambda: '/api/v1/expenses/async/', None),
+        'expense-changes': (fx.manager, 'get', lambda: f'/api/v1/expenses/changes/?since={fx.change_token}', None),
+        'expense-search': (fx.manager, 'get', lambda: '/api/v1/expenses/search/?q=hotel', None),
+        'expense-bulk-create': (fx.employee, 'post', lambda: '/api/v1/expenses/bulk/', lambda: [
+            fx.expense_payload(n) for n in range(30)
+        ]),
+        'pending-approvals': (fx.admin, 'get', lambda: '/api/v1/expenses/pending/', None),
+        'approve-expense': (
+            fx.manager, 'post',
+            lambda: f'/api/v1/expenses/{pending_id}/approve/',
+            lambda: {'action': 'approve', 'comment': 'Benchmark'},
+        ),
+        'expense-categories': (fx.employee, 'get', lambda: '/api/v1/expenses/categories/', None),
+        'expense-export': (fx.admin, 'get', lambda: '/api/v1/expenses/export/', None),
+        'admin-stats': (fx.admin, 'get', lambda: '/api/v1/admin/stats/', None),
+        'admin-stats-series': (fx.admin, 'get', lambda: '/api/v1/admin/stats/series/?interval=quarter&group_by=category', None),
+        'expense-report': (fx.admin, 'get', lambda: '/api/v1/reports/spend-by-category/', None),
+        'approval-rules': (fx.admin, 'get', lambda: '/api/v1/admin/approval-rules/', None),
+        'user-management': (fx.admin, 'get', lambda: '/api/v1/admin/users/', None),
+        'update-user': (
+            fx.admin, 'patch',
+            lambda: f'/api/v1/admin/users/{fx.employee.id}/',
+            lambda: {'first_name': 'Renamed'},
+        ),
+        'expense-create': (fx.employee, 'post', lambda: '/api/v1/expenses/', fx.expense_payload),
+        'delete-user': (fx.admin, 'delete', lambda: f'/api/v1/admin/users/{fx.employee.id}/delete/', None),
+        'assign-manager': (fx.admin, 'post', lambda: '/api/v1/assign-manager/', lambda: {
+            'manager_id': fx.manager.id, 'employee_id': fx.employee.id,
+        }),
+    }
+
+
+def route_names():
+    from . import urls
+    return [p.name for p in urls.urlpatterns if p.name]
+
+
+class BenchmarkRunner:
+    def __init__(self, password, iterations=20, warmup=2):
+        self.fx = Fixtures(password)
+        self.iterations = iterations
+        self.warmup = warmup
+        self.scenarios = build_scenarios(self.fx)
+        host = settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS else 'localhost'
+        self.client = Client(HTTP_HOST=host.lstrip('.') if host != '*' else 'localhost')
+
+    def missing_routes(self):
+        return [name for name in route_names() if name not in self.scenarios]
+
+    def _call(self, user, method, path, payload):
+        kwargs = {}
+        if user is not None:
+            kwargs['HTTP_AUTHORIZATION'] = f'Bearer {AccessToken.for_user(user)}'
+        if payload is not None:
+            kwargs.update(data=payload, content_type='application/json')
+        response = getattr(self.client, method)(path, **kwargs)
+        size = len(b''.join(response.streaming_content)) if response.streaming else len(response.content)
+        return response.status_code, size
+
+    def _run_once(self, scenario):
+        user, method, path, payload = scenario
+        # Build the payload inside the transaction so tokens and similar
+        # side effects are rolled back with the request. Rate limits are
+        # off: the benchmark measures the endpoints, which it calls far
+        # more often than any client may
+        with transaction.atomic(), override_settings(ADMISSION_CONTROL=False):
+            result = self._call(user, method, path(), payload() if payload else None)
+            transaction.set_rollback(True)
+        return result
+
+    def run_scenario(self, name):
+        scenario = self.scenarios[name]
+        for _ in range(self.warmup):
+            self._run_once(scenario)
+
+        latencies = []
+        queries = []
+        statuses = set()
+        size = 0
+        for _ in range(self.iterations):
+            with contextlib.ExitStack() as stack:
+                captures = [
+                    stack.enter_context(CaptureQueriesContext(connections[alias]))
+                    for alias in connections
+                ]
+                start = time.perf_counter()
+                status_code, size = self._run_once(scenario)
+                latencies.append((time.perf_counter() - start) * 1000)
+            queries.append(sum(len(c.captured_queries) for c in captures))
+            statuses.add(status_code)
+
+        # One traced run for memory; tracemalloc skews latency, so it is separate
+        tracemalloc.start()
+        self._run_once(scenario)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        latencies.sort()
+        return {
+            'method': scenario[1].upper(),
+            'status_codes': sorted(statuses),
+            'iterations': self.iterations,
+            'p50_ms': round(percentile(latencies, 50), 3),
+            'p95_ms': round(percentile(latencies, 95), 3),
+            'p99_ms': round(percentile(latencies, 99), 3),
+            'mean_ms': round(sum(latencies) / len(latencies), 3),
+            'queries_per_request': round(sum(queries) / len(queries), 2),
+            'max_queries': max(queries),
+            'response_bytes': size,
+            'peak_memory_kb': round(peak / 1024, 1),
+        }
+
+    def dataset(self):
+        return {
+            'users': User.objects.count(),
+            'expenses': Expense.objects.count(),
+            'approvals': ExpenseApproval.objects.count(),
+        }
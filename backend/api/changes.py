@@ -0,0 +1,95 @@
+"""Change log behind GET /expenses/changes/ (delta sync).
+
+Every write to an expense appends an ExpenseChange row, and the row ids
+form a monotonic sequence. A client keeps the last sequence number it
+synced to and later asks for the expenses named by newer rows: those it
+can still see come back whole, the rest as tombstones.
+
+Sequence numbers are handed out on insert, not commit, so a client must
+not skip a number whose transaction is still open. A token only moves
+past rows older than DELTA_SYNC_SETTLE_SECONDS; newer rows are sent
+again on the next sync, which is harmless because applying a change is
+idempotent.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import ArchivedExpense, Expense, ExpenseChange
+
+
+def record_expense_changes(expenses):
+    """Log a write to each of the expenses (saved or deleted instances)"""
+    ExpenseChange.objects.bulk_create([
+        ExpenseChange(expense_id=e.pk, company_id=e.company_id, employee_id=e.employee_id)
+        for e in expenses
+    ])
+
+
+def record_employee_changes(employee_id):
+    """Log every expense of an employee, e.g. when their manager changes"""
+    ExpenseChange.objects.bulk_create([
+        ExpenseChange(expense_id=pk, company_id=company_id, employee_id=employee_id)
+        for pk, company_id in Expense.objects.filter(employee_id=employee_id).values_list('pk', 'company_id')
+    ])
+
+
+def _settle_cutoff():
+    return timezone.now() - timedelta(seconds=settings.DELTA_SYNC_SETTLE_SECONDS)
+
+
+def current_token():
+    """Token for a client that has just loaded the full list"""
+    latest = ExpenseChange.objects.filter(
+        created_at__lt=_settle_cutoff()
+    ).order_by('-id').values_list('id', flat=True).first()
+    return latest or 0
+
+
+def latest_change(company_id):
+    """Sequence number of the company's latest expense write, a version for its expense data"""
+    return ExpenseChange.objects.filter(company_id=company_id).order_by('-id').values_list('id', flat=True).first() or 0
+
+
+def token_expired(since):
+    """True if log rows after since may have been purged, or since is from another database"""
+    first = ExpenseChange.objects.order_by('id').values_list('id', flat=True).first()
+    if first is None:
+        return since > 0
+    last = ExpenseChange.objects.order_by('-id').values_list('id', flat=True).first()
+    return since < first - 1 or since > last
+
+
+def changes_since(log, since, limit):
+    """Changed expense ids after since in log (a filtered ExpenseChange queryset).
+
+    Returns (expense ids, next token, has_more).
+    """
+    rows = list(log.filter(id__gt=since).order_by('id').values_list('id', 'expense_id', 'created_at')[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    cutoff = _settle_cutoff()
+    settled = [seq for seq, _, created_at in rows if created_at < cutoff]
+    next_token = max(settled) if settled else since
+    if has_more and next_token == since:
+        # The whole page is unsettled; move on rather than resend it forever
+        next_token = rows[-1][0]
+
+    return list(dict.fromkeys(expense_id for _, expense_id, _ in rows)), next_token, has_more
+
+
+def removal_reasons(expense_ids):
+    """Why each of the expense ids is not visible: hidden, archived or deleted"""
+    existing = set(Expense.objects.filter(pk__in=expense_ids).values_list('pk', flat=True))
+    archived = set(ArchivedExpense.objects.filter(pk__in=expense_ids).values_list('pk', flat=True))
+    return {
+        pk: 'hidden' if pk in existing else 'archived' if pk in archived else 'deleted'
+        for pk in expense_ids
+    }
+
+
+def purge_expense_changes(older_than):
+    deleted, _ = ExpenseChange.objects.filter(created_at__lt=timezone.now() - older_than).delete()
+    return deleted
@@ -0,0 +1,46 @@
+"""ETag validators for list endpoints.
+
+A list's validator is computed from one aggregate over the same queryset
+the view would serialize: the newest updated_at and the row count (which
+catches deletions), combined with the query parameters and any extra
+values the caller passes in. Callers pass a data version such as the
+latest change log sequence (api.changes.latest_change), since an edit
+plus a deletion, or a row leaving the user's view, can leave the
+aggregate as it was.
+
+There is no Last-Modified: a date cannot express those changes, and a
+client sending only If-Modified-Since would be told its stale copy is
+current.
+"""
+import hashlib
+from urllib.parse import urlencode
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control
+
+
+class ListValidators:
+    def __init__(self, request, queryset, *salt):
+        stats = queryset.order_by().aggregate(last_modified=Max('updated_at'), count=Count('pk'))
+        last_modified = stats['last_modified']
+        params = urlencode(sorted(
+            (key, value) for key, values in request.GET.lists() for value in values
+        ))
+        raw = ':'.join(str(part) for part in (
+            stats['count'], last_modified.isoformat() if last_modified else '', params, *salt
+        ))
+        # Weak: the same data may be rendered or compressed differently
+        self.etag = f'W/"{hashlib.md5(raw.encode()).hexdigest()}"'
+
+    def not_modified(self, request):
+        """A 304 response if the client's copy is current, otherwise None"""
+        response = get_conditional_response(request, etag=self.etag)
+        if response is not None:
+            self.apply(response)
+        return response
+
+    def apply(self, response):
+        response['ETag'] = self.etag
+        # Browsers may keep the list but must revalidate it on every use
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
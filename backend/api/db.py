@@ -0,0 +1,16 @@
+from django.db import connections, router
+
+
+def select_for_update_skip_locked(queryset):
+    """Lock the selected rows, skipping rows another transaction already holds.
+
+    Falls back to a plain queryset on backends without row locks (SQLite),
+    where writes are serialized by the database anyway.
+    """
+    db = router.db_for_write(queryset.model)
+    features = connections[db].features
+    if not features.has_select_for_update:
+        return queryset
+    if features.has_select_for_update_skip_locked:
+        return queryset.select_for_update(skip_locked=True)
+    return queryset.select_for_update()
@@ -0,0 +1,112 @@
+"""Read replica routing for views marked with @read_replica.
+
+After a write, a user's reads stay on the primary for REPLICA_PIN_SECONDS
+so they see their own changes. The pin is kept in two places. The cache
+holds it for requests in the same process (batches) or, with a shared
+cache, any worker. The write's response also carries a signed X-Primary-Pin
+header; clients send it back on their next requests, which pins them on
+whichever worker serves those.
+"""
+import contextvars
+import functools
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.utils.deprecation import MiddlewareMixin
+from rest_framework.permissions import SAFE_METHODS
+
+REPLICA_ALIAS = 'replica'
+PIN_HEADER = 'X-Primary-Pin'
+
+_pin_signer = signing.TimestampSigner(salt='api.db_router.primary-pin')
+
+# Set while a view marked with @read_replica is handling a safe request
+_read_intent = contextvars.ContextVar('expense_read_intent', default=False)
+
+
+def replica_configured():
+    return REPLICA_ALIAS in settings.DATABASES
+
+
+def _pin_key(user_id):
+    return f'db:primary-pin:{user_id}'
+
+
+def pin_to_primary(user):
+    """Keep the user's reads on the primary long enough to see their own writes"""
+    cache.set(_pin_key(user.pk), True, settings.REPLICA_PIN_SECONDS)
+
+
+def primary_pin_token(user):
+    """Value of the X-Primary-Pin header that pins the user's later requests"""
+    return _pin_signer.sign(str(user.pk))
+
+
+def is_pinned_to_primary(request, user):
+    token = request.headers.get(PIN_HEADER)
+    if token:
+        try:
+            if _pin_signer.unsign(token, max_age=settings.REPLICA_PIN_SECONDS) == str(user.pk):
+                return True
+        except signing.BadSignature:
+            pass
+    return bool(cache.get(_pin_key(user.pk)))
+
+
+def read_replica(view):
+    """Mark a view as read-only so its GET queries may be served by the replica.
+
+    Goes inside @api_view so request.user is already authenticated.
+    """
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        user = request.user
+        if (
+            request.method not in SAFE_METHODS
+            or not replica_configured()
+            or (user.is_authenticated and is_pinned_to_primary(request, user))
+        ):
+            return view(request, *args, **kwargs)
+
+        token = _read_intent.set(True)
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _read_intent.reset(token)
+
+    return wrapper
+
+
+class ReplicaRouter:
+    """Send reads to the replica only inside views marked with @read_replica"""
+
+    def db_for_read(self, model, **hints):
+        if _read_intent.get():
+            return REPLICA_ALIAS
+        return None
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
+
+
+class PrimaryPinMiddleware(MiddlewareMixin):
+    """Pin a user to the primary after any successful write request they make"""
+
+    def process_response(self, request, response):
+        user = getattr(request, 'user', None)
+        if (
+            request.method not in SAFE_METHODS
+            and response.status_code < 400
+            and user is not None
+            and user.is_authenticated
+            and replica_configured()
+        ):
+            pin_to_primary(user)
+            response[PIN_HEADER] = primary_pin_token(user)
+
+        return response
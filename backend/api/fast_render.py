@@ -0,0 +1,212 @@
+"""Read-only fast path for rendering expense lists.
+
+Produces the same data as ExpenseSerializer(many=True) without building
+model instances or running serializers per row: expense columns come
+from .values(), approvals from one batched .values() query, and nested
+users, categories and company currencies from lookup maps. The work per
+field is planned once per request from the serializer's own field list,
+so field selection (api.views.expense_context) and field order carry
+over unchanged.
+
+FastRenderingParityTests in api/tests.py check the output against the
+serializer, and ``manage.py compare_expense_rendering`` compares both byte
+for byte on a seeded database and times them.
+"""
+from django.conf import settings
+from rest_framework import serializers
+from rest_framework.settings import api_settings
+
+from .models import Expense
+from .serializers import ExpenseSerializer
+
+# Field types whose representation of a loaded column value is the value itself
+_IDENTITY_FIELDS = (
+    serializers.CharField,
+    serializers.ChoiceField,
+    serializers.IntegerField,
+    serializers.BooleanField,
+    serializers.PrimaryKeyRelatedField,
+)
+# Field types rendered by calling the DRF field on the column value
+_CONVERTED_FIELDS = (
+    serializers.UUIDField,
+    serializers.DecimalField,
+    serializers.DateTimeField,
+    serializers.DateField,
+)
+
+
+def _full_name(user):
+    # Same as AbstractUser.get_full_name()
+    return f"{user['first_name']} {user['last_name']}".strip()
+
+
+# The SerializerMethodFields, re-implemented on column dicts:
+# name -> (own columns, relation, columns of the related row, function(row, related row))
+METHOD_FIELDS = {
+    'full_name': ({'first_name', 'last_name'}, None, None, lambda row, related: _full_name(row)),
+    'employee_name': (set(), 'employee', {'first_name', 'last_name'}, lambda row, related: (
+        _full_name(related) if related else ''
+    )),
+    'company_currency': (set(), 'company', {'currency'}, lambda row, related: (
+        related['currency'] if related else 'USD'
+    )),
+    'amount_numeric': ({'amount'}, None, None, lambda row, related: (
+        float(row['amount']) if row['amount'] else 0.0
+    )),
+    'converted_amount_numeric': ({'amount', 'converted_amount'}, None, None, lambda row, related: (
+        float(row['converted_amount']) if row['converted_amount']
+        else float(row['amount']) if row['amount'] else 0.0
+    )),
+}
+
+
+class UnsupportedField(Exception):
+    """The serializer has a field the fast path cannot reproduce"""
+
+
+class Plan:
+    """How to build one serializer's output from a column dict.
+
+    Steps are (name, column, kind, extra). `lookups` lists the related rows
+    the steps read, as (column holding the id, related model, columns).
+    """
+
+    def __init__(self, fields, model):
+        self.model = model
+        self.columns = {model._meta.pk.attname}
+        self.steps = []
+        self.lookups = []
+        self.lists = []
+
+        for name, field in fields.items():
+            if isinstance(field, serializers.SerializerMethodField):
+                if name not in METHOD_FIELDS:
+                    raise UnsupportedField(name)
+                own_columns, relation, related_columns, function = METHOD_FIELDS[name]
+                self.columns |= own_columns
+                column = related_model = None
+                if relation:
+                    model_field = model._meta.get_field(relation)
+                    column, related_model = model_field.attname, model_field.related_model
+                    self.columns.add(column)
+                    self.lookups.append((column, related_model, related_columns))
+                self.steps.append((name, column, 'method', (function, related_model)))
+                continue
+
+            model_field = model._meta.get_field(field.source)
+            if isinstance(field, serializers.ListSerializer):
+                child = Plan(field.child.fields, model_field.related_model)
+                foreign_key = model_field.field.attname
+                child.columns.add(foreign_key)
+                self.lists.append((name, foreign_key, child))
+                self.steps.append((name, None, 'list', child))
+                continue
+
+            column = model_field.attname
+            self.columns.add(column)
+            if isinstance(field, serializers.Serializer):
+                nested = Plan(field.fields, model_field.related_model)
+                self.lookups.append((column, nested.model, nested.columns))
+                self.steps.append((name, column, 'nested', nested))
+            elif isinstance(field, _IDENTITY_FIELDS):
+                self.steps.append((name, column, 'value', None))
+            elif isinstance(field, serializers.FileField):
+                use_url = getattr(field, 'use_url', api_settings.UPLOADED_FILES_USE_URL)
+                self.steps.append((name, column, 'file', (model_field.storage, use_url, field.context.get('request'))))
+            elif isinstance(field, _CONVERTED_FIELDS):
+                self.steps.append((name, column, 'convert', field.to_representation))
+            else:
+                raise UnsupportedField(name)
+
+    def render(self, row, maps):
+        data = {}
+        for name, column, kind, extra in self.steps:
+            if kind == 'method':
+                function, related_model = extra
+                related = maps[related_model].get(row[column]) if related_model else None
+                data[name] = function(row, related)
+            elif kind == 'list':
+                data[name] = [extra.render(item, maps) for item in maps[name].get(row['id'], ())]
+            else:
+                value = row[column]
+                if value is None:
+                    data[name] = None
+                elif kind == 'value':
+                    data[name] = value
+                elif kind == 'convert':
+                    data[name] = extra(value)
+                elif kind == 'file':
+                    storage, use_url, request = extra
+                    if not value:
+                        data[name] = None
+                    elif not use_url:
+                        data[name] = value
+                    else:
+                        url = storage.url(value)
+                        data[name] = request.build_absolute_uri(url) if request is not None else url
+                else:
+                    data[name] = extra.render(maps[extra.model][value], maps)
+        return data
+
+
+class ExpenseListRenderer:
+    """Renders expense querysets as ExpenseSerializer(many=True, context=context) would.
+
+    model is Expense or ArchivedExpense, whose approvals live in their own table.
+    """
+
+    def __init__(self, context, model=Expense):
+        self.plan = Plan(ExpenseSerializer(context=context).fields, model)
+
+    def render(self, queryset):
+        rows = list(queryset.values(*sorted(self.plan.columns)))
+        maps = {}
+        # Related rows to load: model -> (ids, columns)
+        wanted = {}
+
+        def collect(plan, items):
+            for column, model, columns in plan.lookups:
+                ids, all_columns = wanted.setdefault(model, (set(), {model._meta.pk.attname}))
+                ids.update(item[column] for item in items)
+                all_columns |= columns
+
+        collect(self.plan, rows)
+
+        # One query per related list (approvals) for all rows
+        expense_ids = [row['id'] for row in rows]
+        for name, foreign_key, child in self.plan.lists:
+            items = child.model.objects.filter(**{f'{foreign_key}__in': expense_ids}).values(
+                *sorted(child.columns)
+            ) if expense_ids else []
+            grouped = maps[name] = {}
+            for item in items:
+                grouped.setdefault(item[foreign_key], []).append(item)
+            collect(child, [item for group in grouped.values() for item in group])
+
+        for model, (ids, columns) in wanted.items():
+            ids.discard(None)
+            pk = model._meta.pk.attname
+            maps[model] = {
+                item[pk]: item for item in model.objects.filter(pk__in=ids).values(*sorted(columns))
+            } if ids else {}
+
+        return [self.plan.render(row, maps) for row in rows]
+
+
+def serialize_expense_list(queryset, context):
+    queryset = ExpenseSerializer.optimize_queryset(queryset, context)
+    return ExpenseSerializer(queryset, many=True, context=context).data
+
+
+def render_expense_list(queryset, context):
+    """Expense list data for context, through the fast path unless it is
+    switched off (FAST_EXPENSE_LISTS) or cannot reproduce a field
+    """
+    if not settings.FAST_EXPENSE_LISTS:
+        return serialize_expense_list(queryset, context)
+    try:
+        renderer = ExpenseListRenderer(context, queryset.model)
+    except UnsupportedField:
+        return serialize_expense_list(queryset, context)
+    return renderer.render(queryset)
@@ -0,0 +1,169 @@
+"""Query-parameter filters and facet counts for expense lists.
+
+Status, category and employee are facets: a filter sidebar shows counts
+for each of their values. A facet's counts apply every filter except its
+own, so picking one status still shows how many expenses the others
+have. All three come from one grouped query over the expenses the
+non-facet filters select (see expense_facets).
+"""
+import calendar
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Count, Q
+from django.utils.dateparse import parse_date
+
+from .models import Expense
+
+# Facet name -> expense column its values are ids of
+FACETS = {
+    'status': 'status',
+    'category': 'category_id',
+    'employee': 'employee_id',
+}
+
+
+def parse_date_param(params, name, end=False):
+    """Date of ?name= (YYYY-MM-DD or YYYY-MM), or None when absent.
+
+    A month means its first day, or its last with end=True. Raises
+    ValueError with a message for the client.
+    """
+    value = params.get(name)
+    if not value:
+        return None
+    day = None
+    try:
+        if value.count('-') == 1:
+            day = parse_date(f'{value}-01')
+            if day and end:
+                day = day.replace(day=calendar.monthrange(day.year, day.month)[1])
+        else:
+            day = parse_date(value)
+    except ValueError:
+        pass
+    if day is None:
+        raise ValueError(f'{name} must be a date (YYYY-MM-DD) or month (YYYY-MM)')
+    return day
+
+
+def _parse_amount(params, name):
+    value = params.get(name)
+    if not value:
+        return None
+    try:
+        amount = Decimal(value)
+    except InvalidOperation:
+        amount = None
+    if amount is None or not amount.is_finite():
+        raise ValueError(f'{name} must be a number')
+    return amount
+
+
+def _parse_list(params, name, convert=str):
+    """Values of ?name=a,b (or repeated ?name=); 'all' or nothing means no filter"""
+    values = [v.strip() for raw in params.getlist(name) for v in raw.split(',') if v.strip()]
+    if not values or 'all' in values:
+        return []
+    try:
+        return [convert(v) for v in values]
+    except ValueError:
+        raise ValueError(f'{name} must be a list of ids')
+
+
+def _parse_category(value):
+    # ?category=none selects uncategorized expenses
+    return None if value == 'none' else int(value)
+
+
+class ExpenseFilters:
+    """The expense list filters of a request's query parameters.
+
+    ?date_from=, ?date_to= (expense_date), ?min_amount=, ?max_amount=
+    (converted_amount), ?currency=, and the facets ?status=, ?category=
+    and ?employee=. Lists are comma separated. Raises ValueError with a
+    message for the client.
+    """
+
+    def __init__(self, params):
+        self.lookups = {}
+        date_from = parse_date_param(params, 'date_from')
+        date_to = parse_date_param(params, 'date_to', end=True)
+        min_amount = _parse_amount(params, 'min_amount')
+        max_amount = _parse_amount(params, 'max_amount')
+        currencies = _parse_list(params, 'currency', str.upper)
+        if date_from:
+            self.lookups['expense_date__gte'] = date_from
+        if date_to:
+            self.lookups['expense_date__lte'] = date_to
+        if min_amount is not None:
+            self.lookups['converted_amount__gte'] = min_amount
+        if max_amount is not None:
+            self.lookups['converted_amount__lte'] = max_amount
+        if currencies:
+            self.lookups['currency__in'] = currencies
+
+        self.selected = {
+            'status': _parse_list(params, 'status'),
+            'category': _parse_list(params, 'category', _parse_category),
+            'employee': _parse_list(params, 'employee', int),
+        }
+
+    def base(self, queryset):
+        """queryset narrowed by the non-facet filters only"""
+        return queryset.filter(**self.lookups)
+
+    def apply(self, queryset):
+        """queryset narrowed by every filter"""
+        queryset = self.base(queryset)
+        for facet, values in self.selected.items():
+            if values:
+                queryset = queryset.filter(_facet_q(facet, values))
+        return queryset
+
+
+def _facet_q(facet, values):
+    column = FACETS[facet]
+    query = Q(**{f'{column}__in': [v for v in values if v is not None]})
+    if None in values:
+        query |= Q(**{f'{column}__isnull': True})
+    return query
+
+
+def expense_facets(queryset, filters):
+    """Counts per status, category and employee for a filter sidebar.
+
+    queryset must be narrowed by filters.base() only; the facet
+    selections are applied here, each facet ignoring its own.
+    """
+    rows = queryset.order_by().values(
+        'status', 'category_id', 'category__name',
+        'employee_id', 'employee__first_name', 'employee__last_name', 'employee__email',
+    ).annotate(count=Count('pk'))
+
+    status_labels = dict(Expense.STATUS_CHOICES)
+    facets = {facet: {} for facet in FACETS}
+    for row in rows:
+        keys = {facet: row[column] for facet, column in FACETS.items()}
+        for facet, key in keys.items():
+            if not all(
+                not filters.selected[other] or keys[other] in filters.selected[other]
+                for other in FACETS if other != facet
+            ):
+                continue
+            if key not in facets[facet]:
+                if facet == 'status':
+                    label = status_labels.get(key, key)
+                elif facet == 'category':
+                    label = row['category__name'] or 'Uncategorized'
+                else:
+                    label = (
+                        f"{row['employee__first_name']} {row['employee__last_name']}".strip()
+                        or row['employee__email']
+                    )
+                facets[facet][key] = {'key': key, 'label': label, 'count': 0}
+            facets[facet][key]['count'] += row['count']
+
+    return {
+        facet: sorted(values.values(), key=lambda item: (-item['count'], item['label']))
+        for facet, values in facets.items()
+    }
@@ -0,0 +1,106 @@
+import functools
+import hashlib
+import json
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+
+
+def _fingerprint(request):
+    payload = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(f'{request.method} {request.path}\n{payload}'.encode()).hexdigest()
+
+
+def _claim(user, key, fingerprint):
+    """Return (record, owned); owned is True when this request must run the view"""
+    now = timezone.now()
+    expires_at = now + settings.IDEMPOTENCY_KEY_TTL
+    record, created = IdempotencyKey.objects.get_or_create(
+        user=user,
+        key=key,
+        defaults={'request_fingerprint': fingerprint, 'expires_at': expires_at}
+    )
+    if created:
+        return record, True
+
+    if record.expires_at <= now:
+        # Expired keys are reused; the conditional update picks one winner
+        # if several retries arrive together
+        taken = IdempotencyKey.objects.filter(pk=record.pk, expires_at__lte=now).update(
+            request_fingerprint=fingerprint,
+            response_status=None,
+            response_body=None,
+            expires_at=expires_at
+        )
+        if taken:
+            record.refresh_from_db()
+            return record, True
+        record.refresh_from_db()
+
+    return record, False
+
+
+def idempotent(view):
+    """Replay the stored response for POSTs retried with the same Idempotency-Key.
+
+    Goes inside @api_view. Requests without the header run as usual.
+    """
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if request.method != 'POST' or not key or not request.user.is_authenticated:
+            return view(request, *args, **kwargs)
+
+        if len(key) > 255:
+            return Response({
+                'success': False,
+                'error': f'{HEADER} must be at most 255 characters'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        fingerprint = _fingerprint(request)
+        record, owned = _claim(request.user, key, fingerprint)
+
+        if not owned:
+            if record.request_fingerprint != fingerprint:
+                return Response({
+                    'success': False,
+                    'error': f'{HEADER} was already used for a different request'
+                }, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+            if record.response_status is None:
+                return Response({
+                    'success': False,
+                    'error': 'A request with this Idempotency-Key is still in progress'
+                }, status=status.HTTP_409_CONFLICT, headers={'Retry-After': '1'})
+            return Response(
+                record.response_body,
+                status=record.response_status,
+                headers={'Idempotent-Replayed': 'true'}
+            )
+
+        try:
+            response = view(request, *args, **kwargs)
+        except Exception:
+            record.delete()
+            raise
+
+        if response.status_code >= 500 or not isinstance(response, Response):
+            # Let the client retry failures for real
+            record.delete()
+        else:
+            record.response_status = response.status_code
+            record.response_body = response.data
+            record.save(update_fields=['response_status', 'response_body'])
+
+        return response
+
+    return wrapper
+
+
+def purge_expired_keys():
+    return IdempotencyKey.objects.filter(expires_at__lte=timezone.now()).delete()[0]
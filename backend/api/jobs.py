@@ -0,0 +1,152 @@
+"""Table-backed background job queue.
+
+Jobs are rows in api_job; ``manage.py run_jobs`` claims and runs them.
+Handlers are registered by name with @register and receive the Job, whose
+payload holds their arguments. A handler that raises is retried with
+exponential backoff until max_attempts, then left as failed.
+"""
+import logging
+import os
+import socket
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .db import select_for_update_skip_locked
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+_handlers = {}
+
+
+def register(name):
+    """Decorator registering a job handler under name"""
+    def decorator(handler):
+        _handlers[name] = handler
+        return handler
+    return decorator
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def enqueue(name, delay=None, **payload):
+    """Queue a job; with JOB_QUEUE_EAGER it runs once the current transaction commits"""
+    job = Job.objects.create(
+        name=name,
+        payload=payload,
+        max_attempts=settings.JOB_MAX_ATTEMPTS,
+        run_after=timezone.now() + (delay or timedelta()),
+    )
+    if settings.JOB_QUEUE_EAGER:
+        transaction.on_commit(lambda: run_claimed(claim_job(job.pk, 'eager')))
+    return job
+
+
+def enqueue_many(jobs):
+    """Queue several (name, payload) jobs with one insert; see enqueue"""
+    now = timezone.now()
+    created = Job.objects.bulk_create([
+        Job(name=name, payload=payload, max_attempts=settings.JOB_MAX_ATTEMPTS, run_after=now)
+        for name, payload in jobs
+    ])
+    if settings.JOB_QUEUE_EAGER:
+        transaction.on_commit(lambda: [run_claimed(claim_job(job.pk, 'eager')) for job in created])
+    return created
+
+
+def _claimable(now):
+    return Q(status='queued', run_after__lte=now) | Q(
+        status='running', locked_at__lt=now - settings.JOB_LOCK_TIMEOUT
+    )
+
+
+def _claim_values(worker, now):
+    return {
+        'status': 'running',
+        'locked_by': worker,
+        'locked_at': now,
+        'attempts': F('attempts') + 1,
+    }
+
+
+def claim_job(pk, worker):
+    """Claim one specific job, or return None if it is not claimable"""
+    now = timezone.now()
+    if not Job.objects.filter(_claimable(now), pk=pk).update(**_claim_values(worker, now)):
+        return None
+    return Job.objects.get(pk=pk)
+
+
+def claim_jobs(worker, limit=10):
+    """Claim up to limit due jobs for worker, oldest first"""
+    now = timezone.now()
+    due = Job.objects.filter(_claimable(now)).order_by('run_after')
+    features = connections[router.db_for_write(Job)].features
+
+    if features.has_select_for_update_skip_locked:
+        # Rows locked by another worker's claim are skipped, not waited on
+        with transaction.atomic():
+            ids = list(select_for_update_skip_locked(due).values_list('pk', flat=True)[:limit])
+            Job.objects.filter(pk__in=ids).update(**_claim_values(worker, now))
+    else:
+        # No row locks (SQLite): each claim is a conditional update, and
+        # only the worker whose update matched the row gets the job
+        ids = [
+            pk for pk in list(due.values_list('pk', flat=True)[:limit])
+            if Job.objects.filter(_claimable(now), pk=pk).update(**_claim_values(worker, now))
+        ]
+
+    return list(Job.objects.filter(pk__in=ids).order_by('run_after'))
+
+
+def retry_delay(attempts):
+    return timedelta(seconds=min(
+        settings.JOB_RETRY_BACKOFF * 2 ** max(attempts - 1, 0),
+        settings.JOB_RETRY_BACKOFF_MAX,
+    ))
+
+
+def run_claimed(job):
+    """Run a claimed job and record the outcome; returns True on success"""
+    if job is None:
+        return False
+
+    try:
+        handler = _handlers.get(job.name)
+        if handler is None:
+            raise LookupError(f'No handler registered for job {job.name!r}')
+        handler(job)
+    except Exception as e:
+        now = timezone.now()
+        update = {'last_error': f'{type(e).__name__}: {e}', 'locked_by': '', 'locked_at': None}
+        if job.is_last_attempt:
+            update.update(status='failed', finished_at=now)
+            logger.exception('Job failed', extra={'job_id': job.pk, 'job': job.name, 'attempts': job.attempts})
+        else:
+            update.update(status='queued', run_after=now + retry_delay(job.attempts))
+            logger.warning(
+                'Job will be retried: %s', e,
+                extra={'job_id': job.pk, 'job': job.name, 'attempts': job.attempts}
+            )
+        Job.objects.filter(pk=job.pk, locked_by=job.locked_by).update(**update)
+        return False
+
+    Job.objects.filter(pk=job.pk, locked_by=job.locked_by).update(
+        status='done', finished_at=timezone.now(), locked_by='', locked_at=None, last_error=''
+    )
+    return True
+
+
+def run_pending(worker=None, limit=10):
+    """Claim and run one batch of due jobs; returns how many were claimed"""
+    jobs = claim_jobs(worker or worker_name(), limit)
+    for job in jobs:
+        run_claimed(job)
+    return len(jobs)
+
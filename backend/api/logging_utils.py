@@ -0,0 +1,71 @@
+"""Logging building blocks referenced from settings.LOGGING."""
+import atexit
+import copy
+import json
+import logging
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+# Attributes every LogRecord has; anything else came in through extra=
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'taskName'}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: timestamp, level, logger, message and extras"""
+
+    def format(self, record):
+        data = {
+            'ts': datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                data[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data['exc_info'] = record.exc_text
+        return json.dumps(data, default=str)
+
+
+class SampleFilter(logging.Filter):
+    """Let through roughly `rate` of the records of the logger it is attached to"""
+
+    def __init__(self, rate=0.01):
+        super().__init__()
+        self.rate = float(rate)
+
+    def filter(self, record):
+        return self.rate >= 1 or random.random() < self.rate
+
+
+class QueueJsonHandler(QueueHandler):
+    """Hand records to a background thread that writes them as JSON lines.
+
+    The request thread only enqueues, so a slow stdout/stderr never blocks it.
+    """
+
+    def __init__(self, level=logging.NOTSET, stream=None):
+        super().__init__(queue.SimpleQueue())
+        self.setLevel(level)
+        target = logging.StreamHandler(stream or sys.stderr)
+        target.setFormatter(JsonFormatter())
+        self.listener = QueueListener(self.queue, target)
+        self.listener.start()
+        atexit.register(self.listener.stop)
+
+    def prepare(self, record):
+        # Resolve the message and traceback now: args may be mutated by the
+        # caller and exc_info does not survive the trip to another thread
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
@@ -0,0 +1,16 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.archive import archive_settled_expenses
+
+
+class Command(BaseCommand):
+    help = 'Move expenses settled more than --days ago into the archive tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.ARCHIVE_AFTER_DAYS)
+        parser.add_argument('--batch-size', type=int, default=settings.ARCHIVE_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        moved = archive_settled_expenses(options['days'], options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Archived {moved} expenses'))
@@ -0,0 +1,80 @@
+import json
+import subprocess
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from api.benchmark import BenchmarkRunner
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = 'Benchmark every API route against the current (seeded) database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument('--password', default='benchmark-pass', help='Password of the seeded users')
+        parser.add_argument('--only', nargs='*', help='URL names to run (default: all)')
+        parser.add_argument('--output', help='Write JSON results to this file')
+        parser.add_argument('--compare', help='Earlier JSON results to compare p50 and queries against')
+
+    def handle(self, *args, **options):
+        runner = BenchmarkRunner(options['password'], options['iterations'], options['warmup'])
+
+        for name in runner.missing_routes():
+            self.stderr.write(self.style.WARNING(f'No benchmark scenario for route {name!r}'))
+
+        names = options['only'] or sorted(runner.scenarios)
+        results = {}
+        for name in names:
+            results[name] = runner.run_scenario(name)
+            self.stdout.write(self.format_row(name, results[name]))
+
+        report = {
+            'revision': git_revision(),
+            'created_at': timezone.now().isoformat(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'dataset': runner.dataset(),
+            'results': results,
+        }
+
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                json.dump(report, fh, indent=2, sort_keys=True)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+        if options['compare']:
+            with open(options['compare']) as fh:
+                self.compare(json.load(fh), report)
+
+    def format_row(self, name, r):
+        return (
+            f"{name:<22} {r['method']:<6} p50 {r['p50_ms']:>9.2f}ms  p95 {r['p95_ms']:>9.2f}ms  "
+            f"p99 {r['p99_ms']:>9.2f}ms  queries {r['queries_per_request']:>7.1f}  "
+            f"peak {r['peak_memory_kb']:>9.1f}KB  status {r['status_codes']}"
+        )
+
+    def compare(self, baseline, report):
+        self.stdout.write(f"\nCompared with {baseline.get('revision') or 'baseline'}:")
+        for name, current in report['results'].items():
+            before = baseline.get('results', {}).get(name)
+            if not before:
+                continue
+            change = (current['p50_ms'] - before['p50_ms']) / before['p50_ms'] * 100 if before['p50_ms'] else 0
+            self.stdout.write(
+                f"{name:<22} p50 {before['p50_ms']:.2f} -> {current['p50_ms']:.2f}ms ({change:+.1f}%)  "
+                f"queries {before['queries_per_request']} -> {current['queries_per_request']}"
+            )
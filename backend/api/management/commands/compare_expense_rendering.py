@@ -0,0 +1,86 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from api.fast_render import ExpenseListRenderer, serialize_expense_list
+from api.models import User
+from api.renderers import FastJSONRenderer
+from api.views import expense_context, get_visible_expenses
+
+# Query strings of the list variants to compare (see expense_context)
+VARIANTS = [
+    '',
+    'compact=1',
+    'fields=id,amount,status,employee_name,approvals',
+    'expand=employee,approvals.approver',
+    'expand=',
+]
+
+
+class Command(BaseCommand):
+    help = 'Check the fast expense list path against ExpenseSerializer byte for byte and time both'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=10)
+        parser.add_argument('--email', nargs='*', help='Users to list expenses for (default: one per role)')
+
+    def handle(self, *args, **options):
+        users = self.get_users(options['email'])
+        renderer = FastJSONRenderer()
+        factory = RequestFactory()
+        mismatches = 0
+
+        for user in users:
+            queryset = get_visible_expenses(user).order_by('-created_at')
+            for query in VARIANTS:
+                context = expense_context(factory.get(f'/?{query}'))
+                fast = ExpenseListRenderer(context)
+
+                expected = renderer.render(serialize_expense_list(queryset, context))
+                actual = renderer.render(fast.render(queryset))
+                if actual != expected:
+                    mismatches += 1
+                    self.stderr.write(self.style.ERROR(
+                        f'{user.email} ?{query}: output differs ({len(actual)} vs {len(expected)} bytes)'
+                    ))
+                    continue
+
+                slow_ms, slow_queries = self.time(options['iterations'], serialize_expense_list, queryset, context)
+                fast_ms, fast_queries = self.time(options['iterations'], lambda qs, _: fast.render(qs), queryset, context)
+                self.stdout.write(
+                    f'{user.role:<9} ?{query:<48} {len(expected):>8} bytes  '
+                    f'serializer {slow_ms:8.2f}ms/{slow_queries}q  fast {fast_ms:8.2f}ms/{fast_queries}q  '
+                    f'x{slow_ms / fast_ms if fast_ms else 0:.1f}'
+                )
+
+        if mismatches:
+            raise CommandError(f'{mismatches} list variants render differently')
+        self.stdout.write(self.style.SUCCESS('Fast path output matches ExpenseSerializer'))
+
+    def get_users(self, emails):
+        if emails:
+            return list(User.objects.filter(email__in=emails))
+        users = []
+        for role in ('admin', 'manager', 'employee'):
+            # The user with the most expenses, so the timings mean something
+            user = User.objects.filter(role=role).annotate(
+                expense_count=Count('expenses')
+            ).order_by('-expense_count').first()
+            if user is not None:
+                users.append(user)
+        return users
+
+    def time(self, iterations, render, queryset, context):
+        """Median milliseconds per render, and queries per render"""
+        timings = []
+        for _ in range(iterations):
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                list(render(queryset, context))
+                timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        return timings[len(timings) // 2], len(queries)
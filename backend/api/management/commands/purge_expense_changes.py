@@ -0,0 +1,12 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.changes import purge_expense_changes
+
+
+class Command(BaseCommand):
+    help = 'Delete delta-sync change log rows older than DELTA_SYNC_RETENTION'
+
+    def handle(self, *args, **options):
+        deleted = purge_expense_changes(settings.DELTA_SYNC_RETENTION)
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} expense change log rows'))
@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from accounts.revocation import purge_expired_tokens
+from api.tasks import schedule_token_purge
+
+
+class Command(BaseCommand):
+    help = 'Delete expired outstanding and blacklisted JWT refresh tokens in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.TOKEN_PURGE_BATCH_SIZE)
+        parser.add_argument(
+            '--schedule', action='store_true',
+            help='Also queue the recurring accounts.purge_tokens job (run by run_jobs)'
+        )
+
+    def handle(self, *args, **options):
+        deleted = purge_expired_tokens(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} expired tokens'))
+        if options['schedule']:
+            schedule_token_purge()
+            self.stdout.write(f'Next purge in {settings.TOKEN_PURGE_INTERVAL}')
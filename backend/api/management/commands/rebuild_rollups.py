@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from api.models import Company
+from api.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Recompute the expense spend rollups from the hot and archived expenses'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--company', nargs='*', help='Company names (default: every company)')
+
+    def handle(self, *args, **options):
+        if options['company'] is None:
+            rows = rebuild_rollups()
+        else:
+            rows = sum(
+                rebuild_rollups(company.pk)
+                for company in Company.objects.filter(name__in=options['company'])
+            )
+        self.stdout.write(self.style.SUCCESS(f'Wrote {rows} rollup rows'))
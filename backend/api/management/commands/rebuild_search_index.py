@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from api.search import get_backend
+
+
+class Command(BaseCommand):
+    help = 'Create the expense full-text search index if it is missing, and reindex every expense'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        backend = get_backend(connection)
+        # install() reindexes when it has to create the index
+        if not backend.install(connection):
+            backend.rebuild(connection)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt the {type(backend).__name__} index'))
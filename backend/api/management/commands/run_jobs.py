@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.jobs import run_pending, worker_name
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs; keeps polling unless --once is given'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Run the jobs due now and exit')
+        parser.add_argument('--batch-size', type=int, default=10)
+        parser.add_argument('--sleep', type=float, default=1.0, help='Seconds to wait when no job is due')
+
+    def handle(self, *args, **options):
+        worker = worker_name()
+        total = 0
+        while True:
+            claimed = run_pending(worker, options['batch_size'])
+            total += claimed
+            if options['once'] and not claimed:
+                break
+            if not claimed:
+                time.sleep(options['sleep'])
+        self.stdout.write(self.style.SUCCESS(f'Ran {total} jobs'))
@@ -0,0 +1,176 @@
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from accounts.models import User
+from api.models import (
+    Company, ExpenseCategory, Expense, ExpenseApproval, ManagerEmployee
+)
+from api.rollups import rebuild_rollups
+from api.views import get_default_approval_flow
+
+CATEGORY_NAMES = ['Travel', 'Meals', 'Lodging', 'Transport', 'Office Supplies', 'Software', 'Training']
+DESCRIPTIONS = [
+    'Hotel stay for client visit', 'Client dinner', 'Taxi to airport', 'Flight to conference',
+    'Team lunch', 'Train ticket', 'Conference registration', 'Printer paper and toner',
+    'Annual software license', 'Parking at client site', 'Breakfast meeting', 'Online course',
+]
+CURRENCIES = ['USD', 'USD', 'USD', 'EUR', 'GBP', 'INR']
+# Weighted towards settled expenses, like a real history
+STATUSES = ['approved'] * 5 + ['rejected'] * 2 + ['paid'] * 2 + ['pending_approval'] * 3 + ['submitted', 'draft']
+
+
+class Command(BaseCommand):
+    help = 'Seed realistic companies, users, manager graphs, expenses and approvals'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--companies', type=int, default=1)
+        parser.add_argument('--managers', type=int, default=5, help='Managers per company')
+        parser.add_argument('--employees', type=int, default=8, help='Employees per manager')
+        parser.add_argument('--expenses', type=int, default=25, help='Expenses per employee')
+        parser.add_argument('--password', default='benchmark-pass', help='Password for every seeded user')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        # Hash once; PBKDF2 per user would dominate seeding time
+        password = make_password(options['password'])
+        first_index = Company.objects.filter(name__startswith='Seed Company ').count()
+
+        totals = {'users': 0, 'expenses': 0, 'approvals': 0}
+        for offset in range(options['companies']):
+            with transaction.atomic():
+                counts = self.seed_company(first_index + offset + 1, rng, password, options)
+            for key, value in counts.items():
+                totals[key] += value
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {options['companies']} companies, {totals['users']} users, "
+            f"{totals['expenses']} expenses and {totals['approvals']} approvals"
+        ))
+
+    def seed_company(self, index, rng, password, options):
+        company = Company.objects.create(name=f'Seed Company {index}', currency='USD')
+        ExpenseCategory.objects.bulk_create([
+            ExpenseCategory(name=name, company=company) for name in CATEGORY_NAMES
+        ])
+        categories = list(ExpenseCategory.objects.filter(company=company))
+
+        def make_user(role, number):
+            return User(
+                email=f'seed{index}-{role}{number}@example.com',
+                username=f'seed{index}-{role}{number}',
+                first_name=role.title(),
+                last_name=str(number),
+                role=role,
+                company_name=company.name,
+                currency=company.currency,
+                password=password,
+            )
+
+        admin = make_user('admin', 1)
+        managers = [make_user('manager', n) for n in range(1, options['managers'] + 1)]
+        employees = [
+            make_user('employee', n)
+            for n in range(1, options['managers'] * options['employees'] + 1)
+        ]
+        User.objects.bulk_create([admin, *managers, *employees])
+        # bulk_create does not return primary keys on every backend
+        users = {u.email: u for u in User.objects.filter(company_name=company.name)}
+        admin = users[admin.email]
+        managers = [users[m.email] for m in managers]
+        employees = [users[e.email] for e in employees]
+
+        ManagerEmployee.objects.bulk_create([
+            ManagerEmployee(
+                manager=managers[number // options['employees']],
+                employee=employee,
+                company=company
+            )
+            for number, employee in enumerate(employees)
+        ])
+
+        approval_flow = get_default_approval_flow(company)
+        now = timezone.now()
+
+        expenses = []
+        approvals = []
+        for number, employee in enumerate(employees):
+            manager = managers[number // options['employees']]
+            for _ in range(options['expenses']):
+                expense, expense_approvals = self.make_expense(
+                    rng, now, company, employee, manager, admin, categories, approval_flow
+                )
+                expenses.append(expense)
+                approvals.extend(expense_approvals)
+
+        Expense.objects.bulk_create(expenses, batch_size=500)
+        ExpenseApproval.objects.bulk_create(approvals, batch_size=500)
+        rebuild_rollups(company.pk)
+
+        return {
+            'users': len(users),
+            'expenses': len(expenses),
+            'approvals': len(approvals),
+        }
+
+    def make_expense(self, rng, now, company, employee, manager, admin, categories, approval_flow):
+        expense_status = rng.choice(STATUSES)
+        currency = rng.choice(CURRENCIES)
+        amount = Decimal(rng.randint(500, 250000)) / 100
+        rate = Decimal('1') if currency == company.currency else Decimal(str(rng.uniform(0.01, 1.4)))
+        expense_date = (now - timedelta(days=rng.randint(0, 365))).date()
+
+        expense = Expense(
+            employee=employee,
+            company=company,
+            amount=amount,
+            currency=currency,
+            converted_amount=(amount * rate).quantize(Decimal('0.01')),
+            category=rng.choice(categories),
+            description=rng.choice(DESCRIPTIONS),
+            expense_date=expense_date,
+            status=expense_status,
+        )
+        if expense_status == 'draft':
+            return expense, []
+
+        expense.submitted_at = now - timedelta(days=rng.randint(0, 30))
+        if expense_status == 'submitted':
+            return expense, []
+
+        expense.approval_flow = approval_flow
+        manager_step = ExpenseApproval(
+            expense=expense, approver=manager, step_order=1, approver_type='manager'
+        )
+        admin_step = ExpenseApproval(
+            expense=expense, approver=admin, step_order=2, approver_type='admin'
+        )
+        decided_at = expense.submitted_at + timedelta(hours=rng.randint(1, 240))
+
+        if expense_status == 'pending_approval':
+            # Waiting on either the manager or the admin
+            if rng.random() < 0.5:
+                expense.current_approver = manager
+            else:
+                manager_step.status = 'approved'
+                manager_step.approved_at = decided_at
+                expense.current_step = 2
+                expense.current_approver = admin
+        elif expense_status == 'rejected':
+            manager_step.status = 'rejected'
+            manager_step.approved_at = decided_at
+            manager_step.comments = 'Not a business expense'
+        else:  # approved / paid
+            manager_step.status = 'approved'
+            manager_step.approved_at = decided_at
+            admin_step.status = 'approved'
+            admin_step.approved_at = decided_at + timedelta(hours=rng.randint(1, 72))
+            expense.current_step = 2
+
+        return expense, [manager_step, admin_step]
@@ -0,0 +1,194 @@
+"""Per-endpoint request metrics, exposed in Prometheus text format.
+
+Numbers are kept in process memory, so each worker process reports its own
+series; scrape every worker (or run one) to get complete figures.
+"""
+import bisect
+import hmac
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.deprecation import MiddlewareMixin
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip((*self.buckets, '+Inf'), self.counts):
+            total += count
+            yield bound, total
+
+
+class EndpointStats:
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.queries = Histogram(QUERY_COUNT_BUCKETS)
+        self.query_seconds = 0.0
+        self.response_bytes = 0
+        self.responses = {}
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def record(self, view, status_code, seconds, query_count, query_seconds, size):
+        with self._lock:
+            stats = self._endpoints.get(view)
+            if stats is None:
+                stats = self._endpoints[view] = EndpointStats()
+            stats.latency.observe(seconds)
+            stats.queries.observe(query_count)
+            stats.query_seconds += query_seconds
+            stats.response_bytes += size
+            stats.responses[status_code] = stats.responses.get(status_code, 0) + 1
+
+    def reset(self):
+        with self._lock:
+            self._endpoints = {}
+
+    def render(self):
+        lines = []
+
+        def header(name, kind, help_text):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+
+        def histogram(name, view, hist):
+            for bound, count in hist.cumulative():
+                lines.append(f'{name}_bucket{{view="{view}",le="{bound}"}} {count}')
+            lines.append(f'{name}_sum{{view="{view}"}} {hist.sum}')
+            lines.append(f'{name}_count{{view="{view}"}} {hist.count}')
+
+        with self._lock:
+            endpoints = sorted((_escape(view), stats) for view, stats in self._endpoints.items())
+
+            header('expense_http_request_duration_seconds', 'histogram', 'Request latency per URL name.')
+            for view, stats in endpoints:
+                histogram('expense_http_request_duration_seconds', view, stats.latency)
+
+            header('expense_http_responses_total', 'counter', 'Responses per URL name and status code.')
+            for view, stats in endpoints:
+                for code, count in sorted(stats.responses.items()):
+                    lines.append(f'expense_http_responses_total{{view="{view}",status="{code}"}} {count}')
+
+            header('expense_db_queries_per_request', 'histogram', 'Database queries issued per request.')
+            for view, stats in endpoints:
+                histogram('expense_db_queries_per_request', view, stats.queries)
+
+            header('expense_db_query_seconds_total', 'counter', 'Time spent executing database queries.')
+            for view, stats in endpoints:
+                lines.append(f'expense_db_query_seconds_total{{view="{view}"}} {stats.query_seconds}')
+
+            header('expense_http_response_bytes_total', 'counter', 'Response body bytes, streaming responses excluded.')
+            for view, stats in endpoints:
+                lines.append(f'expense_http_response_bytes_total{{view="{view}"}} {stats.response_bytes}')
+
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+registry = Registry()
+
+
+class QueryRecorder:
+    """connection.execute_wrapper hook that counts and times every query"""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.view = None
+        self.slow_ms = settings.METRICS_SLOW_QUERY_MS
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.count += 1
+            self.seconds += elapsed
+            if self.slow_ms is not None and elapsed * 1000 >= self.slow_ms:
+                logger.warning(
+                    'Slow query in %s (%.1f ms, %s): %s',
+                    self.view or '<unresolved>', elapsed * 1000,
+                    context['connection'].alias, sql
+                )
+
+
+class MetricsMiddleware(MiddlewareMixin):
+    """Time each request and count its queries.
+
+    MiddlewareMixin runs these hooks in the request's thread-sensitive
+    thread under ASGI too, so the query wrappers see the ORM's connections.
+    """
+
+    def process_request(self, request):
+        recorder = QueryRecorder()
+        request._metrics_recorder = recorder
+        request._metrics_start = time.perf_counter()
+        for connection in connections.all():
+            connection.execute_wrappers.append(recorder)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        match = request.resolver_match
+        request._metrics_recorder.view = match.url_name or match.view_name
+
+    def process_response(self, request, response):
+        recorder = getattr(request, '_metrics_recorder', None)
+        if recorder is None:
+            return response
+        for connection in connections.all():
+            if recorder in connection.execute_wrappers:
+                connection.execute_wrappers.remove(recorder)
+        elapsed = time.perf_counter() - request._metrics_start
+
+        match = getattr(request, 'resolver_match', None)
+        view = (match.url_name or match.view_name) if match else '<unmatched>'
+        size = 0 if response.streaming else len(response.content)
+        registry.record(view, response.status_code, elapsed, recorder.count, recorder.seconds, size)
+        return response
+
+
+def metrics_allowed(request):
+    """Whether the request may scrape: with METRICS_TOKEN set, only with that
+    bearer token; without one, only from METRICS_ALLOWED_IPS in DEBUG.
+
+    Behind a reverse proxy every request comes from the proxy's address,
+    so the address check alone would let anyone in.
+    """
+    if settings.METRICS_TOKEN:
+        scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+        return scheme.lower() == 'bearer' and hmac.compare_digest(token.encode(), settings.METRICS_TOKEN.encode())
+    return settings.DEBUG and request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint (see metrics_allowed)"""
+    if not metrics_allowed(request):
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:58
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_alter_expenseapproval_unique_together_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(condition=models.Q(('status', 'pending_approval')), fields=['current_approver', '-created_at'], name='expense_pending_approver_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(condition=models.Q(('status', 'pending_approval')), fields=['company', '-created_at'], name='expense_pending_company_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='expenseapproval',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['approver', 'expense'], name='approval_pending_approver_idx'),
+        ),
+    ]
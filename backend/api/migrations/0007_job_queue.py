@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:11
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_idempotency_keys'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedexpense',
+            name='receipt_thumbnail',
+            field=models.ImageField(blank=True, null=True, upload_to='receipts/thumbnails/'),
+        ),
+        migrations.AddField(
+            model_name='expense',
+            name='receipt_thumbnail',
+            field=models.ImageField(blank=True, null=True, upload_to='receipts/thumbnails/'),
+        ),
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('payload', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='queued', max_length=10)),
+                ('attempts', models.IntegerField(default=0)),
+                ('max_attempts', models.IntegerField(default=5)),
+                ('run_after', models.DateTimeField()),
+                ('last_error', models.TextField(blank=True)),
+                ('locked_by', models.CharField(blank=True, max_length=100)),
+                ('locked_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('status', 'queued')), fields=['run_after'], name='job_queued_run_after_idx'), models.Index(condition=models.Q(('status', 'running')), fields=['locked_at'], name='job_running_locked_at_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:18
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_job_queue'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExpenseChange',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('expense_id', models.UUIDField()),
+                ('company_id', models.BigIntegerField()),
+                ('employee_id', models.BigIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['company', 'updated_at'], name='expense_company_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='expensechange',
+            index=models.Index(fields=['company_id', 'id'], name='expense_change_company_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='expensechange',
+            index=models.Index(fields=['employee_id', 'id'], name='expense_change_employee_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='expensechange',
+            index=models.Index(fields=['created_at'], name='expense_change_created_idx'),
+        ),
+    ]
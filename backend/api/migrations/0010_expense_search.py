@@ -0,0 +1,60 @@
+from django.db import migrations
+
+# The index as first created. The SQL is spelled out here rather than
+# taken from api.search, so later changes there do not alter this
+# migration; 0012 replaces the SQLite form.
+INSTALL = {
+    # External content: the FTS table indexes api_expense rows by rowid and
+    # reads the text back from api_expense instead of storing a copy
+    'sqlite': [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS api_expense_search USING fts5("
+        "description, content='api_expense', content_rowid='rowid', tokenize='porter unicode61')",
+        "CREATE TRIGGER IF NOT EXISTS api_expense_search_insert AFTER INSERT ON api_expense BEGIN "
+        "INSERT INTO api_expense_search(rowid, description) VALUES (new.rowid, new.description); END",
+        "CREATE TRIGGER IF NOT EXISTS api_expense_search_delete AFTER DELETE ON api_expense BEGIN "
+        "INSERT INTO api_expense_search(api_expense_search, rowid, description) "
+        "VALUES ('delete', old.rowid, old.description); END",
+        "CREATE TRIGGER IF NOT EXISTS api_expense_search_update AFTER UPDATE OF description ON api_expense BEGIN "
+        "INSERT INTO api_expense_search(api_expense_search, rowid, description) "
+        "VALUES ('delete', old.rowid, old.description); "
+        "INSERT INTO api_expense_search(rowid, description) VALUES (new.rowid, new.description); END",
+        "INSERT INTO api_expense_search(api_expense_search) VALUES ('rebuild')",
+    ],
+    'postgresql': [
+        "CREATE INDEX IF NOT EXISTS expense_description_search_idx ON api_expense USING GIN "
+        "(to_tsvector('english'::regconfig, COALESCE(description, '')))",
+    ],
+}
+
+UNINSTALL = {
+    'sqlite': [
+        'DROP TRIGGER IF EXISTS api_expense_search_insert',
+        'DROP TRIGGER IF EXISTS api_expense_search_delete',
+        'DROP TRIGGER IF EXISTS api_expense_search_update',
+        'DROP TABLE IF EXISTS api_expense_search',
+    ],
+    'postgresql': [
+        'DROP INDEX IF EXISTS expense_description_search_idx',
+    ],
+}
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        for sql in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(sql)
+    return operation
+
+
+class Migration(migrations.Migration):
+    """Full-text index over Expense.description; the SQL depends on the
+    database vendor, and other vendors get none
+    """
+
+    dependencies = [
+        ('api', '0009_expense_rollups'),
+    ]
+
+    operations = [
+        migrations.RunPython(run(INSTALL), run(UNINSTALL)),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:41
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_expense_search'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['company', 'expense_date'], name='expense_company_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['employee', 'expense_date'], name='expense_employee_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['company', 'converted_amount'], name='expense_company_amount_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['company', 'status', 'category', 'employee'], name='expense_company_facet_idx'),
+        ),
+    ]
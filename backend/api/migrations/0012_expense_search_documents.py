@@ -0,0 +1,83 @@
+from django.db import migrations
+
+# Spelled out rather than taken from api.search, like 0010. Only the
+# SQLite index changes; the PostgreSQL one stays as 0010 made it.
+OLD_INDEX = {
+    'sqlite': [
+        'DROP TRIGGER IF EXISTS api_expense_search_insert',
+        'DROP TRIGGER IF EXISTS api_expense_search_delete',
+        'DROP TRIGGER IF EXISTS api_expense_search_update',
+        'DROP TABLE IF EXISTS api_expense_search',
+    ],
+}
+
+# api_expense has a UUID key and no rowid alias, so VACUUM may renumber
+# its rowids. Each expense instead gets a document number in
+# api_expense_search_doc; an INTEGER PRIMARY KEY keeps its value, and it
+# is the FTS table's rowid
+NEW_INDEX = {
+    'sqlite': [
+        "CREATE TABLE IF NOT EXISTS api_expense_search_doc ("
+        "docid INTEGER PRIMARY KEY, expense_id CHAR(32) NOT NULL UNIQUE)",
+        "CREATE VIRTUAL TABLE IF NOT EXISTS api_expense_search USING fts5("
+        "description, tokenize='porter unicode61')",
+        "CREATE TRIGGER IF NOT EXISTS api_expense_search_insert AFTER INSERT ON api_expense BEGIN "
+        "INSERT INTO api_expense_search_doc(expense_id) VALUES (new.id); "
+        "INSERT INTO api_expense_search(rowid, description) VALUES ("
+        "(SELECT docid FROM api_expense_search_doc WHERE expense_id = new.id), new.description); END",
+        "CREATE TRIGGER IF NOT EXISTS api_expense_search_delete AFTER DELETE ON api_expense BEGIN "
+        "DELETE FROM api_expense_search WHERE rowid = "
+        "(SELECT docid FROM api_expense_search_doc WHERE expense_id = old.id); "
+        "DELETE FROM api_expense_search_doc WHERE expense_id = old.id; END",
+        "CREATE TRIGGER IF NOT EXISTS api_expense_search_update AFTER UPDATE OF description ON api_expense BEGIN "
+        "UPDATE api_expense_search SET description = new.description WHERE rowid = "
+        "(SELECT docid FROM api_expense_search_doc WHERE expense_id = new.id); END",
+        "INSERT INTO api_expense_search_doc(expense_id) SELECT id FROM api_expense",
+        "INSERT INTO api_expense_search(rowid, description) SELECT d.docid, e.description "
+        "FROM api_expense e JOIN api_expense_search_doc d ON d.expense_id = e.id",
+    ],
+}
+
+DROP_NEW_INDEX = {
+    'sqlite': OLD_INDEX['sqlite'] + ['DROP TABLE IF EXISTS api_expense_search_doc'],
+}
+
+# 0010's SQLite index, restored when this migration is reversed
+RESTORE_OLD_INDEX = {
+    'sqlite': [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS api_expense_search USING fts5("
+        "description, content='api_expense', content_rowid='rowid', tokenize='porter unicode61')",
+        "CREATE TRIGGER IF NOT EXISTS api_expense_search_insert AFTER INSERT ON api_expense BEGIN "
+        "INSERT INTO api_expense_search(rowid, description) VALUES (new.rowid, new.description); END",
+        "CREATE TRIGGER IF NOT EXISTS api_expense_search_delete AFTER DELETE ON api_expense BEGIN "
+        "INSERT INTO api_expense_search(api_expense_search, rowid, description) "
+        "VALUES ('delete', old.rowid, old.description); END",
+        "CREATE TRIGGER IF NOT EXISTS api_expense_search_update AFTER UPDATE OF description ON api_expense BEGIN "
+        "INSERT INTO api_expense_search(api_expense_search, rowid, description) "
+        "VALUES ('delete', old.rowid, old.description); "
+        "INSERT INTO api_expense_search(rowid, description) VALUES (new.rowid, new.description); END",
+        "INSERT INTO api_expense_search(api_expense_search) VALUES ('rebuild')",
+    ],
+}
+
+
+def run(*steps):
+    def operation(apps, schema_editor):
+        for statements in steps:
+            for sql in statements.get(schema_editor.connection.vendor, []):
+                schema_editor.execute(sql)
+    return operation
+
+
+class Migration(migrations.Migration):
+    """Key the SQLite search index on document numbers instead of the
+    expense table's implicit rowids, which VACUUM may renumber
+    """
+
+    dependencies = [
+        ('api', '0011_expense_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(run(OLD_INDEX, NEW_INDEX), run(DROP_NEW_INDEX, RESTORE_OLD_INDEX)),
+    ]
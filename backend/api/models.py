@@ -1,6 +1,8 @@
-from django.db import models
+from collections import defaultdict
+from django.db import IntegrityError, models, router, transaction
 from accounts.models import User
 from django.core.validators import MinValueValidator
+from django.core.serializers.json import DjangoJSONEncoder
 import uuid
 
 class Company(models.Model):
@@ -95,6 +97,7 @@ class Expense(models.Model):
     
     # Receipt
     receipt_image = models.ImageField(upload_to='receipts/', null=True, blank=True)
+    receipt_thumbnail = models.ImageField(upload_to='receipts/thumbnails/', null=True, blank=True)
     
     # Approval Workflow
     approval_flow = models.ForeignKey(ApprovalFlow, on_delete=models.SET_NULL, null=True, blank=True)
@@ -109,9 +112,56 @@ class Expense(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Partial indexes only cover the small in-flight slice of the table
+            models.Index(
+                fields=['current_approver', '-created_at'],
+                condition=models.Q(status='pending_approval'),
+                name='expense_pending_approver_idx',
+            ),
+            models.Index(
+                fields=['company', '-created_at'],
+                condition=models.Q(status='pending_approval'),
+                name='expense_pending_company_idx',
+            ),
+            # Newest change per company, for list validators (api.conditional)
+            models.Index(fields=['company', 'updated_at'], name='expense_company_updated_idx'),
+            # List filters (api.filters): date and amount ranges within the
+            # visible expenses, and the grouped facet counts from the index alone
+            models.Index(fields=['company', 'expense_date'], name='expense_company_date_idx'),
+            models.Index(fields=['employee', 'expense_date'], name='expense_employee_date_idx'),
+            models.Index(fields=['company', 'converted_amount'], name='expense_company_amount_idx'),
+            models.Index(fields=['company', 'status', 'category', 'employee'], name='expense_company_facet_idx'),
+        ]
+    
+    # Fields that decide which ExpenseRollup row an expense counts in, and for how much
+    ROLLUP_FIELDS = ('company', 'employee', 'category', 'expense_date', 'status', 'amount', 'converted_amount')
     
     def __str__(self):
         return f"{self.employee.get_full_name()} - {self.amount} {self.currency}"
+    
+    def rollup_values(self):
+        return {name: getattr(self, self._meta.get_field(name).attname) for name in self.ROLLUP_FIELDS}
+    
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and not set(update_fields) & set(self.ROLLUP_FIELDS):
+            return super().save(*args, **kwargs)
+        
+        using = kwargs.get('using') or router.db_for_write(Expense, instance=self)
+        with transaction.atomic(using=using):
+            # The stored row, not this instance, says what the rollups hold;
+            # the instance may have been loaded before another write
+            old = None
+            if not self._state.adding:
+                old = Expense.objects.using(using).select_for_update().filter(pk=self.pk).values(
+                    *self.ROLLUP_FIELDS
+                ).first()
+            super().save(*args, **kwargs)
+            new = self.rollup_values()
+            if old is not None and update_fields is not None:
+                new = {name: new[name] if name in update_fields else old[name] for name in self.ROLLUP_FIELDS}
+            ExpenseRollup.record([old] if old else [], [new], using=using)
 
 class ExpenseApproval(models.Model):
     STATUS_CHOICES = (
@@ -131,6 +181,13 @@ class ExpenseApproval(models.Model):
     class Meta:
         ordering = ['step_order']
         unique_together = ['expense', 'step_order']
+        indexes = [
+            models.Index(
+                fields=['approver', 'expense'],
+                condition=models.Q(status='pending'),
+                name='approval_pending_approver_idx',
+            ),
+        ]
 
 class ManagerEmployee(models.Model):
     manager = models.ForeignKey(User, on_delete=models.CASCADE, related_name='managed_employees')
@@ -141,3 +198,205 @@ class ManagerEmployee(models.Model):
     
     class Meta:
         unique_together = ['manager', 'employee', 'company']
+
+# Cold storage for settled expenses, moved here by api.archive so the hot
+# tables only carry in-flight approval traffic. Same columns as the hot
+# tables, plus the time each row was archived.
+class ArchivedExpense(models.Model):
+    id = models.UUIDField(primary_key=True, editable=False)
+    employee = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='+')
+    
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    currency = models.CharField(max_length=10)
+    converted_amount = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    category = models.ForeignKey(ExpenseCategory, on_delete=models.SET_NULL, null=True, related_name='+')
+    description = models.TextField()
+    expense_date = models.DateField()
+    
+    receipt_image = models.ImageField(upload_to='receipts/', null=True, blank=True)
+    receipt_thumbnail = models.ImageField(upload_to='receipts/thumbnails/', null=True, blank=True)
+    
+    approval_flow = models.ForeignKey(ApprovalFlow, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    current_step = models.IntegerField(default=1)
+    status = models.CharField(max_length=20, choices=Expense.STATUS_CHOICES)
+    current_approver = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    submitted_at = models.DateTimeField(null=True, blank=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+    
+    # Archived expenses stay in the rollups
+    ROLLUP_FIELDS = Expense.ROLLUP_FIELDS
+    rollup_values = Expense.rollup_values
+
+class ArchivedExpenseApproval(models.Model):
+    expense = models.ForeignKey(ArchivedExpense, on_delete=models.CASCADE, related_name='approvals')
+    approver = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    step_order = models.IntegerField()
+    approver_type = models.CharField(max_length=20, default='manager')
+    status = models.CharField(max_length=10, choices=ExpenseApproval.STATUS_CHOICES)
+    comments = models.TextField(blank=True)
+    approved_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['step_order']
+        unique_together = ['expense', 'step_order']
+
+class IdempotencyKey(models.Model):
+    """Stored outcome of a POST sent with an Idempotency-Key header"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='idempotency_keys')
+    key = models.CharField(max_length=255)
+    request_fingerprint = models.CharField(max_length=64)
+    
+    # Empty until the first request finishes
+    response_status = models.IntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='idempotency_user_key_uniq'),
+        ]
+
+class Job(models.Model):
+    """Background work item, run by ``manage.py run_jobs`` (see api.jobs)"""
+    STATUS_CHOICES = (
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    )
+    
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    
+    # Retries
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=5)
+    run_after = models.DateTimeField()
+    last_error = models.TextField(blank=True)
+    
+    # Set while a worker holds the job
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['run_after'],
+                condition=models.Q(status='queued'),
+                name='job_queued_run_after_idx',
+            ),
+            models.Index(
+                fields=['locked_at'],
+                condition=models.Q(status='running'),
+                name='job_running_locked_at_idx',
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
+    
+    @property
+    def is_last_attempt(self):
+        return self.attempts >= self.max_attempts
+
+class ExpenseChange(models.Model):
+    """One row per write to an expense; the id is the delta-sync sequence (see api.changes)
+
+    No foreign keys, so rows outlive the expense, employee and company they name.
+    """
+    id = models.BigAutoField(primary_key=True)
+    expense_id = models.UUIDField()
+    company_id = models.BigIntegerField()
+    employee_id = models.BigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['company_id', 'id'], name='expense_change_company_idx'),
+            models.Index(fields=['employee_id', 'id'], name='expense_change_employee_idx'),
+            models.Index(fields=['created_at'], name='expense_change_created_idx'),
+        ]
+
+class ExpenseRollup(models.Model):
+    """Expense count and company-currency amount per company, month,
+    category, employee and status, kept current by every write that
+    moves an expense between rows (see ExpenseRollup.record) and by
+    deletions (api.signals).
+
+    Archiving an expense leaves its row alone, so the rollups cover the
+    archive too; rebuild_rollups recomputes them from both tables.
+    """
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='+')
+    period = models.DateField()  # First day of the expense_date month
+    category = models.ForeignKey(ExpenseCategory, on_delete=models.SET_NULL, null=True, related_name='+')
+    employee = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    status = models.CharField(max_length=20)
+    count = models.IntegerField(default=0)
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    
+    class Meta:
+        constraints = [
+            # Rows without a category are not unique (NULLs are distinct);
+            # a duplicate only splits a total that readers sum anyway
+            models.UniqueConstraint(
+                fields=['company', 'period', 'category', 'employee', 'status'],
+                name='expense_rollup_key',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['company', 'period'], name='expense_rollup_period_idx'),
+        ]
+    
+    @staticmethod
+    def key(values):
+        """Rollup row key and amount for Expense.rollup_values()"""
+        key = (
+            values['company'], values['expense_date'].replace(day=1),
+            values['category'], values['employee'], values['status'],
+        )
+        amount = values['converted_amount'] if values['converted_amount'] is not None else values['amount']
+        return key, amount
+    
+    @classmethod
+    def record(cls, removed, added, using=None):
+        """Move expenses out of the rows of removed and into the rows of
+        added, both lists of Expense.rollup_values(). Call inside the
+        transaction that writes the expenses.
+        """
+        using = using or router.db_for_write(cls)
+        deltas = defaultdict(lambda: [0, 0])
+        for values, sign in [(values, -1) for values in removed] + [(values, 1) for values in added]:
+            key, amount = cls.key(values)
+            deltas[key][0] += sign
+            deltas[key][1] += sign * amount
+        
+        for (company_id, period, category_id, employee_id, status), (count, amount) in deltas.items():
+            if not count and not amount:
+                continue
+            row = dict(company_id=company_id, period=period, category_id=category_id,
+                       employee_id=employee_id, status=status)
+            rows = cls.objects.using(using).filter(**row)
+            increment = dict(count=models.F('count') + count, amount=models.F('amount') + amount)
+            if rows.update(**increment) or count <= 0:
+                # Nothing to take expenses out of: the row went with its
+                # company or employee, whose deletion is removing them
+                continue
+            try:
+                with transaction.atomic(using=using):
+                    cls.objects.using(using).create(**row, count=count, amount=amount)
+            except IntegrityError:
+                # Another transaction created the row first
+                rows.update(**increment)
@@ -0,0 +1,34 @@
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # plain json through DRF's renderer
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer backed by orjson when it is installed.
+
+    Output matches JSONRenderer: types orjson does not encode itself
+    (Decimal, lazy strings, ...) and datetimes go through DRF's encoder,
+    and U+2028/U+2029 are escaped the same way.
+    """
+    options = orjson and (
+        orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+    )
+    _default = JSONEncoder().default
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        options = self.options
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            # orjson only indents by two spaces
+            options |= orjson.OPT_INDENT_2
+
+        ret = orjson.dumps(data, default=self._default, option=options)
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
@@ -0,0 +1,209 @@
+"""Finance reports over a company's expenses (GET /reports/<name>/).
+
+A report loads the columns it needs from the hot and archived expenses
+in one streamed query, then computes its group-bys, percentiles and
+distributions in one pass over those columns: each group's values are
+sorted once and every percentile is read off that order.
+
+Results are cached per company, report, filters and data version: the
+company's latest expense change (api.changes) plus its cache version,
+which moves with category and user edits (the labels). A cached report
+is therefore never stale and is recomputed only after a write.
+"""
+import bisect
+import hashlib
+import math
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Max
+from django.db.models.functions import Coalesce
+
+from accounts.models import User
+from .archive import with_archive
+from .changes import latest_change
+from .models import ExpenseCategory
+from .response_cache import company_cache_version
+
+PERCENTILES = (50, 75, 90, 95, 99)
+# Upper bounds (hours) of the turnaround histogram buckets; the last bucket is open ended
+TURNAROUND_BUCKETS = (4, 24, 72, 168, 336)
+DECIDED_STATUSES = ('approved', 'rejected', 'paid')
+
+REPORTS = {}
+
+
+def report(name):
+    """Register a report: a function of (columns, company) returning its data"""
+    def register(function):
+        REPORTS[name] = function
+        return function
+    return register
+
+
+def load_columns(company, start=None, end=None, statuses=None):
+    """Report columns for the company's expenses, as lists.
+
+    amount is in the company currency; submitted and decided are epoch
+    seconds (NaN when unknown), decided being the latest approval decision.
+    """
+    def queryset_for(model):
+        expenses = model.objects.filter(company=company)
+        if start:
+            expenses = expenses.filter(expense_date__gte=start)
+        if end:
+            expenses = expenses.filter(expense_date__lte=end)
+        if statuses:
+            expenses = expenses.filter(status__in=statuses)
+        return expenses.order_by().annotate(
+            report_amount=Coalesce('converted_amount', 'amount'),
+            decided_at=Max('approvals__approved_at'),
+        ).values_list(
+            'category_id', 'employee_id', 'expense_date', 'status',
+            'report_amount', 'submitted_at', 'decided_at'
+        )
+
+    columns = {name: [] for name in ('category', 'employee', 'month', 'status', 'amount', 'submitted', 'decided')}
+    append = [columns[name].append for name in columns]
+    rows = with_archive(queryset_for)
+    # iterator() uses a server-side cursor on PostgreSQL; the transaction
+    # keeps that cursor alive when connections go through PgBouncer
+    with transaction.atomic(using=rows.db):
+        for category_id, employee_id, expense_date, status, amount, submitted_at, decided_at in rows.iterator(
+            chunk_size=settings.EXPORT_CHUNK_SIZE
+        ):
+            values = (
+                category_id or 0,
+                employee_id,
+                expense_date.year * 12 + expense_date.month - 1,
+                status,
+                float(amount),
+                submitted_at.timestamp() if submitted_at else math.nan,
+                decided_at.timestamp() if decided_at and status in DECIDED_STATUSES else math.nan,
+            )
+            for add, value in zip(append, values):
+                add(value)
+    return columns
+
+
+def _summary(count, total, percentiles):
+    count = int(count)
+    # Rounded first, so sums that differ in the last float bits agree
+    total = round(float(total), 2)
+    return {
+        'count': count,
+        'total': total,
+        'mean': round(total / count, 2) if count else None,
+        **{f'p{q}': round(float(value), 2) if count else None for q, value in zip(PERCENTILES, percentiles)},
+    }
+
+
+def _percentile(ordered, q):
+    # Linear interpolation between the closest ranks (numpy.percentile's default)
+    position = (len(ordered) - 1) * q / 100
+    low = math.floor(position)
+    high = math.ceil(position)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+def grouped(keys, values):
+    """(key, summary of the values with that key) for each distinct key, in key order"""
+    groups = {}
+    for key, value in zip(keys, values):
+        groups.setdefault(key, []).append(value)
+    result = []
+    for key in sorted(groups):
+        ordered = sorted(groups[key])
+        result.append((key, _summary(
+            len(ordered), math.fsum(ordered), [_percentile(ordered, q) for q in PERCENTILES]
+        )))
+    return result
+
+
+def histogram(values, bounds):
+    """Counts of values up to each of the bounds, and above the last"""
+    counts = [0] * (len(bounds) + 1)
+    for value in values:
+        counts[bisect.bisect_left(bounds, value)] += 1
+    return counts
+
+
+def _labelled(rows, labels):
+    # Key 0 stands for no category
+    return [{'key': key or None, 'label': labels.get(key, 'Uncategorized'), **summary} for key, summary in rows]
+
+
+@report('spend-by-category')
+def spend_by_category(columns, company):
+    rows = grouped(columns['category'], columns['amount'])
+    labels = dict(ExpenseCategory.objects.filter(pk__in=[key for key, _ in rows]).values_list('id', 'name'))
+    return {'groups': _labelled(rows, labels)}
+
+
+@report('spend-by-employee')
+def spend_by_employee(columns, company):
+    rows = grouped(columns['employee'], columns['amount'])
+    labels = {
+        pk: f'{first_name} {last_name}'.strip() or email
+        for pk, first_name, last_name, email in User.objects.filter(
+            pk__in=[key for key, _ in rows]
+        ).values_list('id', 'first_name', 'last_name', 'email')
+    }
+    return {'groups': _labelled(rows, labels)}
+
+
+@report('spend-by-month')
+def spend_by_month(columns, company):
+    return {'groups': [
+        {'key': f'{month // 12:04d}-{month % 12 + 1:02d}', **summary}
+        for month, summary in grouped(columns['month'], columns['amount'])
+    ]}
+
+
+@report('amount-percentiles')
+def amount_percentiles(columns, company):
+    amounts = columns['amount']
+    overall = grouped([0] * len(amounts), amounts)
+    return {
+        'overall': overall[0][1] if overall else _summary(0, 0, [None] * len(PERCENTILES)),
+        'by_status': [{'key': key, **summary} for key, summary in grouped(columns['status'], amounts)],
+    }
+
+
+@report('approval-turnaround')
+def approval_turnaround(columns, company):
+    """Hours from submission to the final approval decision, for decided expenses"""
+    decided = [
+        (status, (decided - submitted) / 3600)
+        for status, submitted, decided in zip(columns['status'], columns['submitted'], columns['decided'])
+        if not math.isnan(submitted) and not math.isnan(decided)
+    ]
+    statuses = [status for status, _ in decided]
+    hours = [value for _, value in decided]
+
+    overall = grouped([0] * len(hours), hours)
+    counts = histogram(hours, TURNAROUND_BUCKETS)
+    return {
+        'unit': 'hours',
+        'overall': overall[0][1] if overall else _summary(0, 0, [None] * len(PERCENTILES)),
+        'by_status': [{'key': key, **summary} for key, summary in grouped(statuses, hours)],
+        'histogram': [
+            {'up_to': bound, 'count': count}
+            for bound, count in zip(list(TURNAROUND_BUCKETS) + [None], counts)
+        ],
+    }
+
+
+def run_report(name, company, start=None, end=None, statuses=None):
+    """The report's data, from the cache unless the company's expenses changed"""
+    params = f'{start}:{end}:{",".join(sorted(statuses or ()))}'
+    version = f'{latest_change(company.pk)}:{company_cache_version(company.name)}'
+    key = 'report:{}:{}:{}:{}'.format(
+        company.pk, name, hashlib.md5(params.encode()).hexdigest(), version
+    )
+    data = cache.get(key)
+    if data is None:
+        data = REPORTS[name](load_columns(company, start, end, statuses), company)
+        cache.set(key, data, settings.REPORT_CACHE_TIMEOUT)
+    return data
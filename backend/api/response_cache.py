@@ -0,0 +1,53 @@
+import functools
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.response import Response
+
+
+def _version_key(company_name):
+    digest = hashlib.md5(company_name.encode()).hexdigest()
+    return f'resp:version:{digest}'
+
+
+def company_cache_version(company_name):
+    return cache.get_or_set(_version_key(company_name), uuid.uuid4().hex, timeout=None)
+
+
+def bump_company_cache_version(company_name):
+    """Invalidate every cached response for users of the company.
+
+    Versions are random rather than counters, so a version lost to eviction
+    can never come back and match entries cached under it earlier.
+    """
+    cache.set(_version_key(company_name), uuid.uuid4().hex, timeout=None)
+
+
+def cache_per_user(view):
+    """Cache a view's successful GET responses per user and company version.
+
+    Goes inside @api_view so request.user is already authenticated. Entries
+    are dropped implicitly when api.signals bumps the company's version.
+    """
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        user = request.user
+        if request.method != 'GET' or not user.is_authenticated or not user.company_name:
+            return view(request, *args, **kwargs)
+
+        version = company_cache_version(user.company_name)
+        path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+        key = f'resp:{view.__name__}:{user.pk}:{version}:{path}'
+
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+
+        response = view(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, settings.RESPONSE_CACHE_TIMEOUT)
+        return response
+
+    return wrapper
@@ -0,0 +1,105 @@
+"""Spend rollups (ExpenseRollup): backfill and time-series reads.
+
+Writes keep the rollups current as they happen (Expense.save, the bulk
+paths and the post_delete hook in api.signals call ExpenseRollup.record),
+so dashboards can read totals by month, status, category and employee
+without scanning expenses.
+"""
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import Coalesce, TruncMonth, TruncQuarter, TruncYear
+
+from .models import ArchivedExpense, Expense, ExpenseRollup
+
+INTERVALS = {
+    'month': TruncMonth,
+    'quarter': TruncQuarter,
+    'year': TruncYear,
+}
+# group_by value -> rollup columns to group on (the first is the key)
+GROUPS = {
+    'status': ['status'],
+    'category': ['category_id', 'category__name'],
+    'employee': ['employee_id', 'employee__first_name', 'employee__last_name', 'employee__email'],
+}
+
+
+def rebuild_rollups(company_id=None, batch_size=1000):
+    """Recompute the rollups (of one company, or all) from the hot and
+    archived expenses. Returns the number of rollup rows written.
+
+    Writes to expenses of the company while this runs may be lost from
+    the result; rebuild when they are quiet, or run it again.
+    """
+    totals = {}
+    for model in (Expense, ArchivedExpense):
+        expenses = model.objects.all()
+        if company_id is not None:
+            expenses = expenses.filter(company_id=company_id)
+        rows = expenses.order_by().values(
+            'company_id', 'category_id', 'employee_id', 'status', period=TruncMonth('expense_date')
+        ).annotate(
+            count=Count('id'),
+            amount=Sum(Coalesce('converted_amount', 'amount'))
+        )
+        for row in rows:
+            key = (row['company_id'], row['period'], row['category_id'], row['employee_id'], row['status'])
+            count, amount = totals.get(key, (0, 0))
+            totals[key] = (count + row['count'], amount + (row['amount'] or 0))
+
+    with transaction.atomic():
+        rollups = ExpenseRollup.objects.all()
+        if company_id is not None:
+            rollups = rollups.filter(company_id=company_id)
+        rollups.delete()
+        ExpenseRollup.objects.bulk_create([
+            ExpenseRollup(
+                company_id=company, period=period, category_id=category,
+                employee_id=employee, status=status, count=count, amount=amount
+            )
+            for (company, period, category, employee, status), (count, amount) in totals.items()
+        ], batch_size=batch_size)
+    return len(totals)
+
+
+def rollup_series(company, interval='month', group_by=None, statuses=None, start=None, end=None):
+    """Count and amount per period (and group) for company, from the rollups only.
+
+    start and end are dates; periods are months, so both select whole
+    months. Returns rows ordered by period.
+    """
+    rollups = ExpenseRollup.objects.filter(company=company, count__gt=0)
+    if statuses:
+        rollups = rollups.filter(status__in=statuses)
+    if start:
+        rollups = rollups.filter(period__gte=start.replace(day=1))
+    if end:
+        rollups = rollups.filter(period__lte=end)
+
+    columns = GROUPS[group_by] if group_by else []
+    rows = rollups.order_by().values(*columns, bucket=INTERVALS[interval]('period')).annotate(
+        total_count=Sum('count'),
+        total_amount=Sum('amount')
+    ).order_by('bucket', *columns[:1])
+
+    series = []
+    for row in rows:
+        item = {
+            'period': row['bucket'].isoformat(),
+            'count': row['total_count'],
+            'amount': float(row['total_amount']),
+        }
+        if group_by == 'status':
+            item['key'] = row['status']
+            item['label'] = dict(Expense.STATUS_CHOICES).get(row['status'], row['status'])
+        elif group_by == 'category':
+            item['key'] = row['category_id']
+            item['label'] = row['category__name'] or 'Uncategorized'
+        elif group_by == 'employee':
+            item['key'] = row['employee_id']
+            item['label'] = (
+                f"{row['employee__first_name']} {row['employee__last_name']}".strip()
+                or row['employee__email']
+            )
+        series.append(item)
+    return series
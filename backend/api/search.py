@@ -0,0 +1,191 @@
+"""Full-text search over expense descriptions (GET /expenses/search/?q=).
+
+Each database vendor gets a backend that filters an expense queryset to
+the matches of a query and orders it by relevance, so callers apply the
+usual visibility rules first and search within them:
+
+- SQLite: an FTS5 table over api_expense.description, kept in sync by
+  triggers and ranked with bm25().
+- PostgreSQL: to_tsvector() over the description, backed by a GIN
+  expression index and ranked with ts_rank().
+- Anything else: a case-insensitive substring match, unranked.
+
+The index is created by migration 0010 and rebuilt in its current form
+by 0012. Those carry their own copy of the SQL, so a change to the index
+here needs a migration with the new SQL too. SQLite drops triggers when a
+migration rebuilds the expense table, so after every migrate the backend
+checks its triggers and, if they are gone, recreates them and reindexes
+(see ApiConfig.ready).
+"""
+import re
+
+from django.db import connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+
+_WORD = re.compile(r'\w+')
+
+
+def query_terms(query):
+    """Words of a user query, without the search syntax of any backend"""
+    return _WORD.findall(query.lower())
+
+
+class SearchBackend:
+    def install(self, connection):
+        """Create the index on connection (idempotent); returns True if it had to"""
+        return False
+
+    def uninstall(self, connection):
+        """Drop the index from connection"""
+
+    def rebuild(self, connection):
+        """Reindex every expense on connection"""
+
+    def search(self, queryset, terms):
+        """queryset narrowed to expenses matching all terms, best matches first"""
+        query = Q()
+        for term in terms:
+            query &= Q(description__icontains=term)
+        return queryset.filter(query).order_by('-created_at')
+
+
+class SQLiteSearchBackend(SearchBackend):
+    table = 'api_expense_search'
+    # api_expense has a UUID key and no rowid alias, so VACUUM may renumber
+    # its rowids. Each expense instead gets a document number here; an
+    # INTEGER PRIMARY KEY keeps its value, and it is the FTS table's rowid
+    documents = 'api_expense_search_doc'
+    document_of = f"(SELECT docid FROM {documents} WHERE expense_id = {{}}.id)"
+    create_sql = [
+        f"CREATE TABLE IF NOT EXISTS {documents} ("
+        f"docid INTEGER PRIMARY KEY, expense_id CHAR(32) NOT NULL UNIQUE)",
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5("
+        f"description, tokenize='porter unicode61')",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_insert AFTER INSERT ON api_expense BEGIN "
+        f"INSERT INTO {documents}(expense_id) VALUES (new.id); "
+        f"INSERT INTO {table}(rowid, description) VALUES ({document_of.format('new')}, new.description); END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_delete AFTER DELETE ON api_expense BEGIN "
+        f"DELETE FROM {table} WHERE rowid = {document_of.format('old')}; "
+        f"DELETE FROM {documents} WHERE expense_id = old.id; END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_update AFTER UPDATE OF description ON api_expense BEGIN "
+        f"UPDATE {table} SET description = new.description WHERE rowid = {document_of.format('new')}; END",
+    ]
+    drop_sql = [
+        f'DROP TRIGGER IF EXISTS {table}_insert',
+        f'DROP TRIGGER IF EXISTS {table}_delete',
+        f'DROP TRIGGER IF EXISTS {table}_update',
+        f'DROP TABLE IF EXISTS {table}',
+        f'DROP TABLE IF EXISTS {documents}',
+    ]
+
+    def install(self, connection):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'api_expense' "
+                "AND name LIKE %s", [f'{self.table}_%']
+            )
+            if cursor.fetchone()[0] == 3:
+                return False
+            for sql in self.create_sql:
+                cursor.execute(sql)
+        self.rebuild(connection)
+        return True
+
+    def uninstall(self, connection):
+        with connection.cursor() as cursor:
+            for sql in self.drop_sql:
+                cursor.execute(sql)
+
+    def rebuild(self, connection):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+            cursor.execute(
+                f'DELETE FROM {self.documents} WHERE expense_id NOT IN (SELECT id FROM api_expense)'
+            )
+            cursor.execute(
+                f'INSERT INTO {self.documents}(expense_id) SELECT id FROM api_expense '
+                f'WHERE id NOT IN (SELECT expense_id FROM {self.documents})'
+            )
+            cursor.execute(
+                f'INSERT INTO {self.table}(rowid, description) SELECT d.docid, e.description '
+                f'FROM api_expense e JOIN {self.documents} d ON d.expense_id = e.id'
+            )
+
+    def search(self, queryset, terms):
+        # Quoted so no term is read as FTS5 syntax; * matches word prefixes
+        match = ' '.join(f'"{term}"*' for term in terms)
+        matches = RawSQL(
+            f'SELECT d.expense_id FROM {self.table} JOIN {self.documents} d ON d.docid = {self.table}.rowid '
+            f'WHERE {self.table} MATCH %s', (match,)
+        )
+        # Only evaluated for the matching rows the ordering sees
+        rank = RawSQL(
+            f'SELECT bm25({self.table}) FROM {self.table} '
+            f'WHERE {self.table} MATCH %s AND rowid = {self.document_of.format("api_expense")}', (match,)
+        )
+        return queryset.filter(pk__in=matches).order_by(rank, '-created_at')
+
+
+class PostgresSearchBackend(SearchBackend):
+    config = 'english'
+    index = 'expense_description_search_idx'
+    # The same expression SearchVector('description', config=...) compiles to,
+    # so the planner uses the index
+    create_sql = [
+        f"CREATE INDEX IF NOT EXISTS {index} ON api_expense USING GIN "
+        f"(to_tsvector('{config}'::regconfig, COALESCE(description, '')))",
+    ]
+    drop_sql = [f'DROP INDEX IF EXISTS {index}']
+
+    def install(self, connection):
+        with connection.cursor() as cursor:
+            for sql in self.create_sql:
+                cursor.execute(sql)
+        return False
+
+    def uninstall(self, connection):
+        with connection.cursor() as cursor:
+            for sql in self.drop_sql:
+                cursor.execute(sql)
+
+    def rebuild(self, connection):
+        with connection.cursor() as cursor:
+            cursor.execute(f'REINDEX INDEX {self.index}')
+
+    def search(self, queryset, terms):
+        from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+
+        vector = SearchVector('description', config=self.config)
+        # Prefix match on every term, as on SQLite
+        query = SearchQuery(' & '.join(f'{term}:*' for term in terms), config=self.config, search_type='raw')
+        return queryset.alias(search_vector=vector).filter(search_vector=query).annotate(
+            search_rank=SearchRank(vector, query)
+        ).order_by('-search_rank', '-created_at')
+
+
+BACKENDS = {
+    'sqlite': SQLiteSearchBackend,
+    'postgresql': PostgresSearchBackend,
+}
+
+
+def get_backend(connection):
+    return BACKENDS.get(connection.vendor, SearchBackend)()
+
+
+def search_expenses(queryset, query):
+    """Expenses of queryset whose description matches query, best first"""
+    terms = query_terms(query)
+    if not terms:
+        return queryset.none()
+    return get_backend(connections[queryset.db]).search(queryset, terms)
+
+
+def install_search_index(connection):
+    return get_backend(connection).install(connection)
+
+
+def rebuild_search_index(connection):
+    get_backend(connection).rebuild(connection)
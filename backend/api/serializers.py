@@ -12,6 +12,40 @@ class ExpenseCategorySerializer(serializers.ModelSerializer):
         model = ExpenseCategory
         fields = '__all__'
 
+class FieldSelectionMixin:
+    """Trim the output according to the serializer context (built by
+    api.views.expense_context):
+    
+    compact - leave out the nested *_details blocks and *_numeric copies
+    fields  - set of top-level field names to keep
+    expand  - set of relations in `expandable` to embed; others are left out
+    """
+    # Nested field name -> relation name used in ?expand=
+    expandable = {}
+    
+    def get_fields(self):
+        fields = super().get_fields()
+        context = self.context
+        
+        drop = set()
+        if context.get('compact'):
+            drop.update(n for n in fields if n.endswith(('_details', '_numeric')))
+        
+        only = context.get('fields')
+        top_level = self.parent is None or (
+            isinstance(self.parent, serializers.ListSerializer) and self.parent.parent is None
+        )
+        if only is not None and top_level:
+            drop.update(n for n in fields if n not in only)
+        
+        expand = context.get('expand')
+        if expand is not None:
+            drop.update(n for n, relation in self.expandable.items() if relation not in expand)
+        
+        for name in drop:
+            fields.pop(name, None)
+        return fields
+
 class UserBasicSerializer(serializers.ModelSerializer):
     full_name = serializers.SerializerMethodField()
     
@@ -22,9 +56,11 @@ class UserBasicSerializer(serializers.ModelSerializer):
     def get_full_name(self, obj):
         return f"{obj.first_name} {obj.last_name}".strip()
 
-class ExpenseApprovalSerializer(serializers.ModelSerializer):
+class ExpenseApprovalSerializer(FieldSelectionMixin, serializers.ModelSerializer):
     approver_details = UserBasicSerializer(source='approver', read_only=True)
     
+    expandable = {'approver_details': 'approvals.approver'}
+    
     class Meta:
         model = ExpenseApproval
         fields = '__all__'
@@ -59,7 +95,7 @@ class ApprovalStepSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 # In api/serializers.py
-class ExpenseSerializer(serializers.ModelSerializer):
+class ExpenseSerializer(FieldSelectionMixin, serializers.ModelSerializer):
     employee_details = UserBasicSerializer(source='employee', read_only=True)
     category_details = ExpenseCategorySerializer(source='category', read_only=True)
     approvals = ExpenseApprovalSerializer(many=True, read_only=True)
@@ -71,6 +107,21 @@ class ExpenseSerializer(serializers.ModelSerializer):
     amount_numeric = serializers.SerializerMethodField()
     converted_amount_numeric = serializers.SerializerMethodField()
     
+    expandable = {
+        'employee_details': 'employee',
+        'category_details': 'category',
+        'current_approver_details': 'current_approver',
+        'approvals': 'approvals',
+    }
+    # Relations read by each field, for optimize_queryset
+    field_relations = {
+        'employee_details': 'employee',
+        'employee_name': 'employee',
+        'company_currency': 'company',
+        'category_details': 'category',
+        'current_approver_details': 'current_approver',
+    }
+    
     class Meta:
         model = Expense
         fields = '__all__'
@@ -87,9 +138,35 @@ class ExpenseSerializer(serializers.ModelSerializer):
     
     def get_converted_amount_numeric(self, obj):
         return float(obj.converted_amount) if obj.converted_amount else float(obj.amount) if obj.amount else 0.0
+    
+    @classmethod
+    def optimize_queryset(cls, queryset, context):
+        """Join or prefetch exactly the relations the fields selected by context read"""
+        fields = cls(context=context).fields
+        queryset = queryset.select_related(*sorted({
+            relation for name, relation in cls.field_relations.items() if name in fields
+        }))
+        if 'approvals' in fields:
+            if 'approver_details' in fields['approvals'].child.fields:
+                queryset = queryset.prefetch_related('approvals__approver')
+            else:
+                queryset = queryset.prefetch_related('approvals')
+        return queryset
 
 
+class PrefetchedRelatedField(serializers.PrimaryKeyRelatedField):
+    """Primary key field that takes its object from context['prefetched'][model],
+    a dict keyed by str(pk), when the caller has loaded them, e.g. once for a bulk list"""
+    
+    def to_internal_value(self, data):
+        prefetched = self.context.get('prefetched', {}).get(self.get_queryset().model, {})
+        if str(data) in prefetched:
+            return prefetched[str(data)]
+        return super().to_internal_value(data)
+
 class ExpenseCreateSerializer(serializers.ModelSerializer):
+    serializer_related_field = PrefetchedRelatedField
+    
     class Meta:
         model = Expense
         fields = ['amount', 'currency', 'category', 'description', 'expense_date', 'receipt_image']
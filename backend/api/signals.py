@@ -0,0 +1,65 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from accounts.models import ClaimsUser, User
+from .archive import moving_to_archive
+from .changes import record_employee_changes, record_expense_changes
+from .models import (
+    ApprovalFlow, ApprovalRule, ApprovalStep, ArchivedExpense, Company, Expense, ExpenseCategory,
+    ExpenseRollup, ManagerEmployee,
+)
+from .response_cache import bump_company_cache_version
+
+# Saves that never change what the cached views return
+_IGNORED_USER_FIELDS = {'last_login', 'password'}
+
+
+def _bump_company(company_filter):
+    # Looked up rather than read off the instance: during a cascading
+    # delete the company row may already be gone
+    name = Company.objects.filter(**company_filter).values_list('name', flat=True).first()
+    if name:
+        bump_company_cache_version(name)
+
+
+@receiver([post_save, post_delete], sender=ExpenseCategory)
+@receiver([post_save, post_delete], sender=ApprovalRule)
+@receiver([post_save, post_delete], sender=ApprovalFlow)
+@receiver([post_save, post_delete], sender=ManagerEmployee)
+def company_settings_changed(sender, instance, **kwargs):
+    _bump_company({'pk': instance.company_id})
+
+
+@receiver([post_save, post_delete], sender=ApprovalStep)
+def approval_step_changed(sender, instance, **kwargs):
+    _bump_company({'approval_flows': instance.approval_flow_id})
+
+
+@receiver([post_save, post_delete], sender=User)
+@receiver([post_save, post_delete], sender=ClaimsUser)
+def user_changed(sender, instance, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) <= _IGNORED_USER_FIELDS:
+        return
+    if instance.company_name:
+        bump_company_cache_version(instance.company_name)
+
+
+@receiver([post_save, post_delete], sender=Expense)
+def expense_changed(sender, instance, **kwargs):
+    record_expense_changes([instance])
+
+
+@receiver(post_delete, sender=Expense)
+@receiver(post_delete, sender=ArchivedExpense)
+def expense_deleted(sender, instance, using, **kwargs):
+    # Saves update the rollups in Expense.save; deletions, including
+    # cascades and queryset deletes, take the expense out here
+    if sender is Expense and moving_to_archive.get():
+        return
+    ExpenseRollup.record([instance.rollup_values()], [], using=using)
+
+
+@receiver([post_save, post_delete], sender=ManagerEmployee)
+def manager_assignment_changed(sender, instance, **kwargs):
+    # The employee's expenses appear for or vanish from a manager's list
+    record_employee_changes(instance.employee_id)
@@ -0,0 +1,124 @@
+"""Job handlers for the post-submission work on an expense, and for
+periodic maintenance.
+
+Each expense handler updates only the columns it owns, so they can run in
+any order or in parallel on different workers.
+"""
+import os
+from decimal import Decimal
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.mail import send_mail
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image
+
+from accounts.revocation import purge_expired_tokens
+from .changes import record_expense_changes
+from .db import select_for_update_skip_locked
+from .jobs import enqueue, register
+from .models import Expense, ExpenseRollup, Job
+from .views import create_approval_workflow, fetch_exchange_rates
+
+
+@register('expense.convert_currency')
+def convert_expense_currency(job):
+    expense = Expense.objects.select_related('company').filter(pk=job.payload['expense_id']).first()
+    if expense is None:
+        return
+
+    converted_amount = expense.amount
+    if expense.currency != expense.company.currency:
+        rates = fetch_exchange_rates(expense.currency)
+        if rates and expense.company.currency in rates:
+            converted_amount = expense.amount * Decimal(str(rates[expense.company.currency]))
+        elif not job.is_last_attempt:
+            raise RuntimeError(f'No {expense.currency} exchange rates available')
+        # Out of retries: keep the original amount, as convert_currency does
+
+    converted_amount = Decimal(str(converted_amount)).quantize(Decimal('0.01'))
+    with transaction.atomic():
+        old = Expense.objects.select_for_update().filter(pk=expense.pk).values(*Expense.ROLLUP_FIELDS).first()
+        if old is None:
+            return
+        Expense.objects.filter(pk=expense.pk).update(
+            converted_amount=converted_amount,
+            updated_at=timezone.now()
+        )
+        # .update() skips Expense.save, so move the rollup amount here
+        ExpenseRollup.record([old], [{**old, 'converted_amount': converted_amount}])
+        record_expense_changes([expense])
+
+
+@register('expense.start_workflow')
+def start_expense_workflow(job):
+    with transaction.atomic():
+        expense = select_for_update_skip_locked(
+            Expense.objects.filter(pk=job.payload['expense_id'], status='submitted')
+        ).select_related('employee', 'company').first()
+        if expense is None:
+            # Already started, or locked by a worker that is starting it
+            return
+        create_approval_workflow(expense)
+
+    if expense.current_approver_id:
+        enqueue('expense.notify_approver', expense_id=str(expense.pk))
+
+
+@register('expense.receipt_thumbnail')
+def make_receipt_thumbnail(job):
+    expense = Expense.objects.filter(pk=job.payload['expense_id']).first()
+    if expense is None or not expense.receipt_image:
+        return
+
+    with expense.receipt_image.open('rb') as f:
+        image = Image.open(f)
+        image.thumbnail(settings.RECEIPT_THUMBNAIL_SIZE)
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        buffer = BytesIO()
+        image.save(buffer, 'JPEG', quality=85)
+
+    name = os.path.splitext(os.path.basename(expense.receipt_image.name))[0] + '.jpg'
+    expense.receipt_thumbnail.save(name, ContentFile(buffer.getvalue()), save=False)
+    with transaction.atomic():
+        Expense.objects.filter(pk=expense.pk).update(
+            receipt_thumbnail=expense.receipt_thumbnail.name,
+            updated_at=timezone.now()
+        )
+        record_expense_changes([expense])
+
+
+@register('expense.notify_approver')
+def notify_approver(job):
+    expense = Expense.objects.select_related('employee', 'current_approver').filter(
+        pk=job.payload['expense_id'], status='pending_approval'
+    ).first()
+    if expense is None or expense.current_approver is None or not expense.current_approver.email:
+        return
+
+    send_mail(
+        subject=f'Expense awaiting your approval: {expense.amount} {expense.currency}',
+        message=(
+            f'{expense.employee.get_full_name() or expense.employee.email} submitted an expense '
+            f'of {expense.amount} {expense.currency} for {expense.expense_date}:\n\n'
+            f'{expense.description}'
+        ),
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        recipient_list=[expense.current_approver.email],
+    )
+
+
+def schedule_token_purge():
+    """Queue the next accounts.purge_tokens run unless one is already queued"""
+    if not Job.objects.filter(name='accounts.purge_tokens', status='queued').exists():
+        enqueue('accounts.purge_tokens', delay=settings.TOKEN_PURGE_INTERVAL)
+
+
+@register('accounts.purge_tokens')
+def purge_tokens(job):
+    # The next run first, so a failing purge does not end the schedule
+    schedule_token_purge()
+    purge_expired_tokens(settings.TOKEN_PURGE_BATCH_SIZE)
@@ -1,3 +1,1057 @@
-from django.test import TestCase
+import csv
+import io
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, connections
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from accounts.models import User
+from . import admission
+from .archive import archive_batch, archive_settled_expenses
+from .changes import record_expense_changes
+from .db import select_for_update_skip_locked
+from .db_router import PIN_HEADER, REPLICA_ALIAS
+from .fast_render import ExpenseListRenderer, serialize_expense_list
+from .jobs import claim_job, enqueue, run_claimed
+from .models import (
+    ApprovalFlow, ApprovalRule, ApprovalStep, ArchivedExpense, ArchivedExpenseApproval, Company, Expense,
+    ExpenseApproval, ExpenseCategory, ExpenseChange, ExpenseRollup, IdempotencyKey, Job, ManagerEmployee,
+)
+from .renderers import FastJSONRenderer
+from .response_cache import company_cache_version
+from .rollups import rebuild_rollups, rollup_series
+from .views import expense_context, get_user_company
+
+
+class ExpenseTestData:
+    """A company with an admin, a manager and one employee reporting to them"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = Company.objects.create(name='Acme', currency='USD')
+        cls.category = ExpenseCategory.objects.create(name='Travel', company=cls.company)
+        cls.admin = cls.make_user('admin')
+        cls.manager = cls.make_user('manager')
+        cls.employee = cls.make_user('employee')
+        ManagerEmployee.objects.create(manager=cls.manager, employee=cls.employee, company=cls.company)
+
+    @classmethod
+    def make_user(cls, role, company=None):
+        return User.objects.create_user(
+            email=f'{role}@example.com', username=role, password='secret', role=role,
+            company_name=(company or cls.company).name, first_name=role.title(),
+        )
+
+    @classmethod
+    def make_expense(cls, employee=None, **fields):
+        fields = {
+            'employee': employee or cls.employee,
+            'company': cls.company,
+            'amount': Decimal('10.00'),
+            'converted_amount': Decimal('10.00'),
+            'currency': 'USD',
+            'category': cls.category,
+            'description': 'Taxi',
+            'expense_date': date(2025, 1, 15),
+            'status': 'pending_approval',
+            **fields,
+        }
+        return Expense.objects.create(**fields)
+
+    def client_for(self, user):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}')
+        return client
+
+
+@skipUnless(connection.vendor == 'postgresql', 'needs EXPENSE_DB_ENGINE=postgres')
+class PostgresTests(ExpenseTestData, TestCase):
+    """PostgreSQL-only behaviour, opt-in: skipped on the default SQLite
+    database. Run against a local server with, e.g.
+
+        EXPENSE_DB_ENGINE=postgres EXPENSE_DB_USER=expense EXPENSE_DB_PASSWORD=... \
+            python manage.py test api.tests.PostgresTests
+
+    The user needs CREATEDB for the test database.
+    """
+
+    def test_pending_indexes_are_partial(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT indexname, indexdef FROM pg_indexes WHERE indexname IN %s",
+                [('expense_pending_approver_idx', 'expense_pending_company_idx', 'approval_pending_approver_idx')],
+            )
+            indexes = dict(cursor.fetchall())
+        self.assertEqual(len(indexes), 3)
+        for definition in indexes.values():
+            self.assertIn('WHERE', definition)
+
+    def test_approval_lock_skips_locked_rows(self):
+        queryset = select_for_update_skip_locked(Expense.objects.filter(status='pending_approval'))
+        self.assertIn('FOR UPDATE SKIP LOCKED', str(queryset.query))
+
+
+class ExportTests(ExpenseTestData, TestCase):
+    @override_settings(EXPORT_CHUNK_SIZE=2)
+    def test_export_streams_every_row_in_chunks(self):
+        expenses = [self.make_expense(description=f'Taxi {n}') for n in range(5)]
+        response = self.client_for(self.admin).get('/api/v1/expenses/export/')
+        self.assertEqual(response.status_code, 200)
+        rows = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(rows[0][0], 'id')
+        self.assertEqual(sorted(row[0] for row in rows[1:]), sorted(str(e.pk) for e in expenses))
+
+
+class ArchiveTests(ExpenseTestData, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.settled = [
+            self.make_expense(status='approved', amount=20, converted_amount=20),
+            self.make_expense(status='rejected', amount=30, converted_amount=30),
+        ]
+        self.unsettled = self.make_expense(status='pending_approval')
+        for expense in (*self.settled, self.unsettled):
+            status = 'pending' if expense is self.unsettled else expense.status
+            ExpenseApproval.objects.create(expense=expense, approver=self.manager, step_order=1, status=status)
+        Expense.objects.update(updated_at=timezone.now() - timedelta(days=400))
+        self.recent = self.make_expense(status='approved')
+        self.cutoff = timezone.now() - timedelta(days=365)
+
+    def ids(self, *expenses):
+        return sorted(str(expense.pk) for expense in expenses)
+
+    def expense_ids(self, model, field='id'):
+        return sorted(str(pk) for pk in model.objects.values_list(field, flat=True))
+
+    def test_batch_moves_expenses_with_their_approvals(self):
+        self.assertEqual(archive_batch(self.cutoff, batch_size=10), 2)
+        self.assertEqual(self.expense_ids(ArchivedExpense), self.ids(*self.settled))
+        self.assertEqual(self.expense_ids(ArchivedExpenseApproval, 'expense_id'), self.ids(*self.settled))
+        self.assertEqual(self.expense_ids(Expense), self.ids(self.unsettled, self.recent))
+        self.assertEqual(self.expense_ids(ExpenseApproval, 'expense_id'), self.ids(self.unsettled))
+        self.assertEqual(archive_batch(self.cutoff, batch_size=10), 0)
+
+    def test_batch_size_limits_each_move(self):
+        self.assertEqual(archive_batch(self.cutoff, batch_size=1), 1)
+        self.assertEqual(ArchivedExpense.objects.count(), 1)
+        self.assertEqual(ArchivedExpenseApproval.objects.count(), 1)
+
+    def test_export_includes_archived_expenses(self):
+        self.assertEqual(archive_settled_expenses(older_than_days=365), 2)
+        response = self.client_for(self.admin).get('/api/v1/expenses/export/')
+        self.assertEqual(response.status_code, 200)
+        rows = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(sorted(row[0] for row in rows[1:]), self.ids(*self.settled, self.unsettled, self.recent))
+
+    def test_stats_count_archived_expenses(self):
+        def stats(user, path):
+            response = self.client_for(user).get(path)
+            self.assertEqual(response.status_code, 200)
+            data = response.json()['data']
+            return data.get('stats', data)
+
+        before = [stats(self.admin, '/api/v1/admin/stats/'), stats(self.employee, '/api/v1/bootstrap/')]
+        self.assertEqual(archive_settled_expenses(older_than_days=365), 2)
+        cache.clear()  # recompute rather than replay cached responses
+        after = [stats(self.admin, '/api/v1/admin/stats/'), stats(self.employee, '/api/v1/bootstrap/')]
+        self.assertEqual(after, before)
+        admin = after[0]
+        self.assertEqual((admin['total_expenses'], admin['approved_count'], admin['rejected_count']), (4, 2, 1))
+        self.assertEqual((admin['approved_amount'], admin['rejected_amount']), (30.0, 30.0))
+
+
+@skipUnless(REPLICA_ALIAS in settings.DATABASES, 'needs EXPENSE_DB_REPLICA_NAME')
+class ReplicaRoutingTests(ExpenseTestData, TransactionTestCase):
+    """Run with a second SQLite file as the replica, e.g.
+    EXPENSE_DB_REPLICA_NAME=replica.sqlite3 python manage.py test api
+
+    The test replica mirrors the test primary, so rows must be committed
+    before the replica connection can read them.
+    """
+    databases = '__all__'
+
+    def setUp(self):
+        cache.clear()
+        self.setUpTestData()
+        self.make_expense()
+
+    def replica_queries(self, request):
+        """How many expense queries request() ran on the replica"""
+        with CaptureQueriesContext(connections[REPLICA_ALIAS]) as replica:
+            response = request()
+            if response.streaming:
+                b''.join(response.streaming_content)
+        self.assertEqual(response.status_code, 200)
+        return sum('api_expense' in query['sql'] for query in replica.captured_queries)
+
+    def create_rule(self, client):
+        response = client.post('/api/v1/admin/approval-rules/', {'name': 'Default', 'rule_type': 'sequential'})
+        self.assertEqual(response.status_code, 201)
+        return response
+
+    def test_marked_reads_use_the_replica(self):
+        client = self.client_for(self.admin)
+        self.assertGreater(self.replica_queries(lambda: client.get('/api/v1/admin/stats/')), 0)
+
+    def test_unmarked_reads_and_writes_use_the_primary(self):
+        client = self.client_for(self.admin)
+        with CaptureQueriesContext(connections[REPLICA_ALIAS]) as replica:
+            client.get('/api/v1/auth/profile/')
+            self.create_rule(client)
+        self.assertEqual(len(replica.captured_queries), 0)
+
+    def test_export_streams_from_the_replica(self):
+        client = self.client_for(self.admin)
+        self.assertGreater(self.replica_queries(lambda: client.get('/api/v1/expenses/export/')), 0)
+
+    def test_write_pins_reads_to_the_primary(self):
+        client = self.client_for(self.admin)
+        self.create_rule(client)
+        self.assertEqual(self.replica_queries(lambda: client.get('/api/v1/admin/stats/')), 0)
+
+    def test_pin_header_pins_on_any_worker(self):
+        client = self.client_for(self.admin)
+        pin = self.create_rule(client)[PIN_HEADER]
+        # Another worker's cache has no pin
+        cache.clear()
+        headers = {PIN_HEADER: pin}
+        self.assertEqual(self.replica_queries(lambda: client.get('/api/v1/admin/stats/', headers=headers)), 0)
+
+    def test_pin_header_is_per_user_and_expires(self):
+        pin = self.create_rule(self.client_for(self.admin))[PIN_HEADER]
+        cache.clear()
+        client = self.client_for(self.manager)
+        headers = {PIN_HEADER: pin}
+        self.assertGreater(self.replica_queries(lambda: client.get('/api/v1/expenses/', headers=headers)), 0)
+
+        client = self.client_for(self.admin)
+        with override_settings(REPLICA_PIN_SECONDS=0):
+            self.assertGreater(self.replica_queries(lambda: client.get('/api/v1/admin/stats/', headers=headers)), 0)
+
+
+class MetricsAccessTests(TestCase):
+    @override_settings(METRICS_TOKEN='scrape-secret')
+    def test_token_is_required_when_set(self):
+        self.assertEqual(self.client.get('/metrics/').status_code, 403)
+        self.assertEqual(self.client.get('/metrics/', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        response = self.client.get('/metrics/', HTTP_AUTHORIZATION='Bearer scrape-secret')
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(METRICS_TOKEN='', DEBUG=False)
+    def test_local_address_is_not_enough_without_debug(self):
+        # Behind a local proxy every request comes from 127.0.0.1
+        self.assertEqual(self.client.get('/metrics/', REMOTE_ADDR='127.0.0.1').status_code, 403)
+
+    @override_settings(METRICS_TOKEN='', DEBUG=True)
+    def test_allowed_addresses_in_debug(self):
+        self.assertEqual(self.client.get('/metrics/', REMOTE_ADDR='127.0.0.1').status_code, 200)
+        self.assertEqual(self.client.get('/metrics/', REMOTE_ADDR='10.0.0.5').status_code, 403)
+
+
+@override_settings(JOB_QUEUE_EAGER=False)
+class WorkflowJobTests(ExpenseTestData, TestCase):
+    def start_workflow(self, expense):
+        job = enqueue('expense.start_workflow', expense_id=str(expense.pk))
+        run_claimed(claim_job(job.pk, 'test'))
+        job.refresh_from_db()
+        expense.refresh_from_db()
+        return job
+
+    def test_workflow_reaches_the_manager(self):
+        expense = self.make_expense(status='submitted')
+        job = self.start_workflow(expense)
+        self.assertEqual(job.status, 'done')
+        self.assertEqual(expense.status, 'pending_approval')
+        self.assertEqual(expense.current_approver, self.manager)
+
+    def test_failed_workflow_is_retried_not_approved(self):
+        expense = self.make_expense(status='submitted')
+        with mock.patch('api.views.get_default_approval_flow', side_effect=RuntimeError('database went away')):
+            job = self.start_workflow(expense)
+        self.assertEqual(job.status, 'queued')
+        self.assertIn('database went away', job.last_error)
+        self.assertEqual(expense.status, 'submitted')
+
+    def queued(self, expense_id):
+        return set(Job.objects.filter(payload__expense_id=expense_id).values_list('name', flat=True))
+
+    def item(self, **fields):
+        return {
+            'amount': '20.00', 'currency': 'USD', 'category': self.category.pk,
+            'description': 'Taxi', 'expense_date': '2025-01-20', **fields,
+        }
+
+    def test_bulk_submission_queues_jobs(self):
+        client = self.client_for(self.employee)
+        with mock.patch('api.views.requests.get') as rate_lookup:
+            response = client.post('/api/v1/expenses/bulk/', {'expenses': [
+                self.item(), self.item(currency='EUR'),
+            ]}, format='json')
+        self.assertEqual(response.status_code, 201)
+        rate_lookup.assert_not_called()
+        local, foreign = response.json()['data']
+        self.assertEqual((local['status'], local['converted_amount']), ('pending_approval', '20.00'))
+        self.assertIsNone(foreign['converted_amount'])
+        self.assertEqual(self.queued(local['id']), {'expense.notify_approver'})
+        self.assertEqual(self.queued(foreign['id']), {'expense.convert_currency', 'expense.notify_approver'})
+
+    def test_async_submission_queues_jobs(self):
+        client = self.client_for(self.employee)
+        response = client.post('/api/v1/expenses/async/', self.item(currency='EUR'), format='json')
+        self.assertEqual(response.status_code, 201)
+        expense_id = response.json()['id']
+        self.assertEqual(self.queued(expense_id), {'expense.convert_currency', 'expense.start_workflow'})
+        job = Job.objects.get(name='expense.start_workflow', payload__expense_id=expense_id)
+        run_claimed(claim_job(job.pk, 'test'))
+        self.assertIn('expense.notify_approver', self.queued(expense_id))
+
+
+@override_settings(JOB_QUEUE_EAGER=False)
+class BulkSubmissionTests(ExpenseTestData, TestCase):
+    def item(self, **fields):
+        return {
+            'amount': '20.00', 'currency': 'USD', 'category': self.category.pk,
+            'description': 'Taxi', 'expense_date': '2025-01-20', **fields,
+        }
+
+    def submit(self, items):
+        return self.client_for(self.employee).post('/api/v1/expenses/bulk/', {'expenses': items}, format='json')
+
+    def test_each_expense_gets_approvals_and_a_change(self):
+        response = self.submit([self.item(), self.item(amount='35.00')])
+        self.assertEqual(response.status_code, 201)
+        ids = [row['id'] for row in response.json()['data']]
+        for expense in Expense.objects.filter(pk__in=ids):
+            self.assertEqual(expense.current_approver, self.manager)
+            self.assertEqual(
+                list(expense.approvals.order_by('step_order').values_list('step_order', 'approver', 'status')),
+                [(1, self.manager.pk, 'pending'), (2, self.admin.pk, 'pending')],
+            )
+        self.assertEqual(
+            sorted(str(pk) for pk in ExpenseChange.objects.values_list('expense_id', flat=True)), sorted(ids)
+        )
+
+    def test_one_invalid_item_rejects_the_batch(self):
+        response = self.submit([self.item(), self.item(amount='-5'), self.item(currency='')])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error['index'] for error in response.json()['errors']], [1, 2])
+        self.assertFalse(Expense.objects.exists())
+        self.assertFalse(ExpenseApproval.objects.exists())
+        self.assertFalse(ExpenseChange.objects.exists())
+        self.assertFalse(Job.objects.exists())
+
+    def test_queries_do_not_grow_with_the_batch(self):
+        self.submit([self.item()])  # creates the default approval flow
+        counts = []
+        for size in (2, 20):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.submit([self.item() for _ in range(size)])
+            self.assertEqual(response.status_code, 201)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+
+@override_settings(JOB_QUEUE_EAGER=False)
+class AsyncViewTests(ExpenseTestData, TestCase):
+    """expenses/async/ answers exactly like expenses/"""
+
+    def setUp(self):
+        cache.clear()
+        self.make_expense(description='Taxi')
+        self.make_expense(description='Hotel', status='approved')
+        self.make_expense(description='Lunch', status='rejected')
+
+    def test_list_matches_sync_view(self):
+        client = self.client_for(self.manager)
+        for query in ('', 'page=1&page_size=2', 'status=approved&facets=1', 'compact=1'):
+            with self.subTest(query=query):
+                sync = client.get(f'/api/v1/expenses/?{query}')
+                async_ = client.get(f'/api/v1/expenses/async/?{query}')
+                self.assertEqual(async_.status_code, 200)
+                # Page links point back at the route that was called
+                self.assertEqual(async_.content.replace(b'/expenses/async/', b'/expenses/'), sync.content)
+                self.assertEqual(async_['ETag'], sync['ETag'])
+
+    def test_unchanged_list_is_not_modified(self):
+        client = self.client_for(self.manager)
+        etag = client.get('/api/v1/expenses/async/')['ETag']
+        self.assertEqual(client.get('/api/v1/expenses/async/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_bad_filter_is_rejected_like_sync(self):
+        client = self.client_for(self.manager)
+        sync = client.get('/api/v1/expenses/?status=lost')
+        async_ = client.get('/api/v1/expenses/async/?status=lost')
+        self.assertEqual((async_.status_code, async_.json()), (sync.status_code, sync.json()))
+
+    def test_retried_submission_is_replayed(self):
+        client = self.client_for(self.employee)
+        payload = {
+            'amount': '12.50', 'currency': 'USD', 'category': self.category.pk,
+            'description': 'Train', 'expense_date': '2025-01-20',
+        }
+        first = client.post('/api/v1/expenses/async/', payload, format='json', HTTP_IDEMPOTENCY_KEY='trip-1')
+        retry = client.post('/api/v1/expenses/async/', payload, format='json', HTTP_IDEMPOTENCY_KEY='trip-1')
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(Expense.objects.filter(description='Train').count(), 1)
+        self.assertTrue(Job.objects.filter(name='expense.start_workflow', payload__expense_id=first.json()['id']).exists())
+
+
+@override_settings(JOB_QUEUE_EAGER=False)
+class IdempotencyTests(ExpenseTestData, TestCase):
+    def setUp(self):
+        self.client = self.client_for(self.employee)
+        self.payload = {
+            'amount': '12.50', 'currency': 'USD', 'category': self.category.pk,
+            'description': 'Train', 'expense_date': '2025-01-20',
+        }
+
+    def submit(self, key='trip-1', client=None, **changes):
+        return (client or self.client).post(
+            '/api/v1/expenses/', {**self.payload, **changes}, format='json', HTTP_IDEMPOTENCY_KEY=key
+        )
+
+    def submitted(self):
+        return Expense.objects.filter(description='Train').count()
+
+    def test_retry_replays_stored_response(self):
+        first = self.submit()
+        retry = self.submit()
+        self.assertEqual((first.status_code, retry.status_code), (201, 201))
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(self.submitted(), 1)
+
+    def test_key_reused_for_another_request_is_rejected(self):
+        self.submit()
+        response = self.submit(amount='99.00')
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(self.submitted(), 1)
+
+    def test_retry_while_first_request_runs_conflicts(self):
+        self.submit()
+        # As if the first request had claimed the key and not finished yet
+        IdempotencyKey.objects.update(response_status=None, response_body=None)
+        response = self.submit()
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(self.submitted(), 1)
+
+    def test_expired_key_runs_again(self):
+        self.submit()
+        IdempotencyKey.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        response = self.submit()
+        self.assertEqual(response.status_code, 201)
+        self.assertNotIn('Idempotent-Replayed', response)
+        self.assertEqual(self.submitted(), 2)
+        self.assertGreater(IdempotencyKey.objects.get().expires_at, timezone.now())
+
+    def test_keys_belong_to_one_user(self):
+        other = User.objects.create_user(
+            email='other@example.com', username='other', password='secret', role='employee',
+            company_name=self.company.name,
+        )
+        self.submit()
+        response = self.submit(client=self.client_for(other))
+        self.assertEqual(response.status_code, 201)
+        self.assertNotIn('Idempotent-Replayed', response)
+        self.assertEqual(self.submitted(), 2)
+
+    def test_failed_request_frees_the_key(self):
+        with mock.patch('api.views.enqueue_submission_jobs', side_effect=RuntimeError('queue down')):
+            with self.assertRaises(RuntimeError):
+                self.submit()
+        self.assertFalse(IdempotencyKey.objects.exists())
+        self.assertEqual(self.submit().status_code, 201)
+
+    def test_overlong_key_is_rejected(self):
+        self.assertEqual(self.submit(key='k' * 256).status_code, 400)
+        self.assertEqual(self.submitted(), 0)
+
+    def test_approval_retry_is_replayed(self):
+        expense = self.make_expense(current_approver=self.manager)
+        ExpenseApproval.objects.create(expense=expense, approver=self.manager, step_order=1, status='pending')
+        client = self.client_for(self.manager)
+        url = f'/api/v1/expenses/{expense.pk}/approve/'
+        first = client.post(url, {'action': 'approve'}, format='json', HTTP_IDEMPOTENCY_KEY='approve-1')
+        # Without the key this would be refused: the approval is no longer pending
+        retry = client.post(url, {'action': 'approve'}, format='json', HTTP_IDEMPOTENCY_KEY='approve-1')
+        self.assertEqual((first.status_code, retry.status_code), (200, 200))
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(client.post(url, {'action': 'approve'}, format='json').status_code, 403)
+
+
+@override_settings(ADMISSION_CONTROL=True, ADMISSION_USER_BUDGET='600/min', ADMISSION_ENDPOINT_RATES={})
+class AdmissionTests(ExpenseTestData, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = self.client_for(self.admin)
+
+    def assert_throttled(self, response, longest):
+        self.assertEqual(response.status_code, 429)
+        self.assertTrue(1 <= int(response['Retry-After']) <= longest, response['Retry-After'])
+
+    @override_settings(ADMISSION_USER_BUDGET='4/min')
+    def test_budget_is_spent_by_cost(self):
+        # The list costs 2 of the 4 units; a refill of 2 units takes 30 seconds
+        self.assertEqual(self.client.get('/api/v1/expenses/').status_code, 200)
+        self.assertEqual(self.client.get('/api/v1/expenses/').status_code, 200)
+        self.assert_throttled(self.client.get('/api/v1/expenses/'), 30)
+        # Each user has a budget of their own
+        self.assertEqual(self.client_for(self.manager).get('/api/v1/expenses/').status_code, 200)
+
+    @override_settings(ADMISSION_USER_BUDGET='3/min')
+    def test_requests_beyond_the_budget_spend_nothing(self):
+        self.client.get('/api/v1/expenses/')
+        self.assert_throttled(self.client.get('/api/v1/expenses/'), 30)
+        # The refused request took no units, so a cheap one still fits
+        self.assertEqual(self.client.get('/api/v1/expenses/categories/').status_code, 200)
+
+    @override_settings(ADMISSION_ENDPOINT_RATES={'admin-stats': '1/min'})
+    def test_endpoint_rate(self):
+        self.assertEqual(self.client.get('/api/v1/admin/stats/').status_code, 200)
+        self.assert_throttled(self.client.get('/api/v1/admin/stats/'), 60)
+        self.assertEqual(self.client.get('/api/v1/expenses/').status_code, 200)
+
+    @override_settings(ADMISSION_LOGIN_RATES={'address': '100/min', 'email': '2/min'})
+    def test_login_attempts_per_email(self):
+        client = APIClient()
+        for _ in range(2):
+            response = client.post('/api/v1/auth/login/', {'email': 'admin@example.com', 'password': 'wrong'}, format='json')
+            self.assertNotEqual(response.status_code, 429)
+        self.assert_throttled(client.post(
+            '/api/v1/auth/login/', {'email': 'Admin@example.com ', 'password': 'secret'}, format='json'
+        ), 30)
+        response = client.post('/api/v1/auth/login/', {'email': 'manager@example.com', 'password': 'wrong'}, format='json')
+        self.assertNotEqual(response.status_code, 429)
+
+    @override_settings(ADMISSION_USER_BUDGET='1/min', ADMISSION_CONTROL=False)
+    def test_disabled(self):
+        for _ in range(3):
+            self.assertEqual(self.client.get('/api/v1/expenses/').status_code, 200)
+
+    @override_settings(ADMISSION_MAX_INFLIGHT=2, ADMISSION_QUEUE_TIMEOUT=0, ADMISSION_RETRY_AFTER=3)
+    def test_full_pool_returns_503(self):
+        # Costly requests running elsewhere in the process hold every unit
+        self.assertTrue(admission.pool.acquire(2, 2, 0))
+        try:
+            response = self.client.get('/api/v1/expenses/')
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(response['Retry-After'], '3')
+            # Requests costing 1 are never held back
+            self.assertEqual(self.client.get('/api/v1/expenses/categories/').status_code, 200)
+        finally:
+            admission.pool.release(2)
+        self.assertEqual(self.client.get('/api/v1/expenses/').status_code, 200)
+        self.assertEqual(admission.pool.in_flight, 0)
+
+
+class BatchTests(ExpenseTestData, TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def batch(self, user, requests, **options):
+        return self.client_for(user).post('/api/v1/batch/', {'requests': requests, **options}, format='json')
+
+    def rename(self, user_id, name):
+        return {'method': 'PATCH', 'path': f'admin/users/{user_id}/', 'body': {'first_name': name}}
+
+    def test_atomic_batch_rolls_back_at_first_failure(self):
+        response = self.batch(self.admin, [
+            self.rename(self.employee.pk, 'Renamed'),
+            self.rename(0, 'Nobody'),
+            self.rename(self.manager.pk, 'Renamed'),
+        ], atomic=True)
+        self.assertEqual(response.status_code, 400)
+        body = response.json()
+        self.assertEqual(body['failed_index'], 1)
+        self.assertEqual([part['status'] for part in body['data']], [200, 404])
+        self.assertEqual(
+            set(User.objects.filter(pk__in=[self.employee.pk, self.manager.pk]).values_list('first_name', flat=True)),
+            {'Employee', 'Manager'},
+        )
+
+    def test_batch_without_atomic_keeps_earlier_changes(self):
+        response = self.batch(self.admin, [self.rename(self.employee.pk, 'Renamed'), self.rename(0, 'Nobody')])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([part['status'] for part in response.json()['data']], [200, 404])
+        self.assertEqual(User.objects.get(pk=self.employee.pk).first_name, 'Renamed')
+
+    def test_subrequests_run_as_the_caller(self):
+        response = self.batch(self.employee, [
+            {'method': 'GET', 'path': '/api/v1/auth/profile/'},
+            {'method': 'GET', 'path': 'admin/stats/'},
+            self.rename(self.employee.pk, 'Promoted'),
+        ])
+        profile, stats, rename = response.json()['data']
+        self.assertEqual(profile['body']['data']['email'], self.employee.email)
+        self.assertEqual((stats['status'], rename['status']), (403, 403))
+        self.assertEqual(User.objects.get(pk=self.employee.pk).first_name, 'Employee')
+
+    def test_batch_needs_authentication(self):
+        response = APIClient().post('/api/v1/batch/', {'requests': [{'path': 'auth/profile/'}]}, format='json')
+        self.assertEqual(response.status_code, 401)
+
+    def test_only_json_api_views_can_be_batched(self):
+        response = self.batch(self.admin, [
+            {'method': 'GET', 'path': '/admin/'},
+            {'method': 'POST', 'path': 'batch/', 'body': {'requests': [{'path': 'auth/profile/'}]}},
+            {'method': 'GET', 'path': 'expenses/async/'},
+            {'method': 'GET', 'path': 'expenses/export/'},
+            {'method': 'GET', 'path': 'nowhere/'},
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([part['status'] for part in response.json()['data']], [400, 400, 400, 400, 404])
+
+    def test_malformed_batches_are_rejected(self):
+        for requests in ([], [{'method': 'TRACE', 'path': 'auth/profile/'}], [{'method': 'GET'}], ['auth/profile/']):
+            with self.subTest(requests=requests):
+                self.assertEqual(self.batch(self.admin, requests).status_code, 400)
+        with override_settings(BATCH_MAX_REQUESTS=1):
+            self.assertEqual(self.batch(self.admin, [{'path': 'auth/profile/'}] * 2).status_code, 400)
+
+
+class UserCompanyTests(ExpenseTestData, TestCase):
+    def test_fallback_saves_only_the_company_name(self):
+        self.make_expense()
+        user = self.make_user('newcomer', Company(name='Elsewhere'))
+        # The in-memory user is stale, like one built from cached claims
+        User.objects.filter(pk=user.pk).update(password='changed')
+        self.assertEqual(get_user_company(user), self.company)
+        user = User.objects.get(pk=user.pk)
+        self.assertEqual((user.company_name, user.password), ('Acme', 'changed'))
+
+
+class BootstrapTests(ExpenseTestData, TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def bootstrap(self, user):
+        response = self.client_for(user).get('/api/v1/bootstrap/')
+        self.assertEqual(response.status_code, 200)
+        return response.json()['data']
+
+    def test_employee_gets_no_approvals_or_users(self):
+        data = self.bootstrap(self.employee)
+        self.assertEqual(data['user']['email'], self.employee.email)
+        self.assertNotIn('pending_approvals', data)
+        self.assertNotIn('users', data)
+
+    def test_manager_gets_approvals_but_no_users(self):
+        expense = self.make_expense(current_approver=self.manager)
+        data = self.bootstrap(self.manager)
+        self.assertEqual([e['id'] for e in data['pending_approvals']], [str(expense.id)])
+        self.assertNotIn('users', data)
+
+    def test_admin_gets_the_company_users(self):
+        globex = Company.objects.create(name='Globex', currency='USD')
+        self.make_user('rival', globex)
+        data = self.bootstrap(self.admin)
+        self.assertIn('pending_approvals', data)
+        self.assertEqual(
+            [u['email'] for u in data['users']],
+            [self.admin.email, self.manager.email, self.employee.email],
+        )
+        employee = data['users'][2]
+        self.assertEqual(employee['role'], 'employee')
+        self.assertEqual(employee['manager_relationships'][0]['manager_id'], self.manager.id)
+
+
+class FilterTests(ExpenseTestData, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.meals = ExpenseCategory.objects.create(name='Meals', company=cls.company)
+        # Same company, not on the manager's team
+        cls.outsider = cls.make_user('outsider')
+        cls.globex = Company.objects.create(name='Globex', currency='USD')
+        cls.rival = cls.make_user('rival', cls.globex)
+
+        cls.taxi = cls.make_expense()
+        cls.dinner = cls.make_expense(
+            category=cls.meals, status='approved', amount=Decimal('40.00'), converted_amount=Decimal('40.00'),
+            expense_date=date(2025, 2, 10),
+        )
+        cls.museum = cls.make_expense(
+            category=None, status='rejected', currency='EUR', amount=Decimal('24.00'),
+            converted_amount=Decimal('25.00'), expense_date=date(2025, 2, 20),
+        )
+        cls.make_expense(employee=cls.outsider, status='approved', amount=Decimal('99.00'), converted_amount=Decimal('99.00'))
+        cls.make_expense(employee=cls.rival, company=cls.globex, category=None, status='approved')
+
+    def setUp(self):
+        cache.clear()
+
+    def list(self, user, **params):
+        response = self.client_for(user).get('/api/v1/expenses/', params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def ids(self, user, **params):
+        return {item['id'] for item in self.list(user, **params)['data']}
+
+    def counts(self, facet):
+        return {item['key']: item['count'] for item in facet}
+
+    def test_filters_combine(self):
+        self.assertEqual(
+            self.ids(self.manager, status='approved,rejected', date_from='2025-02', max_amount='30'),
+            {str(self.museum.pk)},
+        )
+        self.assertEqual(self.ids(self.manager, date_to='2025-01'), {str(self.taxi.pk)})
+        self.assertEqual(self.ids(self.manager, category='none'), {str(self.museum.pk)})
+        self.assertEqual(
+            self.ids(self.manager, category=f'{self.meals.pk},none', currency='usd'), {str(self.dinner.pk)}
+        )
+        self.assertEqual(len(self.ids(self.manager, status='all')), 3)
+
+    def test_bad_values_are_rejected(self):
+        client = self.client_for(self.manager)
+        for params in (
+            {'date_from': 'yesterday'}, {'date_to': '2025-13'}, {'min_amount': 'ten'},
+            {'max_amount': 'NaN'}, {'employee': 'me'}, {'category': 'travel'},
+        ):
+            with self.subTest(params=params):
+                response = client.get('/api/v1/expenses/', params)
+                self.assertEqual(response.status_code, 400)
+                self.assertFalse(response.json()['success'])
+
+    def test_facets_count_only_visible_expenses(self):
+        facets = self.list(self.manager, facets='1')['facets']
+        self.assertEqual(self.counts(facets['status']), {'pending_approval': 1, 'approved': 1, 'rejected': 1})
+        self.assertEqual(self.counts(facets['employee']), {self.employee.pk: 3})
+        self.assertEqual(self.counts(facets['category']), {self.category.pk: 1, self.meals.pk: 1, None: 1})
+
+        # Admins see their whole company, still not another one
+        facets = self.list(self.admin, facets='1')['facets']
+        self.assertEqual(self.counts(facets['employee']), {self.employee.pk: 3, self.outsider.pk: 1})
+        self.assertEqual(self.counts(facets['status'])['approved'], 2)
+
+    def test_facet_ignores_its_own_selection(self):
+        body = self.list(self.manager, facets='1', status='approved')
+        self.assertEqual(len(body['data']), 1)
+        self.assertEqual(self.counts(body['facets']['status']), {'pending_approval': 1, 'approved': 1, 'rejected': 1})
+        self.assertEqual(self.counts(body['facets']['category']), {self.meals.pk: 1})
+
+
+class ResponseCacheTests(ExpenseTestData, TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def categories(self, user):
+        response = self.client_for(user).get('/api/v1/expenses/categories/')
+        self.assertEqual(response.status_code, 200)
+        return [item['name'] for item in response.json()['data']]
+
+    def assert_bumps(self, change):
+        before = company_cache_version(self.company.name)
+        change()
+        self.assertNotEqual(company_cache_version(self.company.name), before)
+
+    def test_company_changes_bump_the_version(self):
+        rule = ApprovalRule.objects.create(company=self.company, name='Default')
+        self.assert_bumps(lambda: ExpenseCategory.objects.create(name='Meals', company=self.company))
+        self.assert_bumps(lambda: ExpenseCategory.objects.filter(pk=self.category.pk).first().save())
+        self.assert_bumps(lambda: ApprovalRule.objects.create(company=self.company, name='Strict'))
+        flow = ApprovalFlow.objects.create(company=self.company, name='Flow', rule=rule)
+        self.assert_bumps(lambda: ApprovalFlow.objects.create(company=self.company, name='Other', rule=rule))
+        self.assert_bumps(lambda: ApprovalStep.objects.create(approval_flow=flow, approver_type='manager', step_order=1))
+        self.assert_bumps(lambda: ManagerEmployee.objects.filter(employee=self.employee).first().delete())
+        self.assert_bumps(lambda: self.make_user('newcomer'))
+
+        def rename():
+            self.employee.first_name = 'Renamed'
+            self.employee.save()
+        self.assert_bumps(rename)
+        self.assert_bumps(lambda: self.category.delete())
+
+    def test_login_does_not_bump_the_version(self):
+        before = company_cache_version(self.company.name)
+        self.employee.last_login = timezone.now()
+        self.employee.save(update_fields=['last_login'])
+        self.assertEqual(company_cache_version(self.company.name), before)
+
+    def test_cached_response_is_dropped_on_change(self):
+        self.assertEqual(self.categories(self.employee), ['Travel'])
+        # Not through save(): no signal, so the cached response stays
+        ExpenseCategory.objects.filter(pk=self.category.pk).update(name='Flights')
+        self.assertEqual(self.categories(self.employee), ['Travel'])
+        ExpenseCategory.objects.create(name='Meals', company=self.company)
+        self.assertEqual(sorted(self.categories(self.employee)), ['Flights', 'Meals'])
+
+    def test_responses_are_not_shared_between_users(self):
+        globex = Company.objects.create(name='Globex', currency='USD')
+        ExpenseCategory.objects.create(name='Freight', company=globex)
+        rival = self.make_user('rival', globex)
+        for _ in range(2):
+            for user in (self.employee, self.manager, rival):
+                response = self.client_for(user).get('/api/v1/auth/profile/')
+                self.assertEqual(response.json()['data']['email'], user.email)
+            self.assertEqual(self.categories(self.employee), ['Travel'])
+            self.assertEqual(self.categories(rival), ['Freight'])
+
+
+class ConditionalListTests(ExpenseTestData, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.expense = self.make_expense()
+        self.client = self.client_for(self.manager)
+
+    def test_unchanged_list_is_not_modified(self):
+        response = self.client.get('/api/v1/expenses/')
+        self.assertNotIn('Last-Modified', response)
+        response = self.client.get('/api/v1/expenses/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_if_modified_since_alone_is_ignored(self):
+        response = self.client.get('/api/v1/expenses/', HTTP_IF_MODIFIED_SINCE='Fri, 01 Jan 2100 00:00:00 GMT')
+        self.assertEqual(response.status_code, 200)
+
+    def test_logged_change_outside_updated_at_changes_the_etag(self):
+        etag = self.client.get('/api/v1/expenses/')['ETag']
+        # e.g. an approver reassignment written without touching updated_at
+        Expense.objects.filter(pk=self.expense.pk).update(current_approver=self.admin)
+        record_expense_changes([self.expense])
+        response = self.client.get('/api/v1/expenses/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(DELTA_SYNC_SETTLE_SECONDS=0)
+class DeltaSyncTests(ExpenseTestData, TestCase):
+    def setUp(self):
+        self.other = User.objects.create_user(
+            email='other@example.com', username='other', password='secret', role='employee',
+            company_name=self.company.name,
+        )
+        self.team_expense = self.make_expense()
+        self.other_expense = self.make_expense(employee=self.other)
+        self.client = self.client_for(self.manager)
+        self.token = self.client.get('/api/v1/expenses/changes/').json()['data']['next']
+
+    def changes(self):
+        return self.client.get('/api/v1/expenses/changes/', {'since': self.token}).json()['data']
+
+    def test_other_teams_expenses_are_not_revealed(self):
+        self.other_expense.description = 'Dinner'
+        self.other_expense.save()
+        self.other_expense.delete()
+        data = self.changes()
+        self.assertEqual(data['changed'], [])
+        self.assertEqual(data['removed'], [])
+
+    def test_expenses_leaving_the_view_are_removed(self):
+        ManagerEmployee.objects.filter(manager=self.manager, employee=self.employee).update(is_active=False)
+        self.team_expense.description = 'Dinner'
+        self.team_expense.save()
+        data = self.changes()
+        self.assertEqual(data['removed'], [{'id': str(self.team_expense.pk), 'reason': 'hidden'}])
+
+
+class FastRenderingParityTests(ExpenseTestData, TestCase):
+    """The fast list path renders exactly what ExpenseSerializer does"""
+
+    VARIANTS = [
+        '',
+        'compact=1',
+        'compact=true&expand=approvals',
+        'fields=id,amount,status,employee_name,approvals',
+        'fields=id,receipt_image,category_name,company_currency',
+        'expand=employee,approvals.approver',
+        'expand=approvals',
+        'expand=',
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        approved = cls.make_expense(status='approved', receipt_image='receipts/taxi.jpg', current_approver=cls.manager)
+        for step, approver in enumerate((cls.manager, cls.admin), start=1):
+            ExpenseApproval.objects.create(
+                expense=approved, approver=approver, step_order=step, status='approved',
+                comments='Fine', approved_at=timezone.now(),
+            )
+        pending = cls.make_expense(category=None, converted_amount=None, currency='EUR', current_approver=cls.manager)
+        ExpenseApproval.objects.create(expense=pending, approver=cls.manager, step_order=1)
+        cls.make_expense(employee=cls.manager, status='draft', description='')
+        # Settled expenses move to the archive tables with their approvals
+        Expense.objects.filter(pk=approved.pk).update(updated_at=timezone.now() - timedelta(days=400))
+        archive_settled_expenses(older_than_days=30)
+        cls.make_expense(status='rejected')
+
+    def assert_same_rendering(self, queryset):
+        factory = RequestFactory()
+        for query in self.VARIANTS:
+            with self.subTest(model=queryset.model.__name__, query=query):
+                context = expense_context(factory.get(f'/?{query}'))
+                expected = serialize_expense_list(queryset, context)
+                actual = ExpenseListRenderer(context, queryset.model).render(queryset)
+                self.assertEqual(actual, expected)
+                # Byte for byte, so field order matches too
+                renderer = FastJSONRenderer()
+                self.assertEqual(renderer.render(actual), renderer.render(expected))
+
+    def test_expenses(self):
+        self.assertEqual(Expense.objects.count(), 3)
+        self.assert_same_rendering(Expense.objects.order_by('-created_at'))
+
+    def test_archived_expenses(self):
+        self.assertEqual(ArchivedExpense.objects.count(), 1)
+        self.assert_same_rendering(ArchivedExpense.objects.order_by('-created_at'))
+
+    def test_list_endpoint(self):
+        client = self.client_for(self.admin)
+        for query in self.VARIANTS:
+            with self.subTest(query=query):
+                with override_settings(FAST_EXPENSE_LISTS=False):
+                    expected = client.get(f'/api/v1/expenses/?{query}').content
+                cache.clear()
+                self.assertEqual(client.get(f'/api/v1/expenses/?{query}').content, expected)
+
+
+@override_settings(JOB_QUEUE_EAGER=False)
+class RollupTests(ExpenseTestData, TestCase):
+    """Incrementally kept rollups equal a rebuild from the expenses"""
+
+    def rollups(self):
+        return sorted(
+            ExpenseRollup.objects.exclude(count=0, amount=0).values_list(
+                'company_id', 'period', 'category_id', 'employee_id', 'status', 'count', 'amount'
+            ),
+            key=str,
+        )
+
+    def assert_matches_rebuild(self):
+        incremental, series = self.rollups(), rollup_series(self.company, group_by='status')
+        rebuild_rollups()
+        self.assertEqual(self.rollups(), incremental)
+        self.assertEqual(rollup_series(self.company, group_by='status'), series)
+
+    def test_writes_keep_rollups_current(self):
+        pending = self.make_expense(current_approver=self.manager)
+        ExpenseApproval.objects.create(expense=pending, approver=self.manager, step_order=1, status='pending')
+        self.make_expense(amount=Decimal('30.00'), converted_amount=None, currency='EUR', expense_date=date(2025, 2, 3))
+        self.assert_matches_rebuild()
+
+        response = self.client_for(self.manager).post(
+            f'/api/v1/expenses/{pending.pk}/approve/', {'action': 'approve'}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assert_matches_rebuild()
+
+        response = self.client_for(self.employee).post('/api/v1/expenses/bulk/', {'expenses': [
+            {'amount': '5.00', 'currency': 'USD', 'category': self.category.pk,
+             'description': 'Bus', 'expense_date': '2025-03-01'},
+            {'amount': '7.00', 'currency': 'EUR', 'description': 'Coffee', 'expense_date': '2025-03-02'},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assert_matches_rebuild()
+
+    def test_deletions_leave_the_rollups(self):
+        kept = self.make_expense()
+        self.make_expense(status='approved')
+        self.make_expense(status='approved', expense_date=date(2025, 4, 1))
+        other = self.make_user('contractor')
+        self.make_expense(employee=other)
+
+        kept.delete()
+        self.assert_matches_rebuild()
+        Expense.objects.filter(expense_date=date(2025, 4, 1)).delete()
+        self.assert_matches_rebuild()
+        # Cascades from the employee
+        other.delete()
+        self.assert_matches_rebuild()
+
+    def test_archiving_keeps_rollups_and_deleting_archived_rows_leaves_them(self):
+        self.make_expense(status='approved')
+        self.make_expense(status='rejected')
+        Expense.objects.update(updated_at=timezone.now() - timedelta(days=400))
+        before = self.rollups()
+        self.assertEqual(archive_settled_expenses(older_than_days=365), 2)
+        self.assertEqual(self.rollups(), before)
+        self.assert_matches_rebuild()
+        ArchivedExpense.objects.filter(status='rejected').delete()
+        self.assert_matches_rebuild()
+        self.assertEqual(sum(row[5] for row in self.rollups()), 1)
+
+
+class ReportTests(ExpenseTestData, TestCase):
+    def setUp(self):
+        cache.clear()
+        submitted = timezone.now() - timedelta(hours=30)
+        for amount in (10, 20, 30, 40):
+            expense = self.make_expense(amount=amount, converted_amount=amount, status='approved', submitted_at=submitted)
+            ExpenseApproval.objects.create(
+                expense=expense, approver=self.manager, step_order=1, status='approved',
+                approved_at=submitted + timedelta(hours=amount),
+            )
+        self.make_expense(amount=5, converted_amount=None, category=None)
+
+    def report(self, name, **params):
+        response = self.client_for(self.admin).get(f'/api/v1/reports/{name}/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()['data']
+
+    def test_spend_by_category(self):
+        uncategorized, travel = self.report('spend-by-category')['groups']
+        self.assertEqual(
+            {k: travel[k] for k in ('key', 'label', 'count', 'total', 'mean', 'p50', 'p75')},
+            {'key': self.category.pk, 'label': 'Travel', 'count': 4, 'total': 100.0, 'mean': 25.0, 'p50': 25.0, 'p75': 32.5},
+        )
+        self.assertEqual((uncategorized['key'], uncategorized['total']), (None, 5.0))
+
+    def test_approval_turnaround(self):
+        data = self.report('approval-turnaround')
+        self.assertEqual(data['overall']['count'], 4)
+        self.assertEqual(data['overall']['p50'], 25.0)
+        self.assertEqual([bucket['count'] for bucket in data['histogram']], [0, 2, 2, 0, 0, 0])
+
+    def test_status_filter(self):
+        data = self.report('amount-percentiles', status='pending_approval')
+        self.assertEqual(data['overall']['count'], 1)
+        self.assertEqual(data['by_status'][0]['key'], 'pending_approval')
+
+
+@skipUnless(connection.vendor == 'sqlite', 'SQLite FTS5 index')
+class SearchIndexTests(ExpenseTestData, TransactionTestCase):
+    def setUp(self):
+        self.setUpTestData()
+        self.client = self.client_for(self.admin)
+
+    def search(self, query):
+        response = self.client.get('/api/v1/expenses/search/', {'q': query})
+        self.assertEqual(response.status_code, 200)
+        return [expense['description'] for expense in response.json()['data']]
+
+    def test_matches_follow_inserts_updates_and_deletes(self):
+        stay = self.make_expense(description='Hotel stay for client visit')
+        self.make_expense(description='Client dinner downtown')
+        self.assertEqual(self.search('client dinner'), ['Client dinner downtown'])
+        self.assertEqual(self.search('hot'), ['Hotel stay for client visit'])
+
+        stay.description = 'Train ticket'
+        stay.save()
+        self.assertEqual(self.search('hotel'), [])
+        stay.delete()
+        self.assertEqual(self.search('train'), [])
+
+    def test_index_survives_vacuum(self):
+        # VACUUM may renumber the implicit rowids of tables like api_expense
+        expenses = [self.make_expense(description=f'Taxi ride {n}') for n in range(20)]
+        for expense in expenses[:15]:
+            expense.delete()
+        self.make_expense(description='Hotel in Paris')
+        with connection.cursor() as cursor:
+            cursor.execute('VACUUM')
+        self.assertEqual(self.search('paris'), ['Hotel in Paris'])
+        self.assertEqual(sorted(self.search('taxi')), sorted(f'Taxi ride {n}' for n in range(15, 20)))
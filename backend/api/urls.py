@@ -1,6 +1,6 @@
 from django.urls import path
 from rest_framework_simplejwt.views import TokenRefreshView
-from . import views
+from . import async_views, views
 
 urlpatterns = [
     # Authentication endpoints
@@ -9,16 +9,26 @@ urlpatterns = [
     path('auth/logout/', views.logout_user, name='logout'),
     path('auth/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('auth/profile/', views.get_user_profile, name='profile'),
+    path('bootstrap/', views.bootstrap, name='bootstrap'),
+    path('batch/', views.batch, name='batch'),
     
     # Expense Management endpoints
     path('expenses/', views.expense_list_create, name='expense-list-create'),
+    path('expenses/async/', async_views.expense_list_create_async, name='expense-list-create-async'),
+    path('expenses/changes/', views.expense_changes, name='expense-changes'),
+    path('expenses/search/', views.expense_search, name='expense-search'),
+    path('expenses/bulk/', views.bulk_create_expenses, name='expense-bulk-create'),
     path('expenses/pending/', views.pending_approvals, name='pending-approvals'),
     path('expenses/<uuid:expense_id>/approve/', views.approve_reject_expense, name='approve-expense'),
     path('expenses/categories/', views.expense_categories, name='expense-categories'),
+    path('expenses/export/', views.export_expenses, name='expense-export'),
     
     # Admin endpoints
     path('admin/stats/', views.admin_stats, name='admin-stats'),
+    path('admin/stats/series/', views.admin_stats_series, name='admin-stats-series'),
+    path('reports/<str:name>/', views.expense_report, name='expense-report'),
      # User management endpoints
+    path('admin/approval-rules/', views.approval_rules, name='approval-rules'),
     path('admin/users/', views.user_management, name='user-management'),
     path('admin/users/<int:user_id>/', views.update_user, name='update-user'),  # ADD THIS LINE
     path('admin/users/<int:user_id>/delete/', views.delete_user, name='delete-user'),
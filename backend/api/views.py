@@ -1,14 +1,18 @@
 from rest_framework import status, permissions
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, throttle_classes
 from rest_framework.response import Response
 from rest_framework.pagination import PageNumberPagination
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework.exceptions import NotFound
 from rest_framework_simplejwt.exceptions import TokenError
-from django.contrib.auth import authenticate
 from django.shortcuts import get_object_or_404
-from django.db.models import Q, Count
+from django.core.paginator import InvalidPage
+from django.db import transaction
+from django.db.models import Q
+from django.http import StreamingHttpResponse
 from django.utils import timezone
+from django.conf import settings
 from accounts.models import User
+from accounts.authentication import ClaimsRefreshToken, RevocableRefreshToken, forget_user
 from accounts.serializers import (
     UserRegistrationSerializer, 
     UserLoginSerializer, 
@@ -16,12 +20,36 @@ from accounts.serializers import (
 )
 from .models import *
 from .serializers import *
+from .db import select_for_update_skip_locked
+from .db_router import read_replica
+from .admission import LoginThrottle, limit_concurrency
+from .archive import status_totals, with_archive
+from .idempotency import idempotent
+from .jobs import enqueue_many
+from .response_cache import cache_per_user, company_cache_version
+from .conditional import ListValidators
+from .fast_render import render_expense_list
+from .rollups import GROUPS, INTERVALS, rollup_series
+from .reports import REPORTS, run_report
+from .search import search_expenses
+from .filters import ExpenseFilters, expense_facets, parse_date_param
+from .batch import parse_subrequests, run_batch
+from .changes import (
+    changes_since, current_token, latest_change, record_expense_changes, removal_reasons, token_expired,
+)
 import requests
+import csv
+import logging
 from decimal import Decimal
 
+logger = logging.getLogger(__name__)
+# Per-row diagnostics; sampled and off by default (see settings.LOGGING)
+row_logger = logging.getLogger(f'{__name__}.rows')
+
 # Authentication Views
 @api_view(['POST'])
 @permission_classes([permissions.AllowAny])
+@throttle_classes([LoginThrottle])
 def register_user(request):
     serializer = UserRegistrationSerializer(data=request.data)
     if serializer.is_valid():
@@ -30,14 +58,11 @@ def register_user(request):
         # Auto-create company if it's the first signup
         company = get_or_create_company(user)
         
-        # Generate JWT tokens
-        refresh = RefreshToken.for_user(user)
+        # Generate JWT tokens; the user claims (role, email, company) are
+        # on both, so refreshed access tokens keep them
+        refresh = ClaimsRefreshToken.for_user(user)
         access_token = refresh.access_token
         
-        # Add custom claims
-        access_token['role'] = user.role
-        access_token['email'] = user.email
-        
         return Response({
             'success': True,
             'message': 'User registered successfully',
@@ -57,19 +82,17 @@ def register_user(request):
 
 @api_view(['POST'])
 @permission_classes([permissions.AllowAny])
+@throttle_classes([LoginThrottle])
 def login_user(request):
     serializer = UserLoginSerializer(data=request.data)
     if serializer.is_valid():
         user = serializer.validated_data['user']
         
-        # Generate JWT tokens
-        refresh = RefreshToken.for_user(user)
+        # Generate JWT tokens; the user claims (role, email, company) are
+        # on both, so refreshed access tokens keep them
+        refresh = ClaimsRefreshToken.for_user(user)
         access_token = refresh.access_token
         
-        # Add custom claims
-        access_token['role'] = user.role
-        access_token['email'] = user.email
-        
         return Response({
             'success': True,
             'message': 'Login successful',
@@ -89,6 +112,7 @@ def login_user(request):
 
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
+@cache_per_user
 def get_user_profile(request):
     serializer = UserProfileSerializer(request.user)
     return Response({
@@ -107,7 +131,7 @@ def logout_user(request):
                 'error': 'Refresh token is required'
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        token = RefreshToken(refresh_token)
+        token = RevocableRefreshToken(refresh_token)
         token.blacklist()
         
         return Response({
@@ -130,6 +154,27 @@ class ExpensePagination(PageNumberPagination):
     page_size = 20
     page_size_query_param = 'page_size'
     max_page_size = 100
+    
+    def paginate_rendered(self, queryset, request, render):
+        """Like paginate_queryset, but passes the page to render as an
+        unevaluated queryset (for render_expense_list) and returns its result
+        """
+        paginator = self.django_paginator_class(queryset, self.get_page_size(request))
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage:
+            raise NotFound(f'Invalid page {page_number!r}')
+        self.request = request
+        return render(self.page.object_list)
+    
+    def page_info(self):
+        return {
+            'count': self.page.paginator.count,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+        }
+
 @api_view(['PUT', 'PATCH'])
 @permission_classes([permissions.IsAuthenticated])
 def update_user(request, user_id):
@@ -163,7 +208,7 @@ def update_user(request, user_id):
             'error': 'User not found'
         }, status=status.HTTP_404_NOT_FOUND)
     except Exception as e:
-        print(f"Error updating user: {str(e)}")
+        logger.exception('Error updating user', extra={'user_id': user_id})
         return Response({
             'success': False,
             'error': str(e)
@@ -171,35 +216,49 @@ def update_user(request, user_id):
 
 @api_view(['GET', 'POST'])
 @permission_classes([permissions.IsAuthenticated])
+@limit_concurrency
+@read_replica
+@idempotent
 def expense_list_create(request):
     user = request.user
     
     if request.method == 'GET':
-        # Filter expenses based on user role
-        if user.role == 'admin':
-            company = get_user_company(user)
-            expenses = Expense.objects.filter(company=company)
-        elif user.role == 'manager':
-            # Get expenses from managed employees + own expenses
-            managed_employees = ManagerEmployee.objects.filter(
-                manager=user, is_active=True
-            ).values_list('employee_id', flat=True)
-            expenses = Expense.objects.filter(
-                Q(employee=user) | Q(employee_id__in=managed_employees)
-            )
-        else:  # employee
-            expenses = Expense.objects.filter(employee=user)
+        try:
+            filters = ExpenseFilters(request.query_params)
+        except ValueError as e:
+            return Response({'success': False, 'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         
-        # Apply filters
-        status_filter = request.query_params.get('status')
-        if status_filter and status_filter != 'all':
-            expenses = expenses.filter(status=status_filter)
+        # Filter expenses based on user role, then the query parameters
+        base = filters.base(get_visible_expenses(user))
+        expenses = filters.apply(base)
+        with_facets = request.query_params.get('facets') in ('1', 'true')
         
-        serializer = ExpenseSerializer(expenses, many=True)
-        return Response({
-            'success': True,
-            'data': serializer.data
-        })
+        # The company cache version changes with user and category edits,
+        # which show up in the nested details but not in updated_at; the
+        # change log also records deletions and approver changes. Facets
+        # count expenses the facet filters leave out, so validate those too
+        company = get_user_company(user)
+        validators = ListValidators(
+            request, base if with_facets else expenses, user.pk, user.role,
+            company_cache_version(user.company_name or ''), latest_change(company.id) if company else 0
+        )
+        not_modified = validators.not_modified(request)
+        if not_modified is not None:
+            return not_modified
+        
+        context = expense_context(request)
+        body = {'success': True}
+        if 'page' in request.query_params or 'page_size' in request.query_params:
+            paginator = ExpensePagination()
+            body['data'] = paginator.paginate_rendered(
+                expenses, request, lambda page: render_expense_list(page, context)
+            )
+            body.update(paginator.page_info())
+        else:
+            body['data'] = render_expense_list(expenses, context)
+        if with_facets:
+            body['facets'] = expense_facets(base, filters)
+        return validators.apply(Response(body))
     
     elif request.method == 'POST':
         # Only employees can create expenses
@@ -213,25 +272,23 @@ def expense_list_create(request):
         if serializer.is_valid():
             company = get_user_company(user)
             
-            # Convert currency if needed
-            converted_amount = serializer.validated_data['amount']
-            if serializer.validated_data['currency'] != company.currency:
-                converted_amount = convert_currency(
-                    serializer.validated_data['amount'],
-                    serializer.validated_data['currency'],
-                    company.currency
-                )
-            
-            expense = serializer.save(
-                employee=user,
-                company=company,
-                converted_amount=converted_amount,
-                status='submitted',
-                submitted_at=timezone.now()
-            )
+            # Foreign amounts are converted by a background job
+            converted_amount = None
+            if serializer.validated_data['currency'] == company.currency:
+                converted_amount = serializer.validated_data['amount']
             
-            # Create multi-level approval workflow
-            create_approval_workflow(expense)
+            with transaction.atomic():
+                expense = serializer.save(
+                    employee=user,
+                    company=company,
+                    converted_amount=converted_amount,
+                    status='submitted',
+                    submitted_at=timezone.now()
+                )
+                
+                # Conversion, approval workflow, thumbnail and notification
+                # run after the response; the expense stays 'submitted' until then
+                enqueue_submission_jobs([expense])
             
             return Response(
                 ExpenseSerializer(expense).data, 
@@ -245,6 +302,211 @@ def expense_list_create(request):
 
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
+@read_replica
+def expense_changes(request):
+    """Expenses changed since the client's last sync token, plus tombstones
+    for those it can no longer see. Without a valid token every visible
+    expense is returned with reset set, and the client replaces its list.
+    """
+    user = request.user
+    since = request.query_params.get('since')
+    
+    try:
+        since = int(since) if since else None
+    except ValueError:
+        return Response({
+            'success': False,
+            'error': 'Invalid since token'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    context = expense_context(request)
+    visible = get_visible_expenses(user)
+    
+    if since is None or token_expired(since):
+        # Read the token first: anything written meanwhile is sent again next time
+        next_token = current_token()
+        return Response({
+            'success': True,
+            'data': {
+                'changed': render_expense_list(visible, context),
+                'removed': [],
+                'next': str(next_token),
+                'has_more': False,
+                'reset': True,
+            }
+        })
+    
+    # Only log rows of expenses the user could have seen, so tombstones do
+    # not reveal the ids of other people's expenses
+    if user.role == 'employee':
+        log = ExpenseChange.objects.filter(employee_id=user.pk)
+    elif user.role == 'manager':
+        # Deactivated assignments count: their expenses leave the manager's view
+        employees = ManagerEmployee.objects.filter(manager=user).values_list('employee_id', flat=True)
+        log = ExpenseChange.objects.filter(Q(employee_id=user.pk) | Q(employee_id__in=employees))
+    else:
+        log = ExpenseChange.objects.filter(company_id=get_user_company(user).id)
+    
+    expense_ids, next_token, has_more = changes_since(log, since, settings.DELTA_SYNC_MAX_CHANGES)
+    changed = visible.filter(pk__in=expense_ids)
+    seen = set(changed.values_list('pk', flat=True))
+    removed = removal_reasons([pk for pk in expense_ids if pk not in seen])
+    
+    return Response({
+        'success': True,
+        'data': {
+            'changed': render_expense_list(changed, context),
+            'removed': [{'id': pk, 'reason': reason} for pk, reason in removed.items()],
+            'next': str(next_token),
+            'has_more': has_more,
+            'reset': False,
+        }
+    })
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+@limit_concurrency
+@read_replica
+def expense_search(request):
+    """Expenses the user can see whose description matches ?q=, best
+    matches first, paginated (?page=, ?page_size=)
+    """
+    query = request.query_params.get('q', '').strip()
+    if not query:
+        return Response({
+            'success': False,
+            'error': 'q is required'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    expenses = search_expenses(get_visible_expenses(request.user), query)
+    context = expense_context(request)
+    paginator = ExpensePagination()
+    data = paginator.paginate_rendered(
+        expenses, request, lambda page: render_expense_list(page, context)
+    )
+    return Response({
+        'success': True,
+        'data': data,
+        **paginator.page_info()
+    })
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+@idempotent
+def bulk_create_expenses(request):
+    user = request.user
+    
+    # Only employees can create expenses
+    if user.role != 'employee':
+        return Response(
+            {'error': 'Only employees can submit expenses'}, 
+            status=status.HTTP_403_FORBIDDEN
+        )
+    
+    items = request.data.get('expenses') if isinstance(request.data, dict) else request.data
+    if not isinstance(items, list) or not items:
+        return Response({
+            'success': False,
+            'error': 'Expected a non-empty list of expenses'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    if len(items) > settings.BULK_EXPENSE_MAX_ITEMS:
+        return Response({
+            'success': False,
+            'error': f'At most {settings.BULK_EXPENSE_MAX_ITEMS} expenses per request'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    # One query for every item's category rather than one per item
+    category_ids = {
+        str(item.get('category')) for item in items if isinstance(item, dict)
+    }
+    categories = ExpenseCategory.objects.in_bulk([pk for pk in category_ids if pk.isdigit()])
+    serializer = ExpenseCreateSerializer(data=items, many=True, context={
+        'prefetched': {ExpenseCategory: {str(pk): category for pk, category in categories.items()}}
+    })
+    if not serializer.is_valid():
+        # Newer DRF reports list errors keyed by index, older as a full list
+        item_errors = serializer.errors
+        if not isinstance(item_errors, dict):
+            item_errors = dict(enumerate(item_errors))
+        return Response({
+            'success': False,
+            'errors': [
+                {'index': index, 'errors': errors}
+                for index, errors in item_errors.items()
+                if errors
+            ]
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    company = get_user_company(user)
+    now = timezone.now()
+    
+    with transaction.atomic():
+        approval_flow = get_default_approval_flow(company)
+        steps = list(approval_flow.steps.all().order_by('step_order'))
+        
+        expenses = []
+        for item in serializer.validated_data:
+            expenses.append(Expense(
+                **item,
+                employee=user,
+                company=company,
+                # Foreign amounts are converted by background jobs
+                converted_amount=item['amount'] if item['currency'] == company.currency else None,
+                approval_flow=approval_flow,
+                current_step=1,
+                submitted_at=now
+            ))
+        
+        # Every expense has the same employee and company, so each step
+        # resolves to the same approver for the whole batch
+        step_approvers = [
+            (step, get_approver_for_step(expenses[0], step)) for step in steps
+        ]
+        step_approvers = [(step, approver) for step, approver in step_approvers if approver]
+        first_approver = next(
+            (approver for step, approver in step_approvers if step.step_order == 1), None
+        )
+        
+        for expense in expenses:
+            expense.current_approver = first_approver
+            expense.status = 'pending_approval' if first_approver else 'approved'
+        
+        Expense.objects.bulk_create(expenses)
+        # bulk_create skips save() and post_save, so log the changes and
+        # count the expenses in the rollups directly
+        record_expense_changes(expenses)
+        ExpenseRollup.record([], [expense.rollup_values() for expense in expenses])
+        ExpenseApproval.objects.bulk_create([
+            ExpenseApproval(
+                expense=expense,
+                approver=approver,
+                step_order=step.step_order,
+                approver_type=step.approver_type,
+                status='pending'
+            )
+            for expense in expenses
+            for step, approver in step_approvers
+        ])
+        # Conversion, thumbnails and approver notifications, as for single submissions
+        enqueue_submission_jobs(expenses)
+    
+    return Response({
+        'success': True,
+        'data': [
+            {
+                'index': index,
+                'id': str(expense.id),
+                'status': expense.status,
+                'converted_amount': None if expense.converted_amount is None else str(expense.converted_amount),
+            }
+            for index, expense in enumerate(expenses)
+        ]
+    }, status=status.HTTP_201_CREATED)
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+@read_replica
 def pending_approvals(request):
     user = request.user
     
@@ -255,35 +517,30 @@ def pending_approvals(request):
         )
     
     try:
-        if user.role == 'admin':
-            # ADMIN sees ALL pending expenses regardless of current approver
-            company = get_user_company(user)
-            expenses = Expense.objects.filter(
-                company=company,
-                status='pending_approval'
-            ).order_by('-created_at')
-            
-            print(f"Admin pending approvals: Found {expenses.count()} expenses")
+        expenses = pending_expenses(user)
+        
+        if user.role == 'admin' and row_logger.isEnabledFor(logging.DEBUG):
+            # Only foreign key ids, so logging never adds queries
             for exp in expenses:
-                print(f"  - {exp.employee.email}: ${exp.amount} (Current approver: {exp.current_approver.email if exp.current_approver else 'None'})")
-        
-        elif user.role == 'manager':
-            # MANAGER sees only expenses where they are current approver
-            expenses = Expense.objects.filter(
-                current_approver=user,
-                status='pending_approval'
-            ).order_by('-created_at')
-            
-            print(f"Manager pending approvals: Found {expenses.count()} expenses for {user.email}")
+                row_logger.debug('Pending expense', extra={
+                    'expense_id': str(exp.id),
+                    'employee_id': exp.employee_id,
+                    'amount': str(exp.amount),
+                    'current_approver_id': exp.current_approver_id,
+                })
         
-        serializer = ExpenseSerializer(expenses, many=True)
+        context = expense_context(request)
+        data = render_expense_list(expenses, context)
+        logger.debug('Pending approvals listed', extra={
+            'user_id': user.id, 'role': user.role, 'count': len(data)
+        })
         return Response({
             'success': True,
-            'data': serializer.data
+            'data': data
         })
         
     except Exception as e:
-        print(f"Error in pending_approvals: {str(e)}")
+        logger.exception('Error in pending_approvals', extra={'user_id': user.id})
         return Response({
             'success': False,
             'error': 'Failed to fetch pending approvals'
@@ -292,85 +549,105 @@ def pending_approvals(request):
 
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
+@idempotent
 def approve_reject_expense(request, expense_id):
     user = request.user
     
     try:
         expense = get_object_or_404(Expense, id=expense_id)
         
-        # Check if user can approve this expense
-        current_approval = ExpenseApproval.objects.filter(
-            expense=expense,
-            approver=user,
-            status='pending'
-        ).first()
+        with transaction.atomic():
         
-        if not current_approval:
-            return Response(
-                {'success': False, 'error': 'You are not authorized to approve this expense'}, 
-                status=status.HTTP_403_FORBIDDEN
+            # Check if user can approve this expense. Concurrent requests for
+            # the same approval skip the locked row instead of queueing on it.
+            pending_approvals_qs = ExpenseApproval.objects.filter(
+                expense=expense,
+                approver=user,
+                status='pending'
             )
+            current_approval = select_for_update_skip_locked(pending_approvals_qs).first()
         
-        action = request.data.get('action')  # 'approve' or 'reject'
-        comment = request.data.get('comment', '')
+            if not current_approval:
+                if pending_approvals_qs.exists():
+                    return Response(
+                        {'success': False, 'error': 'This approval is already being processed'}, 
+                        status=status.HTTP_409_CONFLICT
+                    )
+                return Response(
+                    {'success': False, 'error': 'You are not authorized to approve this expense'}, 
+                    status=status.HTTP_403_FORBIDDEN
+                )
         
-        if action not in ['approve', 'reject']:
-            return Response(
-                {'success': False, 'error': 'Invalid action'}, 
-                status=status.HTTP_400_BAD_REQUEST
-            )
+            action = request.data.get('action')  # 'approve' or 'reject'
+            comment = request.data.get('comment', '')
+        
+            if action not in ['approve', 'reject']:
+                return Response(
+                    {'success': False, 'error': 'Invalid action'}, 
+                    status=status.HTTP_400_BAD_REQUEST
+                )
         
-        # Update the current approval
-        current_approval.status = 'approved' if action == 'approve' else 'rejected'
-        current_approval.comments = comment
-        current_approval.approved_at = timezone.now()
-        current_approval.save()
+            # Update the current approval
+            current_approval.status = 'approved' if action == 'approve' else 'rejected'
+            current_approval.comments = comment
+            current_approval.approved_at = timezone.now()
+            current_approval.save()
         
-        if action == 'approve':
-            # Check approval rules
-            approval_result = check_approval_rules(expense)
+            if action == 'approve':
+                # Check approval rules
+                approval_result = check_approval_rules(expense)
             
-            if approval_result['approved']:
-                # Expense fully approved
-                expense.status = 'approved'
-                expense.current_approver = None
-                expense.save()
-                print(f"Expense {expense.id} fully approved by rules")
-            else:
-                # Move to next step in sequence
-                next_approval = ExpenseApproval.objects.filter(
-                    expense=expense,
-                    step_order__gt=current_approval.step_order,
-                    status='pending'
-                ).order_by('step_order').first()
-                
-                if next_approval:
-                    # Move to next approver
-                    expense.current_approver = next_approval.approver
-                    expense.current_step = next_approval.step_order
-                    expense.save()
-                    print(f"Expense {expense.id} moved to step {next_approval.step_order}, approver: {next_approval.approver.email}")
-                else:
-                    # All steps complete
+                if approval_result['approved']:
+                    # Expense fully approved
                     expense.status = 'approved'
                     expense.current_approver = None
                     expense.save()
-                    print(f"Expense {expense.id} fully approved - all steps complete")
-        else:
-            # Rejected - stop workflow
-            expense.status = 'rejected'
-            expense.current_approver = None
-            expense.save()
-            print(f"Expense {expense.id} rejected by {user.email}")
+                    logger.info('Expense fully approved by rules', extra={
+                        'expense_id': str(expense.id), 'reason': approval_result.get('reason')
+                    })
+                else:
+                    # Move to next step in sequence
+                    next_approval = ExpenseApproval.objects.filter(
+                        expense=expense,
+                        step_order__gt=current_approval.step_order,
+                        status='pending'
+                    ).order_by('step_order').first()
+                
+                    if next_approval:
+                        # Move to next approver
+                        expense.current_approver = next_approval.approver
+                        expense.current_step = next_approval.step_order
+                        expense.save()
+                        logger.info('Expense moved to next step', extra={
+                            'expense_id': str(expense.id),
+                            'step': next_approval.step_order,
+                            'approver_id': next_approval.approver_id,
+                        })
+                    else:
+                        # All steps complete
+                        expense.status = 'approved'
+                        expense.current_approver = None
+                        expense.save()
+                        logger.info('Expense fully approved, all steps complete', extra={
+                            'expense_id': str(expense.id)
+                        })
+            else:
+                # Rejected - stop workflow
+                expense.status = 'rejected'
+                expense.current_approver = None
+                expense.save()
+                logger.info('Expense rejected', extra={
+                    'expense_id': str(expense.id), 'approver_id': user.id
+                })
         
-        return Response({
-            'success': True,
-            'message': f'Expense {action}d successfully',
-            'data': ExpenseSerializer(expense).data
-        })
+            return Response({
+                'success': True,
+                'message': f'Expense {action}d successfully',
+                'data': ExpenseSerializer(expense).data
+            })
         
     except Exception as e:
-        print(f"Error in approve_reject_expense: {str(e)}")
+        logger.exception('Error in approve_reject_expense', extra={'expense_id': str(expense_id)})
         return Response({
             'success': False,
             'error': 'Failed to process expense approval'
@@ -378,9 +655,10 @@ def approve_reject_expense(request, expense_id):
 
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
+@limit_concurrency
+@read_replica
 def admin_stats(request):
     user = request.user
-    print(f"Admin stats requested by: {user.email}, role: {user.role}")
     
     if user.role != 'admin':
         return Response(
@@ -389,44 +667,13 @@ def admin_stats(request):
         )
     
     try:
-        # Get ALL expenses for admin stats (regardless of company for now)
-        expenses = Expense.objects.all()
-        print(f"Total expenses in database: {expenses.count()}")
-        
-        if expenses.count() == 0:
-            # No expenses exist, return zeros
-            stats_data = {
-                'total_expenses': 0,
-                'pending_count': 0,
-                'approved_count': 0,
-                'rejected_count': 0,
-                'approved_amount': 0.0,
-                'pending_amount': 0.0,
-                'rejected_amount': 0.0
-            }
-        else:
-            # Calculate stats from all expenses
-            total_expenses = expenses.count()
-            pending_count = expenses.filter(status='pending_approval').count()
-            approved_count = expenses.filter(status='approved').count()
-            rejected_count = expenses.filter(status='rejected').count()
-            
-            # Calculate amounts
-            approved_amount = sum(float(e.converted_amount or e.amount or 0) for e in expenses.filter(status='approved'))
-            pending_amount = sum(float(e.converted_amount or e.amount or 0) for e in expenses.filter(status='pending_approval'))
-            rejected_amount = sum(float(e.converted_amount or e.amount or 0) for e in expenses.filter(status='rejected'))
-            
-            stats_data = {
-                'total_expenses': total_expenses,
-                'pending_count': pending_count,
-                'approved_count': approved_count,
-                'rejected_count': rejected_count,
-                'approved_amount': approved_amount,
-                'pending_amount': pending_amount,
-                'rejected_amount': rejected_amount
-            }
+        # Get ALL expenses for admin stats (regardless of company for now),
+        # settled ones included even after they move to the archive
+        totals = status_totals(lambda model: model.objects.all())
         
-        print(f"Calculated stats: {stats_data}")
+        stats_data = stats_from_totals(totals)
+        
+        logger.debug('Calculated admin stats', extra={'user_id': user.id, 'stats': stats_data})
         
         return Response({
             'success': True,
@@ -434,17 +681,97 @@ def admin_stats(request):
         })
         
     except Exception as e:
-        print(f"Error in admin_stats: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception('Error in admin_stats')
         return Response({
             'success': False,
             'error': 'Failed to fetch admin statistics'
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+@limit_concurrency
+@read_replica
+def admin_stats_series(request):
+    """Spend over time for the admin's company, read from the rollups.
+    
+    ?interval=month|quarter|year, ?group_by=status|category|employee,
+    ?status=approved,paid and ?from=/?to= (see report_filters).
+    """
+    user = request.user
+    
+    if user.role != 'admin':
+        return Response(
+            {'success': False, 'error': 'Only admins can view statistics'}, 
+            status=status.HTTP_403_FORBIDDEN
+        )
+    
+    interval = request.query_params.get('interval', 'month')
+    group_by = request.query_params.get('group_by') or None
+    if interval not in INTERVALS or (group_by and group_by not in GROUPS):
+        return Response({
+            'success': False,
+            'error': f"interval must be one of {', '.join(INTERVALS)} and group_by one of {', '.join(GROUPS)}"
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        start, end, statuses = report_filters(request)
+    except ValueError as e:
+        return Response({'success': False, 'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    company = get_user_company(user)
+    return Response({
+        'success': True,
+        'data': {
+            'interval': interval,
+            'group_by': group_by,
+            'currency': company.currency,
+            'series': rollup_series(company, interval, group_by, statuses, start, end),
+        }
+    })
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+@limit_concurrency
+@read_replica
+def expense_report(request, name):
+    """One of the finance reports in api.reports for the admin's company.
+    
+    Takes ?from=, ?to= and ?status= like the stats series.
+    """
+    user = request.user
+    
+    if user.role != 'admin':
+        return Response(
+            {'success': False, 'error': 'Only admins can view reports'}, 
+            status=status.HTTP_403_FORBIDDEN
+        )
+    
+    if name not in REPORTS:
+        return Response({
+            'success': False,
+            'error': f"Unknown report; available: {', '.join(sorted(REPORTS))}"
+        }, status=status.HTTP_404_NOT_FOUND)
+    
+    try:
+        start, end, statuses = report_filters(request)
+    except ValueError as e:
+        return Response({'success': False, 'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    company = get_user_company(user)
+    return Response({
+        'success': True,
+        'data': {
+            'report': name,
+            'currency': company.currency,
+            **run_report(name, company, start, end, statuses),
+        }
+    })
+
 @api_view(['GET', 'POST'])
 @permission_classes([permissions.IsAuthenticated])
+@limit_concurrency
+@read_replica
 def user_management(request):
     if request.method == 'GET':
         try:
@@ -452,9 +779,11 @@ def user_management(request):
             # This fixes the company filtering issue
             users = User.objects.all()
             
-            print(f"Found {users.count()} total users")
-            for user in users:
-                print(f"User: {user.email}, Role: {user.role}, Company: {user.company_name}")
+            if row_logger.isEnabledFor(logging.DEBUG):
+                for user in users:
+                    row_logger.debug('User listed', extra={
+                        'listed_user_id': user.id, 'role': user.role, 'company': user.company_name
+                    })
             
             serializer = UserManagementSerializer(users, many=True)
             
@@ -464,7 +793,7 @@ def user_management(request):
             })
             
         except Exception as e:
-            print(f"Error in user_management: {str(e)}")
+            logger.exception('Error in user_management')
             return Response({
                 'success': False,
                 'error': 'Failed to fetch users'
@@ -502,7 +831,7 @@ def user_management(request):
             }, status=status.HTTP_201_CREATED)
             
         except Exception as e:
-            print(f"Error creating user: {str(e)}")
+            logger.exception('Error creating user')
             return Response({
                 'success': False,
                 'error': str(e)
@@ -564,6 +893,8 @@ def delete_user(request, user_id):
 
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
+@cache_per_user
+@read_replica
 def expense_categories(request):
     company = get_user_company(request.user)
     categories = ExpenseCategory.objects.filter(company=company, is_active=True)
@@ -573,8 +904,56 @@ def expense_categories(request):
         'data': serializer.data
     })
 
+class EchoBuffer:
+    """File-like object that hands each written CSV row straight back"""
+    def write(self, value):
+        return value
+
+EXPORT_COLUMNS = [
+    'id', 'employee__email', 'amount', 'currency', 'converted_amount',
+    'category__name', 'description', 'expense_date', 'status',
+    'submitted_at', 'created_at',
+]
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+@limit_concurrency
+@read_replica
+def export_expenses(request):
+    user = request.user
+    try:
+        filters = ExpenseFilters(request.query_params)
+    except ValueError as e:
+        return Response({'success': False, 'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    def export_rows(model):
+        expenses = filters.apply(get_visible_expenses(user, model))
+        return expenses.order_by().values_list(*EXPORT_COLUMNS)
+    
+    # Settled expenses moved to the archive are still part of the export
+    rows = with_archive(export_rows)
+    # The rows stream after the view returns, when @read_replica no longer
+    # applies, so bind them to the database the router picks now
+    using = rows.db
+    rows = rows.using(using)
+    writer = csv.writer(EchoBuffer())
+    
+    def stream():
+        yield writer.writerow(EXPORT_COLUMNS)
+        # iterator() uses a server-side cursor on PostgreSQL; the transaction
+        # keeps that cursor alive when connections go through PgBouncer
+        with transaction.atomic(using=using):
+            for row in rows.iterator(chunk_size=settings.EXPORT_CHUNK_SIZE):
+                yield writer.writerow(row)
+    
+    response = StreamingHttpResponse(stream(), content_type='text/csv')
+    response['Content-Disposition'] = 'attachment; filename="expenses.csv"'
+    return response
+
 @api_view(['GET', 'POST'])
 @permission_classes([permissions.IsAuthenticated])
+@cache_per_user
+@read_replica
 def approval_rules(request):
     if request.user.role != 'admin':
         return Response(
@@ -609,7 +988,142 @@ def approval_rules(request):
             'errors': serializer.errors
         }, status=status.HTTP_400_BAD_REQUEST)
 
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+@limit_concurrency
+@read_replica
+def bootstrap(request):
+    """Everything the role's home screen needs, so first paint takes one request.
+    
+    Every role gets its profile, company and active categories, stats over
+    the expenses it can see and the most recent of them (?recent=, see
+    BOOTSTRAP_RECENT_EXPENSES); managers and admins also get their pending
+    approvals, and admins the company's users. The company is resolved
+    once for all of it, and expense lists take the usual ?compact=,
+    ?fields= and ?expand=.
+    """
+    user = request.user
+    
+    try:
+        recent = int(request.GET.get('recent', settings.BOOTSTRAP_RECENT_EXPENSES))
+    except ValueError:
+        recent = -1
+    if not 0 <= recent <= ExpensePagination.max_page_size:
+        return Response({
+            'success': False,
+            'error': f'recent must be a number from 0 to {ExpensePagination.max_page_size}'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        company = get_user_company(user)
+        context = expense_context(request)
+        categories = ExpenseCategory.objects.filter(company=company, is_active=True)
+        totals = status_totals(lambda model: get_visible_expenses(user, model, company))
+        recent_expenses = get_visible_expenses(user, company=company).order_by('-created_at')[:recent]
+        
+        data = {
+            'user': UserProfileSerializer(user).data,
+            'company': {'id': company.id, 'name': company.name, 'currency': company.currency},
+            'categories': ExpenseCategorySerializer(categories, many=True).data,
+            'stats': stats_from_totals(totals),
+            'recent_expenses': render_expense_list(recent_expenses, context),
+        }
+        if user.role in ['manager', 'admin']:
+            data['pending_approvals'] = render_expense_list(pending_expenses(user, company), context)
+        if user.role == 'admin':
+            users = User.objects.filter(company_name=company.name).order_by('id')
+            data['users'] = UserManagementSerializer(users, many=True).data
+        
+        return Response({
+            'success': True,
+            'data': data
+        })
+        
+    except Exception as e:
+        logger.exception('Error in bootstrap', extra={'user_id': user.id})
+        return Response({
+            'success': False,
+            'error': 'Failed to load startup data'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+@idempotent
+def batch(request):
+    """Run several API requests in one round trip (see api.batch).
+    
+    Takes {"requests": [{"method", "path", "body"}, ...], "atomic": false}
+    (or just the list) and answers with one {"status", "body"} per
+    sub-request, in order. With "atomic": true the first failure rolls
+    back the whole batch and the response says which one it was.
+    """
+    payload = request.data
+    if isinstance(payload, list):
+        payload = {'requests': payload}
+    
+    try:
+        subrequests = parse_subrequests(payload.get('requests'))
+    except (AttributeError, ValueError) as e:
+        return Response({
+            'success': False,
+            'error': str(e) if isinstance(e, ValueError) else 'Expected an object or a list of requests'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    atomic = payload.get('atomic') in (True, 'true', '1', 1)
+    responses, failed = run_batch(request, subrequests, atomic=atomic)
+    
+    if failed is not None:
+        failed_status = responses[failed]['status']
+        return Response({
+            'success': False,
+            'error': f'Request {failed} failed with status {failed_status}; no changes were made',
+            'failed_index': failed,
+            'data': responses
+        }, status=status.HTTP_400_BAD_REQUEST if failed_status < 500 else status.HTTP_500_INTERNAL_SERVER_ERROR)
+    
+    return Response({
+        'success': True,
+        'data': responses
+    })
+
 # Helper Functions
+EXCHANGE_RATE_API_URL = 'https://api.exchangerate-api.com/v4/latest/{}'
+
+def expense_context(request):
+    """ExpenseSerializer context for list responses (see FieldSelectionMixin).
+    
+    ?compact=1 drops the nested details and numeric copies, ?fields=a,b keeps
+    only the named fields and ?expand=employee,approvals.approver embeds only
+    the named relations.
+    """
+    def name_set(param):
+        value = request.GET.get(param)
+        if value is None:
+            return None
+        return {name.strip() for name in value.split(',') if name.strip()}
+    
+    expand = name_set('expand')
+    if expand is not None:
+        # approvals.approver implies approvals
+        expand |= {name.split('.')[0] for name in expand}
+    
+    return {
+        'compact': request.GET.get('compact') in ('1', 'true'),
+        'fields': name_set('fields'),
+        'expand': expand,
+    }
+
+def report_filters(request):
+    """(start, end, statuses) from ?from=, ?to= and ?status=a,b.
+    
+    Dates are YYYY-MM-DD or YYYY-MM; a month covers all of its days.
+    Raises ValueError with a message for the client.
+    """
+    start = parse_date_param(request.query_params, 'from')
+    end = parse_date_param(request.query_params, 'to', end=True)
+    statuses = [name for name in request.query_params.get('status', '').split(',') if name]
+    return start, end, statuses
+
 def get_or_create_company(user):
     """Create company on first signup if admin role"""
     company, created = Company.objects.get_or_create(
@@ -629,8 +1143,67 @@ def get_or_create_company(user):
     
     return company
 
+def get_visible_expenses(user, model=Expense, company=None):
+    """Expenses the user may see: whole company for admins, own plus
+    managed employees' for managers, own for employees.
+    
+    Pass model=ArchivedExpense to apply the same rules to the archive, and
+    company when the caller has already resolved the user's company.
+    """
+    if user.role == 'admin':
+        company = company or get_user_company(user)
+        return model.objects.filter(company=company)
+    elif user.role == 'manager':
+        # Get expenses from managed employees + own expenses
+        managed_employees = ManagerEmployee.objects.filter(
+            manager=user, is_active=True
+        ).values_list('employee_id', flat=True)
+        return model.objects.filter(
+            Q(employee=user) | Q(employee_id__in=managed_employees)
+        )
+    # employee
+    return model.objects.filter(employee=user)
+
+def pending_expenses(user, company=None):
+    """Expenses awaiting the user's decision, newest first: the whole
+    company's for admins, those the manager is the current approver of
+    """
+    if user.role == 'admin':
+        # ADMIN sees ALL pending expenses regardless of current approver
+        company = company or get_user_company(user)
+        expenses = Expense.objects.filter(company=company, status='pending_approval')
+    else:
+        # MANAGER sees only expenses where they are current approver
+        expenses = Expense.objects.filter(current_approver=user, status='pending_approval')
+    return expenses.order_by('-created_at')
+
+def stats_from_totals(totals):
+    """Dashboard counts and amounts from archive.status_totals()"""
+    def count_for(expense_status):
+        return totals.get(expense_status, (0, 0))[0]
+    
+    def amount_for(expense_status):
+        return float(totals.get(expense_status, (0, 0))[1])
+    
+    return {
+        'total_expenses': sum(count for count, amount in totals.values()),
+        'pending_count': count_for('pending_approval'),
+        'approved_count': count_for('approved'),
+        'rejected_count': count_for('rejected'),
+        'approved_amount': amount_for('approved'),
+        'pending_amount': amount_for('pending_approval'),
+        'rejected_amount': amount_for('rejected')
+    }
+
 def get_user_company(user):
     """Get or create company for user - Fixed version"""
+    # Tokens claim the company's id; it still has to carry the user's company name
+    company_id = getattr(user, 'claimed_company_id', None)
+    if company_id and user.company_name:
+        company = Company.objects.filter(pk=company_id, name=user.company_name).first()
+        if company:
+            return company
+    
     # First try to find existing company by exact name match
     if user.company_name:
         company = Company.objects.filter(name=user.company_name).first()
@@ -641,8 +1214,7 @@ def get_user_company(user):
     company_with_data = Company.objects.filter(expenses__isnull=False).first()
     if company_with_data:
         # Update user to match existing company
-        user.company_name = company_with_data.name
-        user.save()
+        _set_company_name(user, company_with_data.name)
         return company_with_data
     
     # If no companies exist, create one
@@ -652,111 +1224,152 @@ def get_user_company(user):
     )
     
     # Update user to match company name
-    user.company_name = company.name
-    user.save()
+    _set_company_name(user, company.name)
     
     return company
 
 
+def _set_company_name(user, name):
+    """Save only the user's company name; a claims-built user's other
+    fields may come from a cached row, which a full save would write back
+    """
+    user.company_name = name
+    User.objects.filter(pk=user.pk).update(company_name=name, updated_at=timezone.now())
+    # update() sends no post_save, which drops the user's claims snapshot
+    forget_user(user.pk)
+    transaction.on_commit(lambda: forget_user(user.pk))
+
+
 def convert_currency(amount, from_currency, to_currency):
     if from_currency == to_currency:
         return amount
     
+    rates = fetch_exchange_rates(from_currency)
     try:
-        response = requests.get(
-            f'https://api.exchangerate-api.com/v4/latest/{from_currency}',
-            timeout=5
-        )
-        data = response.json()
-        rate = data['rates'][to_currency]
+        rate = rates[to_currency]
         return Decimal(str(amount)) * Decimal(str(rate))
     except:
         return amount
 
-def create_approval_workflow(expense):
-    """Create multi-level approval workflow based on company rules"""
+def fetch_exchange_rates(base_currency):
+    """Rates for one unit of base_currency, or None if the rate service fails"""
     try:
-        company = expense.company
-        
-        # Get active approval rule for company
-        approval_rule = ApprovalRule.objects.filter(
+        response = requests.get(
+            EXCHANGE_RATE_API_URL.format(base_currency),
+            timeout=5
+        )
+        return response.json()['rates']
+    except Exception:
+        return None
+
+def get_default_approval_flow(company):
+    """Active approval flow for the company, creating the default one if needed"""
+    # Get active approval rule for company
+    approval_rule = ApprovalRule.objects.filter(
+        company=company,
+        is_active=True
+    ).first()
+    
+    if not approval_rule:
+        # Create default rule
+        approval_rule = ApprovalRule.objects.create(
             company=company,
+            name='Default Sequential Flow',
+            rule_type='sequential',
+            is_manager_approver=True,
             is_active=True
-        ).first()
-        
-        if not approval_rule:
-            # Create default rule
-            approval_rule = ApprovalRule.objects.create(
-                company=company,
-                name='Default Sequential Flow',
-                rule_type='sequential',
-                is_manager_approver=True,
-                is_active=True
-            )
-        
-        # Get or create default approval flow
-        approval_flow, created = ApprovalFlow.objects.get_or_create(
-            company=company,
-            rule=approval_rule,
-            is_default=True,
-            defaults={
-                'name': 'Manager → Admin Flow',
-                'is_active': True
-            }
         )
+    
+    # Get or create default approval flow
+    approval_flow, created = ApprovalFlow.objects.get_or_create(
+        company=company,
+        rule=approval_rule,
+        is_default=True,
+        defaults={
+            'name': 'Manager → Admin Flow',
+            'is_active': True
+        }
+    )
+    
+    if created:
+        # Create default steps: Manager → Admin
+        ApprovalStep.objects.create(
+            approval_flow=approval_flow,
+            approver_type='manager',
+            step_order=1,
+            is_required=True
+        )
+        ApprovalStep.objects.create(
+            approval_flow=approval_flow,
+            approver_type='admin',
+            step_order=2,
+            is_required=True
+        )
+    
+    return approval_flow
+
+def create_approval_workflow(expense):
+    """Create multi-level approval workflow based on company rules.
+
+    Errors propagate, so the expense.start_workflow job is retried instead
+    of the expense being approved without review.
+    """
+    approval_flow = get_default_approval_flow(expense.company)
+    
+    # Assign flow to expense
+    expense.approval_flow = approval_flow
+    expense.current_step = 1
+    
+    # Create approval records
+    steps = approval_flow.steps.all().order_by('step_order')
+    
+    for step in steps:
+        approver = get_approver_for_step(expense, step)
         
-        if created:
-            # Create default steps: Manager → Admin
-            ApprovalStep.objects.create(
-                approval_flow=approval_flow,
-                approver_type='manager',
-                step_order=1,
-                is_required=True
+        if approver:
+            ExpenseApproval.objects.create(
+                expense=expense,
+                approver=approver,
+                step_order=step.step_order,
+                approver_type=step.approver_type,
+                status='pending'
             )
-            ApprovalStep.objects.create(
-                approval_flow=approval_flow,
-                approver_type='admin',
-                step_order=2,
-                is_required=True
-            )
-        
-        # Assign flow to expense
-        expense.approval_flow = approval_flow
-        expense.current_step = 1
-        
-        # Create approval records
-        steps = approval_flow.steps.all().order_by('step_order')
-        
-        for step in steps:
-            approver = get_approver_for_step(expense, step)
-            
-            if approver:
-                ExpenseApproval.objects.create(
-                    expense=expense,
-                    approver=approver,
-                    step_order=step.step_order,
-                    approver_type=step.approver_type,
-                    status='pending'
-                )
-        
-        # Set current approver to first step
-        first_approval = ExpenseApproval.objects.filter(
-            expense=expense,
-            step_order=1
-        ).first()
-        
-        if first_approval:
-            expense.current_approver = first_approval.approver
-            expense.status = 'pending_approval'
-        else:
-            expense.status = 'approved'
-        
-        expense.save()
-        
-    except Exception as e:
-        print(f"Error creating approval workflow: {str(e)}")
+    
+    # Set current approver to first step
+    first_approval = ExpenseApproval.objects.filter(
+        expense=expense,
+        step_order=1
+    ).first()
+    
+    if first_approval:
+        expense.current_approver = first_approval.approver
+        expense.status = 'pending_approval'
+    else:
         expense.status = 'approved'
-        expense.save()
+    
+    # Only the workflow columns, so background jobs updating other
+    # columns of the same expense are not overwritten
+    expense.save(update_fields=['approval_flow', 'current_step', 'current_approver', 'status', 'updated_at'])
+
+def enqueue_submission_jobs(expenses):
+    """Queue the work that follows submitting expenses, in one insert.
+
+    Expenses still 'submitted' get their workflow started by a job, which
+    then notifies the approver; those whose workflow was created already
+    (bulk submission) have their approver notified directly.
+    """
+    jobs = []
+    for expense in expenses:
+        payload = {'expense_id': str(expense.pk)}
+        if expense.converted_amount is None:
+            jobs.append(('expense.convert_currency', payload))
+        if expense.status == 'submitted':
+            jobs.append(('expense.start_workflow', payload))
+        elif expense.status == 'pending_approval' and expense.current_approver_id:
+            jobs.append(('expense.notify_approver', payload))
+        if expense.receipt_image:
+            jobs.append(('expense.receipt_thumbnail', payload))
+    enqueue_many(jobs)
 
 def get_approver_for_step(expense, step):
     """Get appropriate approver for a specific step"""
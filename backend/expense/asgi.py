@@ -2,6 +2,8 @@
 ASGI config for expense project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Run it under an ASGI server, e.g. ``uvicorn expense.asgi:application``, to
+serve the async routes in api/async_views.py as well as the sync ones.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
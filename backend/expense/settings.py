@@ -14,6 +14,9 @@ from pathlib import Path
 from datetime import timedelta
 import os
 
+from corsheaders.defaults import default_headers
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -47,14 +50,71 @@ INSTALLED_APPS = [
 # Custom User Model
 AUTH_USER_MODEL = 'accounts.User'
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+#
+# Holds read-replica pins, per-user responses (api.response_cache) and the
+# user snapshots claims authentication checks tokens against. Response
+# invalidation keys live in the cache too, so run more than one worker
+# process only with EXPENSE_CACHE_BACKEND=file or redis (which needs the
+# redis package and a server at EXPENSE_CACHE_URL).
+
+CACHE_BACKEND = os.environ.get('EXPENSE_CACHE_BACKEND', 'locmem')
+
+if CACHE_BACKEND == 'redis':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ.get('EXPENSE_CACHE_URL', 'redis://127.0.0.1:6379/0'),
+        }
+    }
+elif CACHE_BACKEND == 'file':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get('EXPENSE_CACHE_DIR', os.path.join(BASE_DIR, '.cache')),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'expense',
+        }
+    }
+
 # REST Framework Configuration
+# Authenticate from the JWT's user claims instead of loading the user on
+# every request (accounts.authentication). Claims are checked against user
+# snapshots kept in the cache for JWT_USER_CACHE_SECONDS, which every worker
+# must see, so this is off by default with the per-process cache and
+# refused if turned on with it.
+JWT_CLAIMS_AUTH = os.environ.get('EXPENSE_JWT_CLAIMS_AUTH', '0' if CACHE_BACKEND == 'locmem' else '1') == '1'
+JWT_USER_CACHE_SECONDS = 30
+
+if JWT_CLAIMS_AUTH and CACHE_BACKEND == 'locmem':
+    raise ImproperlyConfigured(
+        'EXPENSE_JWT_CLAIMS_AUTH needs a cache shared by all workers; '
+        'set EXPENSE_CACHE_BACKEND=file or turn claims authentication off'
+    )
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'accounts.authentication.ClaimsJWTAuthentication' if JWT_CLAIMS_AUTH
+        else 'rest_framework_simplejwt.authentication.JWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    # Cost-weighted rate limits (api.admission)
+    'DEFAULT_THROTTLE_CLASSES': [
+        'api.admission.CostThrottle',
+    ],
+    # Same output as DRF's JSONRenderer, encoded with orjson when installed
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
 }
 
 # JWT Configuration
@@ -79,6 +139,8 @@ SIMPLE_JWT = {
     
     'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
     'TOKEN_TYPE_CLAIM': 'token_type',
+    # Refreshed tokens get the user's current claims
+    'TOKEN_REFRESH_SERIALIZER': 'accounts.authentication.ClaimsTokenRefreshSerializer',
 }
 
 # CORS Configuration for React
@@ -88,12 +150,26 @@ CORS_ALLOWED_ORIGINS = [
 
 CORS_ALLOW_CREDENTIALS = True
 
+CORS_ALLOW_HEADERS = (
+    *default_headers,
+    'idempotency-key',
+    'x-primary-pin',
+)
+
+# Sent back by the frontend to keep reads on the primary after a write
+CORS_EXPOSE_HEADERS = [
+    'x-primary-pin',
+]
+
 MIDDLEWARE = [
+    'api.metrics.MetricsMiddleware',
+    'api.compression.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'api.db_router.PrimaryPinMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -122,12 +198,241 @@ WSGI_APPLICATION = 'expense.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
+#
+# SQLite is the default. Set EXPENSE_DB_ENGINE=postgres to run against
+# PostgreSQL; EXPENSE_DB_POOL then picks how connections are pooled:
+#   none      - persistent connections kept open for EXPENSE_DB_CONN_MAX_AGE
+#   pgbouncer - persistent connections to a PgBouncer (transaction pooling)
+#   psycopg   - psycopg 3 connection pool inside each worker process
+
+DB_ENGINE = os.environ.get('EXPENSE_DB_ENGINE', 'sqlite')
+
+if DB_ENGINE == 'postgres':
+    DB_POOL = os.environ.get('EXPENSE_DB_POOL', 'none')
+
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('EXPENSE_DB_NAME', 'expense'),
+            'USER': os.environ.get('EXPENSE_DB_USER', 'expense'),
+            'PASSWORD': os.environ.get('EXPENSE_DB_PASSWORD', ''),
+            'HOST': os.environ.get('EXPENSE_DB_HOST', 'localhost'),
+            'PORT': os.environ.get('EXPENSE_DB_PORT', '5432'),
+            'CONN_MAX_AGE': int(os.environ.get('EXPENSE_DB_CONN_MAX_AGE', '60')),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {},
+        }
+    }
 
-DATABASES = {
-    'default': {
+    if DB_POOL == 'psycopg':
+        # Django's built-in pool does not allow persistent connections
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.environ.get('EXPENSE_DB_POOL_MIN', '2')),
+            'max_size': int(os.environ.get('EXPENSE_DB_POOL_MAX', '10')),
+        }
+    elif DB_POOL == 'pgbouncer':
+        # Server-side cursors only live inside a transaction under
+        # transaction pooling, so exports wrap their iteration in atomic()
+        DATABASES['default']['PORT'] = os.environ.get('EXPENSE_DB_PORT', '6432')
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+        }
+    }
+
+# Read replica for read-heavy endpoints marked with @read_replica.
+# EXPENSE_DB_REPLICA_HOST points at a PostgreSQL standby; with SQLite,
+# EXPENSE_DB_REPLICA_NAME names a second database file.
+if DB_ENGINE == 'postgres' and os.environ.get('EXPENSE_DB_REPLICA_HOST'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'HOST': os.environ['EXPENSE_DB_REPLICA_HOST'],
+        'PORT': os.environ.get('EXPENSE_DB_REPLICA_PORT', DATABASES['default']['PORT']),
+        'OPTIONS': dict(DATABASES['default']['OPTIONS']),
+        'TEST': {'MIRROR': 'default'},
+    }
+elif DB_ENGINE != 'postgres' and os.environ.get('EXPENSE_DB_REPLICA_NAME'):
+    DATABASES['replica'] = {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': os.environ['EXPENSE_DB_REPLICA_NAME'],
+        'TEST': {'MIRROR': 'default'},
     }
+
+DATABASE_ROUTERS = ['api.db_router.ReplicaRouter']
+
+# Seconds a cached response (categories, profile, approval rules) is kept;
+# model signals invalidate it sooner when the underlying data changes
+RESPONSE_CACHE_TIMEOUT = int(os.environ.get('EXPENSE_RESPONSE_CACHE_TIMEOUT', '300'))
+
+# Check refresh tokens against an in-memory set of revoked ones
+# (accounts.revocation) instead of the blacklist table. Processes learn of
+# each other's blacklists through a counter in the cache, so this needs a
+# cache every worker shares and increments atomically: only redis is both
+TOKEN_REVOCATION_FILTER = CACHE_BACKEND == 'redis'
+# The accounts.purge_tokens job deletes expired outstanding and blacklisted
+# tokens this often, this many per batch
+TOKEN_PURGE_INTERVAL = timedelta(hours=1)
+TOKEN_PURGE_BATCH_SIZE = 1000
+
+# Admission control (api.admission). Rates are DRF style: a bucket of that
+# many tokens, refilled evenly over the period
+ADMISSION_CONTROL = os.environ.get('EXPENSE_ADMISSION_CONTROL', '1') == '1'
+# Cost units each user (or anonymous client address) may spend
+ADMISSION_USER_BUDGET = os.environ.get('EXPENSE_ADMISSION_USER_BUDGET', '600/min')
+# Cost of a GET by URL name; everything else costs 1
+ADMISSION_COSTS = {
+    'expense-export': 8,
+    'admin-stats': 4,
+    'expense-report': 4,
+    'user-management': 3,
+    'bootstrap': 3,
+    'expense-list-create': 2,
+    'expense-list-create-async': 2,
+    'expense-search': 2,
+    'admin-stats-series': 2,
+}
+# Per-user rates of single endpoints, on top of the budget
+ADMISSION_ENDPOINT_RATES = {
+    'admin-stats': '60/min',
+    'user-management': '60/min',
+    'expense-report': '60/min',
+    'expense-export': '10/min',
+}
+# login_user and register_user, per client address and per email
+ADMISSION_LOGIN_RATES = {
+    'address': '30/min',
+    'email': '10/min',
+}
+# Cost units of costly requests each worker process runs at once; a request
+# waits at most ADMISSION_QUEUE_TIMEOUT seconds for room before a 503
+ADMISSION_MAX_INFLIGHT = int(os.environ.get('EXPENSE_ADMISSION_MAX_INFLIGHT', '16'))
+ADMISSION_QUEUE_TIMEOUT = 0.5
+ADMISSION_RETRY_AFTER = 1
+
+# Seconds a computed report (api.reports) is kept; entries are keyed by the
+# company's latest expense change, so they never go stale before that
+REPORT_CACHE_TIMEOUT = int(os.environ.get('EXPENSE_REPORT_CACHE_TIMEOUT', '3600'))
+
+# Seconds a user's reads stay on the primary after they write
+# (api.db_router)
+REPLICA_PIN_SECONDS = int(os.environ.get('EXPENSE_REPLICA_PIN_SECONDS', '5'))
+
+# Rows fetched per round trip when streaming large result sets (exports)
+EXPORT_CHUNK_SIZE = 2000
+
+# Settled expenses older than this move to the archive tables
+# (python manage.py archive_expenses), one transaction per batch
+ARCHIVE_AFTER_DAYS = int(os.environ.get('EXPENSE_ARCHIVE_AFTER_DAYS', '180'))
+ARCHIVE_BATCH_SIZE = 500
+
+# Largest batch accepted by POST /api/v1/expenses/bulk/
+BULK_EXPENSE_MAX_ITEMS = 100
+
+# How long a stored Idempotency-Key response is replayed for retries
+IDEMPOTENCY_KEY_TTL = timedelta(hours=24)
+
+# Background jobs (api.jobs), run by python manage.py run_jobs. Submitted
+# expenses wait for the expense.start_workflow job before they reach an
+# approver, so deployments run at least one worker next to the web
+# processes. With EXPENSE_JOB_QUEUE_EAGER=1, the default in DEBUG, jobs run
+# in-process once the enqueuing transaction commits, so development needs
+# no worker; failed ones are retried by a worker later.
+JOB_QUEUE_EAGER = os.environ.get('EXPENSE_JOB_QUEUE_EAGER', '1' if DEBUG else '0') == '1'
+JOB_MAX_ATTEMPTS = 5
+# Retry n waits JOB_RETRY_BACKOFF * 2**(n-1) seconds, at most JOB_RETRY_BACKOFF_MAX
+JOB_RETRY_BACKOFF = 30
+JOB_RETRY_BACKOFF_MAX = 3600
+# A running job whose worker has not finished it by then is claimable again
+JOB_LOCK_TIMEOUT = timedelta(minutes=10)
+
+RECEIPT_THUMBNAIL_SIZE = (320, 320)
+
+# Approver notifications; the console backend just prints them
+EMAIL_BACKEND = os.environ.get('EXPENSE_EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+DEFAULT_FROM_EMAIL = os.environ.get('EXPENSE_FROM_EMAIL', 'expenses@localhost')
+
+# GET /api/v1/expenses/changes/ (api.changes): tokens only advance past
+# log rows this old, so longer-running write transactions are not skipped
+DELTA_SYNC_SETTLE_SECONDS = 5
+DELTA_SYNC_MAX_CHANGES = 500
+# Log rows older than this are purged (manage.py purge_expense_changes);
+# clients with older tokens get a full reload
+DELTA_SYNC_RETENTION = timedelta(days=30)
+
+# Render expense lists from .values() rows instead of ExpenseSerializer
+# (api.fast_render); the output is identical, see compare_expense_rendering
+FAST_EXPENSE_LISTS = os.environ.get('EXPENSE_FAST_LISTS', '1') == '1'
+
+# Recent expenses in GET /api/v1/bootstrap/ (?recent= overrides, up to the page size limit)
+BOOTSTRAP_RECENT_EXPENSES = 10
+
+# Most sub-requests one POST /api/v1/batch/ may carry (api.batch)
+BATCH_MAX_REQUESTS = 50
+
+# Responses at least this large are compressed (brotli when the client
+# accepts it and the brotli package is installed, otherwise gzip)
+COMPRESSION_MIN_BYTES = int(os.environ.get('EXPENSE_COMPRESSION_MIN_BYTES', '1024'))
+# Brotli's top levels are too slow for per-request compression
+BROTLI_QUALITY = 5
+
+# Prometheus metrics at /metrics/. Scrapers send EXPENSE_METRICS_TOKEN as a
+# bearer token (bearer_token in the Prometheus scrape config). Without a
+# token they are served only in DEBUG, to these client addresses; behind a
+# proxy every client has the proxy's address, so set a token there
+METRICS_TOKEN = os.environ.get('EXPENSE_METRICS_TOKEN', '')
+METRICS_ALLOWED_IPS = os.environ.get('EXPENSE_METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',')
+
+# Log queries slower than this many milliseconds with their view (off when unset)
+METRICS_SLOW_QUERY_MS = (
+    float(os.environ['EXPENSE_SLOW_QUERY_MS']) if os.environ.get('EXPENSE_SLOW_QUERY_MS') else None
+)
+
+
+# Logging
+# https://docs.djangoproject.com/en/5.2/topics/logging/
+#
+# Records are written as JSON lines from a background thread. Per-row
+# diagnostics go to the api.views.rows logger, which is off unless
+# EXPENSE_ROW_LOG_LEVEL=DEBUG and then keeps EXPENSE_ROW_LOG_SAMPLE of them.
+
+LOG_LEVEL = os.environ.get('EXPENSE_LOG_LEVEL', 'INFO')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'row_sample': {
+            '()': 'api.logging_utils.SampleFilter',
+            'rate': float(os.environ.get('EXPENSE_ROW_LOG_SAMPLE', '0.01')),
+        },
+    },
+    'handlers': {
+        'json_queue': {
+            'class': 'api.logging_utils.QueueJsonHandler',
+        },
+    },
+    'root': {
+        'handlers': ['json_queue'],
+        'level': 'WARNING',
+    },
+    'loggers': {
+        'django': {
+            'level': 'INFO',
+        },
+        'api': {
+            'level': LOG_LEVEL,
+        },
+        'api.views.rows': {
+            'level': os.environ.get('EXPENSE_ROW_LOG_LEVEL', 'WARNING'),
+            'filters': ['row_sample'],
+        },
+        'api.metrics': {
+            'level': 'INFO',
+        },
+    },
 }
 
 
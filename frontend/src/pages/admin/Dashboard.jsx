@@ -42,15 +42,17 @@ export const AdminDashboard = () => {
     try {
       console.log(' Loading admin dashboard data...');
       
-      // Load admin statistics
-      const statsResult = await expenseApi.getAdminStats();
-      console.log(' Admin stats result:', statsResult);
+      // Stats, pending approvals and recent expenses in one request
+      const result = await expenseApi.getBootstrap();
+      console.log(' Bootstrap result:', result);
       
-      if (statsResult.success) {
-        setStats(statsResult.data);
-        console.log(' Stats loaded:', statsResult.data);
+      if (result.success) {
+        setStats(result.data.stats);
+        setPendingExpenses(result.data.pending_approvals || []);
+        setRecentExpenses(result.data.recent_expenses || []);
+        console.log(' Dashboard data loaded:', result.data.stats);
       } else {
-        console.error(' Failed to load stats:', statsResult.error);
+        console.error(' Failed to load dashboard data:', result.error);
         setStats({
           total_expenses: 0,
           pending_count: 0,
@@ -60,30 +62,7 @@ export const AdminDashboard = () => {
           pending_amount: 0,
           rejected_amount: 0
         });
-      }
-
-      // Load pending approvals for admin (all levels)
-      const pendingResult = await expenseApi.getPendingApprovals();
-      console.log(' Pending approvals result:', pendingResult);
-      
-      if (pendingResult.success) {
-        setPendingExpenses(pendingResult.data || []);
-        console.log(' Pending expenses loaded:', pendingResult.data?.length || 0);
-      } else {
-        console.error(' Failed to load pending approvals:', pendingResult.error);
         setPendingExpenses([]);
-      }
-
-      // Load recent expenses
-      const expensesResult = await expenseApi.getAllExpenses();
-      console.log(' All expenses result:', expensesResult);
-      
-      if (expensesResult.success) {
-        const expenses = expensesResult.data || [];
-        setRecentExpenses(expenses.slice(0, 10));
-        console.log(' Recent expenses loaded:', expenses.length);
-      } else {
-        console.error(' Failed to load expenses:', expensesResult.error);
         setRecentExpenses([]);
       }
       
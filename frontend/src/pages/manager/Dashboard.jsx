@@ -35,6 +35,7 @@ export const ManagerDashboard = () => {
   const { user } = useAuth();
   const [pendingExpenses, setPendingExpenses] = useState([]);
   const [teamExpenses, setTeamExpenses] = useState([]);
+  const [teamCount, setTeamCount] = useState(0);
   const [stats, setStats] = useState({
     approved: 0,
     pending: 0,
@@ -56,92 +57,23 @@ export const ManagerDashboard = () => {
       console.log(' Manager Dashboard: Starting to load data...');
       console.log(' Current user:', user);
       
-      // Load pending approvals
-      console.log(' Fetching pending approvals...');
-      const pendingResult = await expenseApi.getPendingApprovals();
-      console.log(' Pending approvals response:', pendingResult);
+      // Pending approvals, recent team expenses and team totals in one request
+      console.log(' Fetching bootstrap data...');
+      const result = await expenseApi.getBootstrap();
+      console.log(' Bootstrap response:', result);
       
-      if (pendingResult.success) {
-        console.log(' Pending expenses data:', pendingResult.data);
-        setPendingExpenses(pendingResult.data || []);
-      } else {
-        console.error(' Failed to get pending approvals:', pendingResult.error);
-      }
-  
-      // Load all team expenses
-      console.log(' Fetching team expenses...');
-      const teamResult = await expenseApi.getAllExpenses();
-      console.log(' Team expenses response:', teamResult);
-      
-      if (teamResult.success) {
-        const expenses = teamResult.data || [];
-        console.log('Team expenses data:', expenses);
-        console.log(' Number of expenses:', expenses.length);
-        
-        // Log first expense structure for debugging
-        if (expenses.length > 0) {
-          console.log(' First expense structure:', expenses[0]);
-          console.log(' Amount fields:', {
-            amount: expenses[0].amount,
-            converted_amount: expenses[0].converted_amount,
-            currency: expenses[0].currency,
-            status: expenses[0].status
-          });
-        }
-        
-        setTeamExpenses(expenses);
-        
-        // Calculate stats with debugging
-        const approved = expenses.filter(exp => exp.status === 'approved');
-        const pending = expenses.filter(exp => exp.status === 'pending_approval' || exp.status === 'pending');
-        const rejected = expenses.filter(exp => exp.status === 'rejected');
-        
-        console.log(' Filtered expenses:', {
-          approved: approved.length,
-          pending: pending.length,
-          rejected: rejected.length
+      if (result.success) {
+        const { stats: totals, pending_approvals, recent_expenses } = result.data;
+        setPendingExpenses(pending_approvals || []);
+        setTeamExpenses(recent_expenses || []);
+        setTeamCount(totals.total_expenses);
+        setStats({
+          approved: totals.approved_amount,
+          pending: totals.pending_amount,
+          rejected: totals.rejected_amount
         });
-        
-        // Safe calculation with detailed logging
-        const safeCalculateTotal = (expenseList, type) => {
-          console.log(` Calculating ${type} total for ${expenseList.length} expenses`);
-          let total = 0;
-          
-          expenseList.forEach((exp, index) => {
-            let amount = 0;
-            
-            if (exp.converted_amount !== null && exp.converted_amount !== undefined) {
-              amount = parseFloat(exp.converted_amount);
-              console.log(`${type}[${index}]: Using converted_amount = ${amount}`);
-            } else if (exp.amount !== null && exp.amount !== undefined) {
-              amount = parseFloat(exp.amount);
-              console.log(`${type}[${index}]: Using amount = ${amount}`);
-            } else {
-              console.log(`${type}[${index}]: No valid amount found`, exp);
-            }
-            
-            if (!isNaN(amount) && isFinite(amount)) {
-              total += amount;
-            } else {
-              console.warn(`${type}[${index}]: Invalid amount (${amount}) for expense:`, exp.id);
-            }
-          });
-          
-          console.log(` ${type} total calculated: ${total}`);
-          return total;
-        };
-        
-        const newStats = {
-          approved: safeCalculateTotal(approved, 'APPROVED'),
-          pending: safeCalculateTotal(pending, 'PENDING'),
-          rejected: safeCalculateTotal(rejected, 'REJECTED')
-        };
-        
-        console.log(' Final calculated stats:', newStats);
-        setStats(newStats);
-        
       } else {
-        console.error(' Failed to get team expenses:', teamResult.error);
+        console.error(' Failed to get dashboard data:', result.error);
         setStats({ approved: 0, pending: 0, rejected: 0 });
       }
       
@@ -442,7 +374,7 @@ export const ManagerDashboard = () => {
             <CardHeader>
               <CardTitle className="flex items-center gap-2">
                 <Users className="w-5 h-5 text-primary" />
-                Team Expenses ({teamExpenses.length})
+                Team Expenses ({teamCount})
               </CardTitle>
             </CardHeader>
             <CardContent>
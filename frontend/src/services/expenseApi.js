@@ -11,6 +11,10 @@ const api = axios.create({
   },
 });
 
+// Signed pin the backend returns after a write; sending it back keeps our
+// reads on the primary database until they can see that write
+let primaryPin = null;
+
 // Add authentication token to requests
 api.interceptors.request.use(
   (config) => {
@@ -18,6 +22,9 @@ api.interceptors.request.use(
     if (token) {
       config.headers.Authorization = `Bearer ${token}`;
     }
+    if (primaryPin) {
+      config.headers['X-Primary-Pin'] = primaryPin;
+    }
     return config;
   },
   (error) => {
@@ -27,7 +34,12 @@ api.interceptors.request.use(
 
 // Handle token refresh on 401 errors
 api.interceptors.response.use(
-  (response) => response,
+  (response) => {
+    if (response.headers['x-primary-pin']) {
+      primaryPin = response.headers['x-primary-pin'];
+    }
+    return response;
+  },
   async (error) => {
     const originalRequest = error.config;
     
@@ -62,6 +74,9 @@ api.interceptors.response.use(
 
 export const expenseApi = {
   // Get all expenses (filtered by user role - admin sees all, manager sees team, employee sees own)
+  // filters: status, category, employee, currency (values or arrays), date_from,
+  // date_to, min_amount, max_amount, page, page_size, and facets: true for the
+  // per status/category/employee counts
   getAllExpenses: async (filters = {}) => {
     try {
       console.log('API: Getting all expenses with filters:', filters);
@@ -79,7 +94,9 @@ export const expenseApi = {
       
       return { 
         success: true, 
-        data: response.data.results || response.data.data || response.data 
+        data: response.data.results || response.data.data || response.data,
+        facets: response.data.facets,
+        count: response.data.count
       };
     } catch (error) {
       console.error('API: Get all expenses error:', error.response?.data || error);
@@ -110,6 +127,54 @@ export const expenseApi = {
     }
   },
 
+  // Get expenses changed since the last sync. Pass the `next` token from the
+  // previous call; without one (or when `reset` comes back true) `changed`
+  // holds the full list. Drop the ids listed in `removed`.
+  getExpenseChanges: async (since = null) => {
+    try {
+      const params = new URLSearchParams();
+      if (since) {
+        params.append('since', since);
+      }
+      
+      const response = await api.get(`/expenses/changes/?${params}`);
+      
+      return { 
+        success: true, 
+        data: response.data.data 
+      };
+    } catch (error) {
+      console.error('API: Get expense changes error:', error.response?.data || error);
+      return {
+        success: false,
+        error: error.response?.data?.error || 'Failed to fetch expense changes'
+      };
+    }
+  },
+
+  // Search the descriptions of the expenses the user can see; best matches
+  // first, `count`, `next` and `previous` describe the pages
+  searchExpenses: async (query, page = 1) => {
+    try {
+      const params = new URLSearchParams({ q: query, page });
+      const response = await api.get(`/expenses/search/?${params}`);
+      
+      return { 
+        success: true, 
+        data: response.data.data,
+        count: response.data.count,
+        next: response.data.next,
+        previous: response.data.previous
+      };
+    } catch (error) {
+      console.error('API: Search expenses error:', error.response?.data || error);
+      return {
+        success: false,
+        error: error.response?.data?.error || 'Failed to search expenses'
+      };
+    }
+  },
+
   // Get expenses pending approval for current manager
   getPendingApprovals: async () => {
     try {
@@ -233,6 +298,27 @@ export const expenseApi = {
   },
 
   // Get admin statistics - FIXED METHOD
+  // Everything the role's home screen needs in one request: user, company,
+  // categories, stats, recent_expenses, (managers, admins) pending_approvals
+  // and (admins) users
+  getBootstrap: async (recent) => {
+    try {
+      const response = await api.get('/bootstrap/', {
+        params: recent !== undefined ? { recent } : {}
+      });
+      return {
+        success: true,
+        data: response.data.data
+      };
+    } catch (error) {
+      console.error('API: Get bootstrap error:', error.response?.data || error);
+      return {
+        success: false,
+        error: error.response?.data?.error || 'Failed to load dashboard data'
+      };
+    }
+  },
+
   getAdminStats: async () => {
     try {
       console.log('API: Getting admin stats...');
@@ -252,6 +338,74 @@ export const expenseApi = {
     }
   },
 
+  // Get spend over time from the rollups. options: interval (month, quarter,
+  // year), groupBy (status, category, employee), status (array), from and to
+  // (YYYY-MM)
+  getAdminStatsSeries: async (options = {}) => {
+    try {
+      const params = new URLSearchParams();
+      if (options.interval) {
+        params.append('interval', options.interval);
+      }
+      if (options.groupBy) {
+        params.append('group_by', options.groupBy);
+      }
+      if (options.status && options.status.length) {
+        params.append('status', options.status.join(','));
+      }
+      if (options.from) {
+        params.append('from', options.from);
+      }
+      if (options.to) {
+        params.append('to', options.to);
+      }
+      
+      const response = await api.get(`/admin/stats/series/?${params}`);
+      
+      return { 
+        success: true, 
+        data: response.data.data 
+      };
+    } catch (error) {
+      console.error('API: Get admin stats series error:', error.response?.data || error);
+      return {
+        success: false,
+        error: error.response?.data?.error || 'Failed to fetch statistics'
+      };
+    }
+  },
+
+  // Get a finance report: spend-by-category, spend-by-employee, spend-by-month,
+  // amount-percentiles or approval-turnaround. filters: from, to (YYYY-MM or
+  // YYYY-MM-DD) and status (array)
+  getReport: async (name, filters = {}) => {
+    try {
+      const params = new URLSearchParams();
+      if (filters.from) {
+        params.append('from', filters.from);
+      }
+      if (filters.to) {
+        params.append('to', filters.to);
+      }
+      if (filters.status && filters.status.length) {
+        params.append('status', filters.status.join(','));
+      }
+      
+      const response = await api.get(`/reports/${name}/?${params}`);
+      
+      return { 
+        success: true, 
+        data: response.data.data 
+      };
+    } catch (error) {
+      console.error('API: Get report error:', error.response?.data || error);
+      return {
+        success: false,
+        error: error.response?.data?.error || 'Failed to fetch report'
+      };
+    }
+  },
+
   // Mock OCR processing (placeholder for future implementation)
   processReceipt: async (file) => {
     console.log('API: Processing receipt (mock)...');
@@ -369,6 +523,27 @@ export const userApi = {
         error: error.response?.data?.error || 'Failed to assign manager to employee'
       };
     }
+  },
+
+  // Run several admin requests in one round trip. requests: [{ method, path,
+  // body }] with paths relative to the API root (e.g. `admin/users/3/`);
+  // data is one { status, body } per request. With atomic, the first failure
+  // undoes the whole batch.
+  batch: async (requests, atomic = false) => {
+    try {
+      const response = await api.post('/batch/', { requests, atomic });
+      return {
+        success: true,
+        data: response.data.data
+      };
+    } catch (error) {
+      console.error('API: Batch error:', error.response?.data || error);
+      return {
+        success: false,
+        error: error.response?.data?.error || 'Failed to run batch',
+        data: error.response?.data?.data
+      };
+    }
   }
 };
 